@@ -1,14 +1,23 @@
 from langgraph.graph import StateGraph, END, START
-from shared_store import url_time
+from session import TOOL_CALL_CANCEL, Session, create_session, get_session, close_session
+from token_ledger import estimate_tokens
+from rate_limiter import RATE_LIMITER, is_throttled, retry_after
+from answer_store import ANSWER_REPLAY, ANSWER_STORE, canonical_url
+from tools.web_scraper import load_page
+from tools.send_request import submit_answer
+from tools.prefetcher import PREFETCHER
+from tracing import TRACER
+import asyncio
+import json
+import threading
 import time
-from langchain_core.rate_limiters import InMemoryRateLimiter
 from langgraph.prebuilt import ToolNode
 from tools import (
-    get_rendered_html, download_file, post_request,
+    get_rendered_html, query_page, download_file, profile_dataset, extract_pdf, post_request,
     run_code, add_dependencies, ocr_image_tool, transcribe_audio, encode_image_to_base64
 )
-from typing import TypedDict, Annotated, List
-from langchain_core.messages import trim_messages, HumanMessage
+from typing import TypedDict, Annotated, List, Optional
+from langchain_core.messages import HumanMessage, ToolMessage
 from langchain.chat_models import init_chat_model
 from langgraph.graph.message import add_messages
 import os
@@ -20,6 +29,8 @@ SECRET = os.getenv("SECRET")
 
 RECURSION_LIMIT = 5000
 MAX_TOKENS = 60000
+# Model calls rejected for quota are retried here, through the rate limiter
+LLM_MAX_ATTEMPTS = 6
 
 
 # -------------------------------------------------
@@ -27,10 +38,11 @@ MAX_TOKENS = 60000
 # -------------------------------------------------
 class AgentState(TypedDict):
     messages: Annotated[List, add_messages]
+    session_id: str
 
 
 TOOLS = [
-    run_code, get_rendered_html, download_file,
+    run_code, get_rendered_html, query_page, download_file, profile_dataset, extract_pdf,
     post_request, add_dependencies, ocr_image_tool, transcribe_audio, encode_image_to_base64
 ]
 
@@ -38,16 +50,12 @@ TOOLS = [
 # -------------------------------------------------
 # LLM INIT
 # -------------------------------------------------
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=10 / 60,
-    check_every_n_seconds=1,
-    max_bucket_size=10
-)
-
+# Pacing and 429 retries are handled by RATE_LIMITER in call_llm, so the
+# client itself must not retry (it would do so blind to the shared rate)
 llm = init_chat_model(
     model_provider="google_genai",
     model="gemini-2.5-flash",
-    rate_limiter=rate_limiter
+    max_retries=1,
 ).bind_tools(TOOLS)
 
 
@@ -66,6 +74,11 @@ Your job is to:
 
 Rules:
 - For base64 generation of an image NEVER use your own code, always use the "encode_image_to_base64" tool that's provided
+- To look at a downloaded CSV/JSON/Parquet/Excel file, call profile_dataset first, and answer with its sql mode when a query is enough; use run_code only for what SQL cannot do.
+- download_file gives you a private copy you may modify. With read_only=True it shares the cached file instead; never modify such a file in place, write a new file.
+- To read a downloaded PDF, use extract_pdf (text and tables per page) rather than parsing it in run_code.
+- get_rendered_html returns a distilled page; use query_page with its page_ref and a CSS selector when you need the raw HTML.
+- Long tool outputs come back as a preview plus a handle (ARTIFACT:..., PAGE:..., BASE64_KEY:...). Pass the handle as a quoted string in run_code or in a post_request payload and it is replaced by the full value.
 - Never hallucinate URLs or fields.
 - Never shorten endpoints.
 - Always inspect server response.
@@ -97,66 +110,227 @@ def handle_malformed_node(state: AgentState):
 
 
 # -------------------------------------------------
-# AGENT NODE
+# CONTEXT
 # -------------------------------------------------
-def agent_node(state: AgentState):
-    # --- TIME HANDLING START ---
-    cur_time = time.time()
-    cur_url = os.getenv("url")
-    
-    # SAFE GET: Prevents crash if url is None or not in dict
-    prev_time = url_time.get(cur_url) 
-    offset = os.getenv("offset", "0")
+def build_prompt(session: Session, messages: List) -> List:
+    """
+    System prompt, then the run memory holding every turn that no longer
+    fits in MAX_TOKENS, then the most recent turns verbatim. Only messages
+    newly pushed out of the window are folded into the memory.
+
+    Folding turns in makes the memory message longer, so the tail is
+    re-measured against the grown memory until the two fit together.
+    """
+    memory = session.memory
+    reserved = estimate_tokens(HumanMessage(content=memory.render(session.url))) if memory else 0
+    head, start = session.tokens.tail_start(messages, MAX_TOKENS, reserved)
+    while start > head:
+        memory.absorb(messages, head, start)
+        grown = estimate_tokens(HumanMessage(content=memory.render(session.url)))
+        if grown <= reserved:
+            break
+        # Terminates: the tail only shrinks, and nothing new is absorbed once it stops
+        reserved = grown
+        head, start = session.tokens.tail_start(messages, MAX_TOKENS, reserved)
+    prompt = list(messages[:head])
+    if memory:
+        prompt.append(HumanMessage(content=memory.render(session.url)))
+    return prompt + list(messages[start:])
 
-    if prev_time is not None:
-        prev_time = float(prev_time)
-        diff = cur_time - prev_time
 
-        if diff >= 180 or (offset != "0" and (cur_time - float(offset)) > 90):
-            print(f"Timeout exceeded ({diff}s) — instructing LLM to purposely submit wrong answer.")
+# -------------------------------------------------
+# LLM CALLS
+# -------------------------------------------------
+async def call_llm(session: Session, messages: List):
+    """
+    Invoke the model through the shared adaptive rate limiter. Chains with
+    the least quiz budget left get the next token first; a 429 slows the
+    shared rate down and the call is retried after the server's hint.
+    """
+    deadline = session.deadline
+    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+        with TRACER.span("wait", "llm_slot"):
+            waited = await RATE_LIMITER.acquire(priority=deadline.remaining(), cancel_event=session.cancel_event)
+        deadline.record("llm_wait", waited)
+        session.check_cancelled()
+        if waited >= 1:
+            print(f"Waited {waited:.1f}s for an LLM slot")
+
+        start = time.perf_counter()
+        try:
+            with TRACER.span("llm", "invoke", attempt=attempt) as span:
+                span.set(bytes_in=len(json.dumps([getattr(m, "content", m) for m in messages], default=str)))
+                result = await llm.ainvoke(messages)
+                usage = getattr(result, "usage_metadata", None) or {}
+                span.set(
+                    tokens_in=usage.get("input_tokens", 0),
+                    tokens_out=usage.get("output_tokens", 0),
+                    bytes_out=len(json.dumps(result.content, default=str)),
+                    tool_calls=len(getattr(result, "tool_calls", None) or []),
+                )
+        except Exception as e:
+            if not is_throttled(e) or attempt == LLM_MAX_ATTEMPTS:
+                raise
+            hint = retry_after(e)
+            print(f"LLM throttled (attempt {attempt}), retry after {hint or 'backoff'}: {e}")
+            await RATE_LIMITER.throttled(hint)
+            continue
+        finally:
+            deadline.record("llm", time.perf_counter() - start)
+        await RATE_LIMITER.succeeded()
+        return result
 
-            fail_instruction = """
-            You have exceeded the time limit for this task (over 180 seconds).
-            Immediately call the `post_request` tool and submit a WRONG answer for the CURRENT quiz.
-            """
 
-            # Using HumanMessage (as you correctly implemented)
-            fail_msg = HumanMessage(content=fail_instruction)
+# -------------------------------------------------
+# AGENT NODE
+# -------------------------------------------------
+async def agent_node(state: AgentState):
+    session = get_session(state["session_id"])
+    session.check_cancelled()
+    session.steps += 1
+    deadline = session.deadline
+    deadline.steps += 1
+
+    # Older turns are compacted into the run memory instead of dropped
+    messages = build_prompt(session, state["messages"])
+    if session.memory:
+        print(f"Context compacted: {session.memory.compacted} messages folded into run memory")
 
-            # We invoke the LLM immediately with this new instruction
-            result = llm.invoke(state["messages"] + [fail_msg])
-            return {"messages": [result]}
+    # --- TIME HANDLING START ---
+    if deadline.expired():
+        print(f"Deadline exceeded ({deadline.elapsed():.0f}s on {deadline.url}) — instructing LLM to purposely submit wrong answer.")
+
+        fail_instruction = f"""
+        You have exceeded the time limit for this task ({deadline.budget:.0f} seconds, or the retry window after a wrong answer).
+        Immediately call the `post_request` tool and submit a WRONG answer for the CURRENT quiz.
+        """
+        messages.append(HumanMessage(content=fail_instruction))
     # --- TIME HANDLING END ---
 
-    trimmed_messages = trim_messages(
-        messages=state["messages"],
-        max_tokens=MAX_TOKENS,
-        strategy="last",
-        include_system=True,
-        start_on="human",
-        token_counter=llm, 
-    )
-    
-    # Better check: Does it have a HumanMessage?
-    has_human = any(msg.type == "human" for msg in trimmed_messages)
-    
-    if not has_human:
-        print("WARNING: Context was trimmed too far. Injecting state reminder.")
-        # We remind the agent of the current URL from the environment
-        current_url = os.getenv("url", "Unknown URL")
-        reminder = HumanMessage(content=f"Context cleared due to length. Continue processing URL: {current_url}")
-        
-        # We append this to the trimmed list (temporarily for this invoke)
-        trimmed_messages.append(reminder)
-    # ----------------------------------------
-
-    print(f"--- INVOKING AGENT (Context: {len(trimmed_messages)} items) ---")
-    
-    result = llm.invoke(trimmed_messages)
+    print(f"--- INVOKING AGENT (Context: {len(messages)} items, {deadline.remaining():.0f}s left) ---")
+
+    result = await call_llm(session, messages)
+    prompt_tokens = session.tokens.record_prompt(messages, result)
+    print(f"Prompt ~{prompt_tokens} tokens (run total ~{session.tokens.prompt_tokens_estimated})")
 
     return {"messages": [result]}
 
 
+# -------------------------------------------------
+# TOOL DEADLINES
+# -------------------------------------------------
+async def guard_tool_call(request, execute):
+    """
+    Runs one tool call under the current quiz's deadline. A call that
+    outlives its share of the budget is cancelled and the model gets an
+    error result instead of the whole chain stalling. Cancelling only
+    abandons the await, so the call's TOOL_CALL_CANCEL event is set as
+    well; tools pass it into their threads (Session.tool_cancel) and those
+    stop at their next check.
+    """
+    session = get_session(request.state["session_id"])
+    deadline = session.deadline
+    call = request.tool_call
+    budget = deadline.tool_budget(call["name"])
+    start = time.perf_counter()
+    call_cancel = threading.Event()
+    token = TOOL_CALL_CANCEL.set(call_cancel)
+    with TRACER.span("tool", call["name"], bytes_in=len(json.dumps(call["args"], default=str))) as span:
+        try:
+            # The task copies the context, so the tool sees call_cancel
+            result = await asyncio.wait_for(execute(request), timeout=budget)
+        except asyncio.TimeoutError:
+            span.set(outcome="timeout")
+            print(f"Cancelled {call['name']} after {budget:.0f}s (quiz deadline)")
+            result = ToolMessage(
+                content=(
+                    f"Error: {call['name']} was cancelled after {budget:.0f}s because the quiz deadline "
+                    f"is close ({max(0, deadline.remaining()):.0f}s left). Submit an answer with what you have."
+                ),
+                tool_call_id=call["id"],
+                name=call["name"],
+                status="error",
+            )
+        finally:
+            # Whatever of the call is still running in threads must stop now
+            call_cancel.set()
+            TOOL_CALL_CANCEL.reset(token)
+            deadline.record(f"tool:{call['name']}", time.perf_counter() - start)
+        content = getattr(result, "content", "")
+        span.set(bytes_out=len(content if isinstance(content, str) else json.dumps(content, default=str)))
+        if span.outcome == "ok" and getattr(result, "status", None) == "error":
+            span.set(outcome="error")
+        return result
+
+
+# -------------------------------------------------
+# ANSWER REPLAY
+# -------------------------------------------------
+async def replay_node(state: AgentState):
+    """
+    Answers quizzes seen in earlier runs without calling the model. Each
+    new quiz page is loaded and fingerprinted once; if an answer to the
+    same page was judged correct before, it is submitted directly, and the
+    next quiz is checked the same way. A stored answer the server rejects
+    is forgotten. The first page that is new is
+    handed to the agent already loaded. Without a SECRET nothing is
+    replayed, since stored answers do not keep one.
+    """
+    session = get_session(state["session_id"])
+    replayed, page = [], None
+    while ANSWER_REPLAY and SECRET and not session.done and session.url not in session.replay_checked:
+        session.check_cancelled()
+        url = session.url
+        session.replay_checked.add(url)
+        fp = session.fingerprints.get(canonical_url(url))
+        if fp is None:
+            try:
+                page = await load_page(session, url)
+            except Exception as e:
+                print(f"Replay could not load {url}: {e}")
+                break
+            fp = session.fingerprints.get(canonical_url(url))
+        stored = await asyncio.to_thread(ANSWER_STORE.lookup, fp)
+        if stored is None:
+            break
+
+        print(f"Replaying stored answer for {url}")
+        page = None
+        payload = await asyncio.to_thread(ANSWER_STORE.attach, stored["payload"], session.artifacts, SECRET)
+        deadline = session.deadline
+        result = await submit_answer(session, stored["endpoint"], payload)
+        response = json.dumps(result, default=str)[:300]
+        if deadline.outcome == "correct":
+            await asyncio.to_thread(ANSWER_STORE.mark_replayed, fp)
+            replayed.append(f"- {url}: replayed and accepted. Server: {response}")
+        else:
+            # A rejected answer would only be replayed wrong again
+            await asyncio.to_thread(ANSWER_STORE.invalidate, fp)
+            verdict = "solve it from scratch" if session.url == url else "the server moved on"
+            replayed.append(f"- {url}: replayed and rejected; {verdict}. Server: {response}")
+        if session.url == url:
+            # Not accepted this time (retry decided); let the agent solve it
+            break
+
+    notes = []
+    if replayed:
+        notes.append("These quizzes were answered by replaying answers stored in earlier runs:\n" + "\n".join(replayed))
+    if session.done:
+        notes.append("All quizzes are complete. Output END.")
+    elif page is not None:
+        notes.append(
+            f"Current quiz {session.url} is already loaded (no need to call get_rendered_html for it):\n"
+            + json.dumps(page, default=str)
+        )
+    elif replayed:
+        notes.append(f"Continue with URL: {session.url}")
+    return {"messages": [HumanMessage(content="\n\n".join(notes))]} if notes else {}
+
+
+def route_replay(state):
+    return END if get_session(state["session_id"]).done else "agent"
+
+
 # -------------------------------------------------
 # ROUTE LOGIC (UPDATED FOR MALFORMED CALLS)
 # -------------------------------------------------
@@ -193,14 +367,20 @@ def route(state):
 graph = StateGraph(AgentState)
 
 # Add Nodes
-graph.add_node("agent", agent_node)
-graph.add_node("tools", ToolNode(TOOLS))
-graph.add_node("handle_malformed", handle_malformed_node) # Add the repair node
+# Every node runs inside a trace span; see tracing.py
+graph.add_node("agent", TRACER.traced("node", "agent")(agent_node))
+# Under ainvoke, ToolNode runs all tool calls of one turn concurrently,
+# each one bounded by the quiz deadline
+graph.add_node("tools", ToolNode(TOOLS, awrap_tool_call=guard_tool_call))
+graph.add_node("handle_malformed", TRACER.traced("node", "handle_malformed")(handle_malformed_node)) # Add the repair node
+# Submits remembered answers before the model sees a quiz
+graph.add_node("replay", TRACER.traced("node", "replay")(replay_node))
 
 # Add Edges
-graph.add_edge(START, "agent")
-graph.add_edge("tools", "agent")
+graph.add_edge(START, "replay")
+graph.add_edge("tools", "replay")
 graph.add_edge("handle_malformed", "agent") # Retry loop
+graph.add_conditional_edges("replay", route_replay, {"agent": "agent", END: END})
 
 # Conditional Edges
 graph.add_conditional_edges(
@@ -220,16 +400,35 @@ app = graph.compile()
 # -------------------------------------------------
 # RUNNER
 # -------------------------------------------------
-def run_agent(url: str):
+async def arun_agent(url: str, session: Optional[Session] = None):
+    # Per-run state; tools reach it through the session_id in the graph state
+    session = session or create_session(url)
+
     # system message is seeded ONCE here
     initial_messages = [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": url}
     ]
 
-    app.invoke(
-        {"messages": initial_messages},
-        config={"recursion_limit": RECURSION_LIMIT}
-    )
+    def trace_summary():
+        return {"quizzes": [q.summary() for q in session.quizzes], "tokens": session.tokens.stats()}
+
+    try:
+        # Spans of the whole chain go to one JSON file under TRACE_DIR
+        with TRACER.run(session.id, url, extra=trace_summary):
+            await app.ainvoke(
+                {"messages": initial_messages, "session_id": session.id},
+                config={"recursion_limit": RECURSION_LIMIT}
+            )
+    finally:
+        # Logs the timing breakdown of a quiz the chain stopped on
+        session.deadline.close("unfinished")
+        PREFETCHER.release(session.id)
+        close_session(session.id)
 
     print("Tasks completed successfully!")
+
+
+def run_agent(url: str, session: Optional[Session] = None):
+    """Blocking entry point: runs the async graph on this thread's own event loop."""
+    asyncio.run(arun_agent(url, session))
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from dotenv import load_dotenv
+from artifact_store import HANDLE_PATTERN, ArtifactStore
+
+load_dotenv()
+
+ANSWER_STORE_DB = os.getenv("ANSWER_STORE_DB", os.path.join("LLMFiles", ".cache", "answers.sqlite3"))
+# Set ANSWER_REPLAY=0 to always solve quizzes from scratch
+ANSWER_REPLAY = os.getenv("ANSWER_REPLAY", "1") == "1"
+# Payload fields never written to disk; the live secret is put back on replay
+SECRET_FIELDS = ("secret",)
+REDACTED = "<redacted>"
+# Artifact values of a stored answer, saved by content next to the database
+BLOB_PATTERN = re.compile(r"\bANSWER_BLOB:[0-9a-f]{64}\b")
+
+
+def canonical_url(url: str) -> str:
+    """Drop the fragment and order query parameters so equal URLs compare equal."""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+def fingerprint(url: str, text: str, data: str = "") -> str:
+    """
+    Identity of a quiz page: its URL, its visible text (whitespace- and
+    case-normalized) and its `data` (tables, data scripts, asset URLs)
+    exactly as given, since e.g. base64 payloads are case-sensitive.
+    """
+    normalized = re.sub(r"\s+", " ", text or "").strip().lower()
+    return hashlib.sha256(f"{canonical_url(url)}\n{normalized}\n{data}".encode("utf-8")).hexdigest()
+
+
+class AnswerStore:
+    """
+    Persistent record of answers the quiz server judged correct, keyed by
+    page fingerprint. A page served again with the same URL and text can
+    be answered by replaying the stored submission instead of solving it.
+
+    Payloads are stored as submitted, minus SECRET_FIELDS. Artifact handles
+    in them (e.g. a multi-MB base64 file) are streamed to content-addressed
+    blob files and kept as ANSWER_BLOB:<sha256> references, which `attach`
+    turns back into handles of the replaying session.
+    """
+
+    def __init__(self, path: str = ANSWER_STORE_DB):
+        self.path = path
+        self.blob_dir = os.path.join(os.path.dirname(path) or ".", "answer_blobs")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "replays": 0, "invalidated": 0, "recorded": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "fingerprint TEXT PRIMARY KEY, url TEXT, endpoint TEXT, payload TEXT, "
+                "created REAL, replays INTEGER DEFAULT 0)"
+            )
+            self._local.conn = conn
+        return conn
+
+    # -------------------------------------------------
+    # PAYLOADS
+    # -------------------------------------------------
+    def _blob_path(self, ref: str) -> str:
+        return os.path.join(self.blob_dir, ref.split(":", 1)[1])
+
+    def _save_blob(self, artifacts: ArtifactStore, handle: str) -> str:
+        """Stream an artifact's value to a blob file; returns its ANSWER_BLOB reference."""
+        os.makedirs(self.blob_dir, exist_ok=True)
+        tmp = os.path.join(self.blob_dir, f".{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        with open(tmp, "wb") as f:
+            for piece in artifacts.iter_text(handle):
+                data = piece.encode("utf-8")
+                digest.update(data)
+                f.write(data)
+        ref = f"ANSWER_BLOB:{digest.hexdigest()}"
+        os.replace(tmp, self._blob_path(ref))
+        return ref
+
+    def _detach(self, obj: Any, artifacts: Optional[ArtifactStore]) -> Any:
+        if isinstance(obj, dict):
+            return {
+                k: REDACTED if str(k).lower() in SECRET_FIELDS else self._detach(v, artifacts)
+                for k, v in obj.items()
+            }
+        if isinstance(obj, list):
+            return [self._detach(v, artifacts) for v in obj]
+        if isinstance(obj, str) and artifacts is not None:
+            return HANDLE_PATTERN.sub(
+                lambda m: self._save_blob(artifacts, m.group(0)) if m.group(0) in artifacts else m.group(0),
+                obj,
+            )
+        return obj
+
+    def _blobs(self, obj: Any) -> list:
+        if isinstance(obj, dict):
+            return [ref for v in obj.values() for ref in self._blobs(v)]
+        if isinstance(obj, list):
+            return [ref for v in obj for ref in self._blobs(v)]
+        return BLOB_PATTERN.findall(obj) if isinstance(obj, str) else []
+
+    def attach(self, obj: Any, artifacts: ArtifactStore, secret: str) -> Any:
+        """
+        A stored payload ready to submit: blob references become artifact
+        handles of `artifacts` (copied from disk, never loaded whole) and
+        redacted fields get `secret`, the one live submissions use.
+        """
+        if not secret:
+            raise ValueError("No secret to put back into a stored answer")
+        if isinstance(obj, dict):
+            return {
+                k: secret if v == REDACTED and str(k).lower() in SECRET_FIELDS
+                else self.attach(v, artifacts, secret)
+                for k, v in obj.items()
+            }
+        if isinstance(obj, list):
+            return [self.attach(v, artifacts, secret) for v in obj]
+        if isinstance(obj, str):
+            return BLOB_PATTERN.sub(lambda m: artifacts.put_copy(self._blob_path(m.group(0))), obj)
+        return obj
+
+    # -------------------------------------------------
+    # STORE
+    # -------------------------------------------------
+    def lookup(self, fp: str) -> Optional[dict]:
+        with self._lock:
+            self._stats["lookups"] += 1
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT url, endpoint, payload, replays FROM answers WHERE fingerprint = ?", (fp,)
+        ).fetchone()
+        if row is None:
+            return None
+        payload = json.loads(row[2])
+        if not all(os.path.exists(self._blob_path(ref)) for ref in self._blobs(payload)):
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return {"url": row[0], "endpoint": row[1], "payload": payload, "replays": row[3]}
+
+    def mark_replayed(self, fp: str):
+        """Count a replay of `fp` once the quiz server has accepted it."""
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE answers SET replays = replays + 1 WHERE fingerprint = ?", (fp,))
+        with self._lock:
+            self._stats["replays"] += 1
+
+    def invalidate(self, fp: str):
+        """Forget the answer to `fp` after the quiz server rejected its replay."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM answers WHERE fingerprint = ?", (fp,))
+        with self._lock:
+            self._stats["invalidated"] += 1
+
+    def record(self, fp: str, url: str, endpoint: str, payload: dict, artifacts: Optional[ArtifactStore] = None):
+        """Remember a correct answer; handles are resolved through `artifacts` into blob files."""
+        payload = self._detach(payload, artifacts)
+        conn = self._conn()
+        with conn:
+            # An accepted replay is recorded again; keep its replay count
+            conn.execute(
+                "INSERT INTO answers (fingerprint, url, endpoint, payload, created, replays) "
+                "VALUES (?, ?, ?, ?, ?, 0) ON CONFLICT(fingerprint) DO UPDATE SET "
+                "url = excluded.url, endpoint = excluded.endpoint, payload = excluded.payload, "
+                "created = excluded.created",
+                (fp, url, endpoint, json.dumps(payload, default=str), time.time()),
+            )
+        with self._lock:
+            self._stats["recorded"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            stats["stored"] = self._conn().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        except sqlite3.Error:
+            stats["stored"] = None
+        stats["enabled"] = ANSWER_REPLAY
+        return stats
+
+
+ANSWER_STORE = AnswerStore()
@@ -0,0 +1,316 @@
+import base64
+import codecs
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Iterator, Optional, Union
+
+HANDLE_PATTERN = re.compile(r"\b(?:ARTIFACT|BASE64_KEY|PAGE):[0-9a-f-]{8,36}\b")
+# Characters per piece when a value is streamed (a multiple of 4, so
+# base64 pieces line up with 3-byte blocks of the source file)
+STREAM_CHARS = 256 * 1024
+
+
+class _Entry:
+    __slots__ = ("kind", "size", "value", "path", "meta")
+
+    def __init__(self, kind, size, value, meta):
+        self.kind = kind
+        self.size = size
+        self.value = value      # None once spilled to disk
+        self.path = None        # set once written to disk
+        self.meta = meta
+
+
+class ArtifactStore:
+    """
+    Size-bounded store for large tool outputs that should stay out of the
+    conversation. Values are referenced by short handles such as
+    "ARTIFACT:3f2a9c1d0b7e".
+
+    - Up to `max_memory_bytes` of values live in memory.
+    - Least-recently-used values beyond that are spilled to `spill_dir`.
+    - Spilled values beyond `max_disk_bytes` are evicted for good.
+    """
+
+    def __init__(self, spill_dir: str, max_memory_bytes: int, max_disk_bytes: int):
+        self.spill_dir = spill_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._evictions = 0
+
+    # -------------------------------------------------
+    # WRITE / READ
+    # -------------------------------------------------
+    def put(self, value: Union[str, bytes], prefix: str = "ARTIFACT", meta: Optional[dict] = None) -> str:
+        """Store `value` and return its handle."""
+        kind = "bytes" if isinstance(value, bytes) else "text"
+        size = len(value) if kind == "bytes" else len(value.encode("utf-8"))
+        handle = f"{prefix}:{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self._entries[handle] = _Entry(kind, size, value, meta or {})
+            self._memory_bytes += size
+            self._enforce_limits()
+        return handle
+
+    def put_file(self, path: str, prefix: str = "ARTIFACT", binary: bool = False, meta: Optional[dict] = None) -> str:
+        """
+        Take ownership of an existing file and return its handle. The value is
+        never loaded into memory; the file is deleted when evicted.
+
+        With meta={"encoding": "base64"} the value is the base64 text of the
+        file's bytes, encoded only when it is read or streamed.
+        """
+        size = os.path.getsize(path)
+        handle = f"{prefix}:{uuid.uuid4().hex[:12]}"
+        entry = _Entry("bytes" if binary else "text", size, None, meta or {})
+        entry.path = path
+        with self._lock:
+            self._entries[handle] = entry
+            self._disk_bytes += size
+            self._enforce_limits()
+        return handle
+
+    def put_copy(self, path: str, prefix: str = "ARTIFACT", binary: bool = False, meta: Optional[dict] = None) -> str:
+        """put_file for a file the caller keeps: a snapshot copy is stored, streamed disk to disk."""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        copy = os.path.join(self.spill_dir, f"copy_{uuid.uuid4().hex[:12]}")
+        shutil.copyfile(path, copy)
+        return self.put_file(copy, prefix=prefix, binary=binary, meta=meta)
+
+    def get(self, handle: str) -> Union[str, bytes]:
+        """Return the stored value, reloading it from disk if it was spilled."""
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                raise KeyError(f"Unknown or evicted artifact {handle}")
+            self._entries.move_to_end(handle)
+            if entry.value is not None:
+                return entry.value
+            if entry.meta.get("encoding") == "base64":
+                with open(entry.path, "rb") as f:
+                    return base64.b64encode(f.read()).decode("ascii")
+            if entry.kind == "bytes":
+                with open(entry.path, "rb") as f:
+                    return f.read()
+            with open(entry.path, "r", encoding="utf-8") as f:
+                return f.read()
+
+    def iter_text(self, handle: str, chars: int = STREAM_CHARS) -> Iterator[str]:
+        """The value as text, piece by piece, without ever holding all of it."""
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                raise KeyError(f"Unknown or evicted artifact {handle}")
+            value, path = entry.value, entry.path
+            encoding = entry.meta.get("encoding")
+        if value is not None:
+            text = self._as_text(value)
+            for i in range(0, len(text), chars):
+                yield text[i:i + chars]
+            return
+        if encoding == "base64":
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(chars // 4 * 3), b""):
+                    yield base64.b64encode(block).decode("ascii")
+            return
+        # Bytes are decoded incrementally so a split multi-byte character survives
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(chars), b""):
+                yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+
+    def meta(self, handle: str) -> dict:
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                raise KeyError(f"Unknown or evicted artifact {handle}")
+            return entry.meta
+
+    def __contains__(self, handle: str) -> bool:
+        with self._lock:
+            return handle in self._entries
+
+    def materialize(self, handle: str) -> str:
+        """Make sure the value is on disk and return its absolute path."""
+        with self._lock:
+            entry = self._entries.get(handle)
+            if entry is None:
+                raise KeyError(f"Unknown or evicted artifact {handle}")
+            self._entries.move_to_end(handle)
+            if entry.path is None:
+                self._write(handle, entry)
+            return os.path.abspath(entry.path)
+
+    # -------------------------------------------------
+    # HANDLE RESOLUTION
+    # -------------------------------------------------
+    def resolve(self, obj: Any) -> Any:
+        """
+        Recursively replace handles inside a JSON-like payload with their
+        values. A string that is exactly a handle becomes the stored value;
+        handles embedded in longer strings are substituted as text.
+        """
+        if isinstance(obj, dict):
+            return {k: self.resolve(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self.resolve(v) for v in obj]
+        if isinstance(obj, str):
+            if HANDLE_PATTERN.fullmatch(obj) and obj in self:
+                return self.get(obj)
+            return HANDLE_PATTERN.sub(
+                lambda m: self._as_text(self.get(m.group(0))) if m.group(0) in self else m.group(0),
+                obj,
+            )
+        return obj
+
+    def json_body(self, obj: Any) -> "StreamedJSON":
+        """`obj` as a JSON request body with handles resolved while it is sent."""
+        return StreamedJSON(obj, self)
+
+    @staticmethod
+    def _as_text(value: Union[str, bytes]) -> str:
+        return value.decode("utf-8", errors="replace") if isinstance(value, bytes) else value
+
+    def preview(self, handle: str, chars: int = 2000) -> str:
+        value = self._as_text(self.get(handle))
+        if len(value) <= chars:
+            return value
+        half = chars // 2
+        return f"{value[:half]}\n... [{len(value) - chars} chars omitted, full value in {handle}] ...\n{value[-half:]}"
+
+    # -------------------------------------------------
+    # LIMITS
+    # -------------------------------------------------
+    def _write(self, handle: str, entry: _Entry):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, handle.replace(":", "_"))
+        if entry.kind == "bytes":
+            with open(path, "wb") as f:
+                f.write(entry.value)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(entry.value)
+        entry.path = path
+        self._disk_bytes += entry.size
+
+    def _enforce_limits(self):
+        # Spill least-recently-used in-memory values
+        for handle, entry in list(self._entries.items()):
+            if self._memory_bytes <= self.max_memory_bytes:
+                break
+            if entry.value is None:
+                continue
+            if entry.path is None:
+                self._write(handle, entry)
+            entry.value = None
+            self._memory_bytes -= entry.size
+
+        # Evict least-recently-used spilled values
+        for handle, entry in list(self._entries.items()):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            if entry.path is None or entry.value is not None:
+                continue
+            self._drop(handle)
+
+    def _drop(self, handle: str):
+        entry = self._entries.pop(handle)
+        if entry.value is not None:
+            self._memory_bytes -= entry.size
+        if entry.path is not None:
+            self._disk_bytes -= entry.size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.path is not None:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+            self._entries.clear()
+            self._memory_bytes = self._disk_bytes = 0
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "artifacts": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "evictions": self._evictions,
+            }
+
+
+class StreamedJSON:
+    """
+    JSON encoding of a payload whose handles are resolved while the body is
+    being sent. A string that is exactly a handle is written out piece by
+    piece (base64 file references are encoded on the fly), so a multi-MB
+    answer is never held in memory whole. Handles inside longer strings
+    are substituted as text, as in ArtifactStore.resolve.
+
+    Iterable more than once (bytes chunks); len() is the exact byte length,
+    for an explicit Content-Length.
+    """
+
+    def __init__(self, obj: Any, store: ArtifactStore, chunk_bytes: int = 64 * 1024):
+        self.obj = obj
+        self.store = store
+        self.chunk_bytes = chunk_bytes
+        self._length = None
+
+    def _pieces(self, obj: Any) -> Iterator[str]:
+        if isinstance(obj, dict):
+            yield "{"
+            for i, (key, value) in enumerate(obj.items()):
+                yield (", " if i else "") + json.dumps(str(key)) + ": "
+                yield from self._pieces(value)
+            yield "}"
+        elif isinstance(obj, (list, tuple)):
+            yield "["
+            for i, value in enumerate(obj):
+                if i:
+                    yield ", "
+                yield from self._pieces(value)
+            yield "]"
+        elif isinstance(obj, str) and HANDLE_PATTERN.fullmatch(obj) and obj in self.store:
+            yield '"'
+            for piece in self.store.iter_text(obj):
+                yield json.dumps(piece)[1:-1]
+            yield '"'
+        else:
+            yield json.dumps(self.store.resolve(obj))
+
+    def __iter__(self) -> Iterator[bytes]:
+        buffer, size = [], 0
+        for piece in self._pieces(self.obj):
+            data = piece.encode("utf-8")
+            buffer.append(data)
+            size += len(data)
+            if size >= self.chunk_bytes:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield b"".join(buffer)
+
+    def __len__(self) -> int:
+        if self._length is None:
+            # One encoding pass without keeping anything
+            self._length = sum(len(chunk) for chunk in self)
+        return self._length
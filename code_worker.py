@@ -0,0 +1,191 @@
+import importlib
+import json
+import os
+import resource
+import runpy
+import select
+import signal
+import sys
+import time
+import traceback
+
+# Fork server and entry point for run_code children. Kept outside the tools
+# package and free of third-party imports so the server never pulls in the
+# agent.
+
+# add_dependencies installs missing packages here, inside the run's workdir
+PACKAGES_DIR = ".packages"
+READ_CHUNK = 64 * 1024
+# The server's original stdout, kept for replies to the app
+_REPLY_FD = None
+
+
+def apply_limits(cpu_seconds: int, memory_bytes: int):
+    """Put the process in its own group and cap its CPU time and address space."""
+    os.setsid()
+    if cpu_seconds:
+        _lower_limit(resource.RLIMIT_CPU, cpu_seconds, cpu_seconds + 1)
+    if memory_bytes:
+        _lower_limit(resource.RLIMIT_AS, memory_bytes, memory_bytes)
+
+
+def _lower_limit(kind: int, soft: int, hard: int):
+    # An unprivileged process can only lower its hard limit
+    _, current_hard = resource.getrlimit(kind)
+    if current_hard != resource.RLIM_INFINITY:
+        hard = min(hard, current_hard)
+        soft = min(soft, hard)
+    resource.setrlimit(kind, (soft, hard))
+
+
+def execute(script_path: str, cwd: str, stdout_path: str, stderr_path: str, limits: dict, on_start=None):
+    """Run one script in a freshly forked child with redirected output."""
+    apply_limits(limits.get("cpu_seconds", 0), limits.get("memory_bytes", 0))
+    if on_start is not None:
+        on_start(time.time())
+    os.chdir(cwd)
+    sys.path.insert(0, cwd)
+    # Last, so the server's own packages win over anything installed per run
+    sys.path.append(os.path.join(cwd, PACKAGES_DIR))
+    sys.argv = [script_path]
+    # Packages may have been installed since the fork server started
+    importlib.invalidate_caches()
+
+    for fd, path in ((1, stdout_path), (2, stderr_path)):
+        target = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(target, fd)
+        os.close(target)
+    sys.stdout = open(1, "w", encoding="utf-8", errors="replace", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", errors="replace", closefd=False)
+
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit:
+        raise
+    except BaseException as e:
+        # Hide the worker and runpy frames, like a plain `python runner.py`
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != script_path:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        sys.exit(1)
+
+
+# -------------------------------------------------
+# FORK SERVER (`python -m code_worker <preload modules...>`)
+# -------------------------------------------------
+# A standalone process whose __main__ is this module, so forked children
+# never re-import the app. Requests arrive as JSON lines on stdin; replies
+# (ready, forked pid, start time, exit code) go out as JSON lines on stdout.
+
+def _reply(message: dict):
+    # One write per line: atomic on a pipe, so children can reply too
+    os.write(_REPLY_FD, (json.dumps(message) + "\n").encode())
+
+
+def _exit_status(exc: SystemExit) -> int:
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def _run_child(request: dict, server_fds: tuple):
+    """Body of a forked child; never returns."""
+
+    def on_start(started: float):
+        _reply({"id": request["id"], "started": started})
+        # The snippet must not hold the reply pipe open after the server dies
+        os.close(_REPLY_FD)
+
+    status = 1
+    try:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for fd in server_fds:
+            os.close(fd)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        execute(
+            request["script_path"], request["cwd"], request["stdout_path"], request["stderr_path"],
+            request["limits"], on_start=on_start,
+        )
+        status = 0
+    except SystemExit as e:
+        status = _exit_status(e)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        os._exit(status)
+
+
+def _reap(children: dict):
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        run_id = children.pop(pid, None)
+        if run_id is not None:
+            _reply({"id": run_id, "exitcode": os.waitstatus_to_exitcode(status)})
+
+
+def serve(preload: list):
+    """Import `preload`, then fork one child per request until stdin closes."""
+    global _REPLY_FD
+    # Anything printed while importing goes to stderr, not into the replies
+    _REPLY_FD = os.dup(1)
+    os.dup2(2, 1)
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    children = {}
+    pending = b""
+    _reply({"ready": True})
+
+    while True:
+        ready, _, _ = select.select([0, wake_r], [], [])
+        if wake_r in ready:
+            try:
+                while os.read(wake_r, 512):
+                    pass
+            except BlockingIOError:
+                pass
+            _reap(children)
+        if 0 not in ready:
+            continue
+        chunk = os.read(0, READ_CHUNK)
+        if not chunk:
+            # The app went away
+            return
+        pending += chunk
+        while b"\n" in pending:
+            line, pending = pending.split(b"\n", 1)
+            request = json.loads(line)
+            pid = os.fork()
+            if pid == 0:
+                _run_child(request, (wake_r, wake_w))
+            children[pid] = request["id"]
+            _reply({"id": request["id"], "pid": pid})
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1:])
@@ -0,0 +1,125 @@
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUIZ_BUDGET_SECONDS = float(os.getenv("QUIZ_BUDGET_SECONDS", "180"))
+# After a wrong answer the server already offers the next URL; retrying
+# the current quiz is only worth it for this long after that
+RETRY_WINDOW_SECONDS = float(os.getenv("QUIZ_RETRY_WINDOW_SECONDS", "90"))
+RETRY_LIMIT = int(os.getenv("QUIZ_RETRY_LIMIT", "4"))
+# Held back from every non-submitting tool call so an answer can still go out
+SUBMIT_RESERVE_SECONDS = float(os.getenv("QUIZ_SUBMIT_RESERVE_SECONDS", "15"))
+MIN_TOOL_SECONDS = 5.0
+MIN_SUBMIT_SECONDS = 20.0
+# Below this a retry has no realistic chance of finishing
+MIN_RETRY_SECONDS = 10.0
+
+
+@dataclass
+class QuizDeadline:
+    """
+    Time budget of one quiz in a chain.
+
+    Every LLM call and tool call of the quiz is measured against it: tools
+    get `tool_budget()` seconds and are cancelled when it runs out, the
+    agent is told to give up once `expired()`, and `decide()` makes the
+    retry-or-advance call after each submission. Time spent is recorded
+    per kind (llm, tool:<name>) for the breakdown logged when the quiz
+    closes.
+    """
+    url: str
+    started: float = field(default_factory=time.time)
+    budget: float = QUIZ_BUDGET_SECONDS
+    attempts: int = 0
+    steps: int = 0
+    next_url: Optional[str] = None
+    next_offered: Optional[float] = None    # when a wrong answer first revealed next_url
+    outcome: Optional[str] = None           # correct | wrong | skipped, once closed
+    finished: Optional[float] = None
+    seconds: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    counts: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    # -------------------------------------------------
+    # BUDGET
+    # -------------------------------------------------
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def remaining(self) -> float:
+        """Seconds left: the quiz budget, or the retry window once it is open."""
+        now = time.time()
+        left = self.budget - (now - self.started)
+        if self.next_offered is not None:
+            left = min(left, RETRY_WINDOW_SECONDS - (now - self.next_offered))
+        return left
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def tool_budget(self, tool: str = "") -> float:
+        """
+        Seconds a single tool call may take. A submission may use all that
+        is left; other tools leave SUBMIT_RESERVE_SECONDS for the answer.
+        """
+        if tool == "post_request":
+            return max(MIN_SUBMIT_SECONDS, self.remaining())
+        return max(MIN_TOOL_SECONDS, self.remaining() - SUBMIT_RESERVE_SECONDS)
+
+    # -------------------------------------------------
+    # DECISIONS
+    # -------------------------------------------------
+    def decide(self, correct: bool, next_url: Optional[str]) -> str:
+        """Retry or move on after a submission. Returns "retry" or "advance"."""
+        if next_url and self.next_offered is None:
+            self.next_url, self.next_offered = next_url, time.time()
+        if correct or not next_url:
+            return "advance"
+        if self.attempts >= RETRY_LIMIT or self.remaining() < MIN_RETRY_SECONDS:
+            return "advance"
+        return "retry"
+
+    def next_started(self, next_url: str) -> float:
+        """The next quiz's clock starts when the server first offered it."""
+        if next_url == self.next_url and self.next_offered is not None:
+            return self.next_offered
+        return time.time()
+
+    # -------------------------------------------------
+    # ACCOUNTING
+    # -------------------------------------------------
+    def record(self, kind: str, seconds: float):
+        self.seconds[kind] += seconds
+        self.counts[kind] += 1
+
+    def close(self, outcome: str):
+        if self.finished is None:
+            self.outcome, self.finished = outcome, time.time()
+            print(self.describe())
+
+    def summary(self) -> dict:
+        return {
+            "url": self.url,
+            "outcome": self.outcome,
+            "attempts": self.attempts,
+            "steps": self.steps,
+            "elapsed_seconds": round(self.elapsed(), 1),
+            "remaining_seconds": round(self.remaining(), 1) if self.finished is None else None,
+            "breakdown": {
+                kind: {"seconds": round(seconds, 2), "count": self.counts[kind]}
+                for kind, seconds in sorted(self.seconds.items(), key=lambda kv: -kv[1])
+            },
+        }
+
+    def describe(self) -> str:
+        """One log line: where the quiz's time went (tool calls may overlap)."""
+        parts = [f"{kind} {seconds:.1f}s/{self.counts[kind]}" for kind, seconds in
+                 sorted(self.seconds.items(), key=lambda kv: -kv[1])]
+        return (
+            f"Quiz timing {self.url}: {self.elapsed():.1f}s, {self.attempts} attempt(s), "
+            f"{self.steps} step(s), {self.outcome or 'open'} | " + (", ".join(parts) or "nothing recorded")
+        )
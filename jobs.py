@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+from dotenv import load_dotenv
+from session import create_session, get_session, RunCancelled
+import os
+import queue
+import threading
+import time
+import uuid
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+# Finished jobs kept around for /jobs/{id}
+JOB_HISTORY = 200
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    url: str
+    status: str = "queued"        # queued | running | done | failed | cancelled
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+    session_id: Optional[str] = None
+    cancel_requested: bool = False
+
+
+class JobManager:
+    """
+    Runs quiz chains on a fixed number of worker threads fed by a bounded
+    queue. When the queue is full new submissions are rejected instead of
+    piling up, so capacity is explicit and one job cannot starve the rest.
+    """
+
+    def __init__(self, runner, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE):
+        self._runner = runner          # callable(url, session)
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    # -------------------------------------------------
+    # LIFECYCLE
+    # -------------------------------------------------
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Cancel every job, mark queued ones cancelled and let the workers exit. Never blocks on the queue."""
+        self._stopping.set()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            self.cancel(job.id)
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job.status, job.finished = "cancelled", time.time()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    # -------------------------------------------------
+    # JOBS
+    # -------------------------------------------------
+    def submit(self, url: str) -> Job:
+        job = Job(id=uuid.uuid4().hex[:12], url=url)
+        if self._stopping.is_set():
+            raise QueueFull("Server is shutting down")
+        # Registered before it is queued, so a worker never runs an unknown job
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise QueueFull(f"Job queue is full ({self._queue.maxsize} waiting)")
+        with self._lock:
+            while len(self._jobs) > JOB_HISTORY:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.finished is None:
+                    break
+                self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished."""
+        job = self.get(job_id)
+        if job is None or job.finished is not None:
+            return False
+        job.cancel_requested = True
+        if job.session_id:
+            try:
+                get_session(job.session_id).cancel_event.set()
+            except KeyError:
+                pass
+        return True
+
+    def _work(self):
+        while True:
+            try:
+                # Wakes up regularly so stop() needs no sentinel in a possibly full queue
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            if job.cancel_requested or self._stopping.is_set():
+                job.status, job.finished = "cancelled", time.time()
+                continue
+
+            session = create_session(job.url)
+            job.session_id = session.id
+            job.status, job.started = "running", time.time()
+            if job.cancel_requested:
+                session.cancel_event.set()
+            try:
+                self._runner(job.url, session)
+                job.status = "done"
+            except RunCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                print(f"Job {job.id} failed: {e}")
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+            finally:
+                job.finished = time.time()
+
+    # -------------------------------------------------
+    # REPORTING
+    # -------------------------------------------------
+    def progress(self, job: Job) -> dict:
+        info = {
+            "job_id": job.id,
+            "status": job.status,
+            "start_url": job.url,
+            "queued_seconds": round((job.started or time.time()) - job.created, 1),
+        }
+        if job.error:
+            info["error"] = job.error
+        if job.started is not None:
+            info["elapsed_seconds"] = round((job.finished or time.time()) - job.started, 1)
+        try:
+            session = get_session(job.session_id) if job.session_id else None
+        except KeyError:
+            session = None   # run finished and its session was closed
+        if session is not None:
+            deadline = session.deadline
+            info.update({
+                "current_url": session.url,
+                "steps": session.steps,
+                "quizzes_seen": len(session.quizzes),
+                "quiz_elapsed_seconds": round(deadline.elapsed(), 1),
+                "quiz_remaining_seconds": round(deadline.remaining(), 1),
+                "quiz_budget_seconds": deadline.budget,
+                "quizzes": [quiz.summary() for quiz in session.quizzes],
+                "tokens": session.tokens.stats(),
+            })
+        return info
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queue_size": self._queue.maxsize,
+            "queued": self._queue.qsize(),
+            "jobs": counts,
+        }
@@ -1,20 +1,58 @@
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from startup import STARTUP, WARMUP
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from agent import run_agent
 from dotenv import load_dotenv
 import uvicorn
 import os
-from shared_store import url_time, BASE64_STORE
+from shared_store import SESSIONS
+from tools.browser_pool import BROWSER_POOL
+from tools.fetcher import fetch_stats
+from tools.http_client import http_stats
+from tools.download_cache import DOWNLOAD_CACHE
+from tools.prefetcher import PREFETCHER
+from rate_limiter import RATE_LIMITER
+from answer_store import ANSWER_STORE
+from tools.code_runner import CODE_RUNNER
+from tools.ocr_engine import OCR_ENGINE
+from tools.speech_engine import SPEECH_ENGINE
+from tools.pdf_engine import PDF_ENGINE
+from jobs import JobManager, QueueFull
+from tracing import TRACER
+from contextlib import asynccontextmanager
 import time
 
+STARTUP.record("imports", time.perf_counter() - STARTUP.started)
 load_dotenv()
 
 EMAIL = os.getenv("EMAIL") 
 SECRET = os.getenv("SECRET")
 
-app = FastAPI()
+JOBS = JobManager(run_agent)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    JOBS.start()
+    # Launch Chromium and import the scientific stack into the run_code fork
+    # server in the background; the first /solve need not wait for either
+    STARTUP.start_warm_up({
+        "browser_pool": BROWSER_POOL.start,
+        "run_code": CODE_RUNNER.warm_up,
+    })
+    STARTUP.record("ready", time.perf_counter() - STARTUP.started)
+    if not WARMUP:
+        print(STARTUP.describe())
+    yield
+    JOBS.stop()
+    CODE_RUNNER.cancel_all()
+    OCR_ENGINE.shutdown()
+    PDF_ENGINE.shutdown()
+    BROWSER_POOL.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or specific domains
@@ -23,16 +61,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 START_TIME = time.time()
+def component_stats() -> dict:
+    return {
+        "startup": STARTUP.stats(),
+        "browser_pool": BROWSER_POOL.stats(),
+        "fetch": fetch_stats(),
+        "http": http_stats(),
+        "download_cache": DOWNLOAD_CACHE.stats(),
+        "prefetch": PREFETCHER.stats(),
+        "llm_rate_limiter": RATE_LIMITER.stats(),
+        "answer_store": ANSWER_STORE.stats(),
+        "active_sessions": len(SESSIONS),
+        "run_code": CODE_RUNNER.stats(),
+        "ocr": OCR_ENGINE.stats(),
+        "speech": SPEECH_ENGINE.stats(),
+        "pdf": PDF_ENGINE.stats(),
+        "jobs": JOBS.stats()
+    }
+
+
 @app.get("/healthz")
 def healthz():
     """Simple liveness check."""
-    return {
-        "status": "ok",
-        "uptime_seconds": int(time.time() - START_TIME)
-    }
+    return {"status": "ok", "uptime_seconds": int(time.time() - START_TIME), **component_stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text format: span latency histograms and counters plus the /healthz stats."""
+    components = {"uptime_seconds": int(time.time() - START_TIME), **component_stats()}
+    return TRACER.render(components)
 
 @app.post("/solve")
-async def solve(request: Request, background_tasks: BackgroundTasks):
+async def solve(request: Request):
     try:
         data = await request.json()
     except Exception:
@@ -46,15 +107,31 @@ async def solve(request: Request, background_tasks: BackgroundTasks):
     
     if secret != SECRET:
         raise HTTPException(status_code=403, detail="Invalid secret")
-    url_time.clear() 
-    BASE64_STORE.clear()  
-    print("Verified starting the task...")
-    os.environ["url"] = url
-    os.environ["offset"] = "0"
-    url_time[url] = time.time()
-    background_tasks.add_task(run_agent, url)
-
-    return JSONResponse(status_code=200, content={"status": "ok"})
+    try:
+        job = JOBS.submit(url)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    print(f"Verified, queued job {job.id}...")
+
+    return JSONResponse(status_code=200, content={"status": "ok", "job_id": job.id})
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Progress of a quiz chain: current URL, steps, elapsed vs budget."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return JOBS.progress(job)
+
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    if JOBS.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if not JOBS.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return {"status": "cancelling", "job_id": job_id}
 
 
 if __name__ == "__main__":
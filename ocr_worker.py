@@ -0,0 +1,90 @@
+import os
+from io import BytesIO
+import numpy as np
+import pytesseract
+from PIL import Image
+
+# Runs inside the OCR pool processes (tools/ocr_engine.py). Kept outside
+# the tools package so workers start without importing the agent.
+
+# Small deskew search: scanned pages are rarely off by more than this
+MAX_SKEW_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.25
+MIN_SKEW_DEGREES = 0.3
+SKEW_SAMPLE_PIXELS = 200_000
+# Tesseract works best when capital letters are at least ~30 px tall
+MIN_WIDTH = 1000
+
+
+def init_worker():
+    # One process per core already; keep tesseract from spawning threads too
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def grayscale(rgb: np.ndarray) -> np.ndarray:
+    return (rgb[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)).astype(np.uint8)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Threshold that maximizes the between-class variance of the histogram."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = weight_bg[-1] - weight_bg
+    cum_mean = np.cumsum(hist * np.arange(256))
+    mean_bg = cum_mean / np.maximum(weight_bg, 1)
+    mean_fg = (cum_mean[-1] - cum_mean) / np.maximum(weight_fg, 1)
+    variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(variance))
+
+
+def skew_angle(ink: np.ndarray) -> float:
+    """
+    Text-line angle by projection profiles: shear the ink pixels for each
+    candidate angle and keep the one whose row histogram is sharpest.
+    """
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > SKEW_SAMPLE_PIXELS:
+        pick = np.random.default_rng(0).choice(len(ys), SKEW_SAMPLE_PIXELS, replace=False)
+        ys, xs = ys[pick], xs[pick]
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 1e-9, SKEW_STEP_DEGREES):
+        rows = np.round(ys - xs * np.tan(np.radians(angle))).astype(np.int64)
+        profile = np.bincount(rows - rows.min())
+        score = float(np.sum(np.diff(profile.astype(np.float64)) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess(image: Image.Image) -> Image.Image:
+    """Grayscale, upscale small images, deskew and binarize (Otsu)."""
+    gray = grayscale(np.asarray(image.convert("RGB")))
+    img = Image.fromarray(gray)
+    if img.width < MIN_WIDTH:
+        scale = MIN_WIDTH / img.width
+        img = img.resize((MIN_WIDTH, max(1, round(img.height * scale))), Image.LANCZOS)
+        gray = np.asarray(img)
+
+    threshold = otsu_threshold(gray)
+    # Dark text on light background is what tesseract expects
+    dark_text = (gray <= threshold).mean() < 0.5
+    ink = gray <= threshold if dark_text else gray > threshold
+
+    angle = skew_angle(ink)
+    binary = np.where(ink, 0, 255).astype(np.uint8)
+    img = Image.fromarray(binary)
+    if abs(angle) >= MIN_SKEW_DEGREES:
+        # Lines sloping down to the right give a positive angle; PIL rotates
+        # counter-clockwise for positive values, which levels them
+        img = img.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return img
+
+
+def ocr(data: bytes, lang: str = "eng", clean: bool = True) -> str:
+    image = Image.open(BytesIO(data))
+    image.load()
+    if clean:
+        image = preprocess(image)
+    return pytesseract.image_to_string(image, lang=lang).strip()
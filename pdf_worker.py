@@ -0,0 +1,55 @@
+import re
+from typing import List
+from pypdf import PdfReader
+
+# Runs inside the PDF pool processes (tools/pdf_engine.py). Kept outside
+# the tools package so workers start without importing the agent.
+
+# A table is at least this many consecutive lines with the same number of
+# columns, where columns are separated by runs of spaces in layout text
+MIN_TABLE_ROWS = 3
+MIN_TABLE_COLUMNS = 2
+COLUMN_GAP = re.compile(r"\s{2,}")
+
+
+def split_columns(line: str) -> List[str]:
+    return [cell for cell in COLUMN_GAP.split(line.strip()) if cell]
+
+
+def find_tables(layout: str) -> List[List[List[str]]]:
+    """
+    Tables in a page's layout-mode text: runs of lines that split into the
+    same number of space-separated columns. A heuristic, but it catches the
+    ruled and unruled numeric tables quizzes use without a layout engine.
+    """
+    tables, run, width = [], [], 0
+    for line in layout.splitlines() + [""]:
+        cells = split_columns(line)
+        if len(cells) >= MIN_TABLE_COLUMNS and (not run or len(cells) == width):
+            run.append(cells)
+            width = len(cells)
+            continue
+        if len(run) >= MIN_TABLE_ROWS:
+            tables.append(run)
+        run, width = ([cells], len(cells)) if len(cells) >= MIN_TABLE_COLUMNS else ([], 0)
+    return tables
+
+
+def extract_pages(path: str, indexes: List[int]) -> List[dict]:
+    """Text and tables of the given 0-based pages. Only those pages are parsed."""
+    reader = PdfReader(path)
+    pages = []
+    for index in indexes:
+        page = reader.pages[index]
+        try:
+            layout = page.extract_text(extraction_mode="layout")
+        except Exception:
+            # Layout mode is stricter about broken fonts; plain mode still reads them
+            layout = page.extract_text() or ""
+        text = "\n".join(re.sub(r"[ \t]+", " ", line).strip() for line in layout.splitlines())
+        pages.append({
+            "page": index + 1,
+            "text": re.sub(r"\n{3,}", "\n\n", text).strip(),
+            "tables": find_tables(layout),
+        })
+    return pages
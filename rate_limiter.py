@@ -0,0 +1,240 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", os.path.join("LLMFiles", ".cache", "rate_limiter.sqlite3"))
+RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "10"))
+MIN_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_MIN_PER_MINUTE", "2"))
+MAX_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_MAX_PER_MINUTE", "30"))
+BURST = float(os.getenv("LLM_RATE_BURST", "10"))
+# AIMD: every success adds this much rate, every throttle halves it
+INCREASE_PER_MINUTE = 0.25
+DECREASE_FACTOR = 0.5
+# A waiter that has not polled for this long is presumed gone
+STALE_WAITER_SECONDS = 5.0
+MAX_POLL_SECONDS = 0.5
+WAIT_SAMPLES = 500
+
+
+def is_throttled(exc: BaseException) -> bool:
+    """429 / RESOURCE_EXHAUSTED from the model provider."""
+    return (
+        type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+        or getattr(exc, "code", None) == 429
+        or "RESOURCE_EXHAUSTED" in str(exc)
+    )
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Server's retry hint, from a RetryInfo detail or the error text."""
+    hint = getattr(exc, "retry_after", None)
+    if hint:
+        return float(hint)
+    for detail in getattr(exc, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    match = re.search(r"retry in ([\d.]+)\s*s|retryDelay['\"]?:\s*['\"]?([\d.]+)s", str(exc), re.IGNORECASE)
+    if match:
+        return float(match.group(1) or match.group(2))
+    return None
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket for LLM calls shared by every worker through SQLite.
+
+    - The refill rate adapts (AIMD): each successful call raises it a
+      little, each 429/RESOURCE_EXHAUSTED halves it and blocks the bucket
+      for the server's retry-after hint.
+    - Waiting callers register in the database with a priority, and a
+      token only goes to the most urgent live waiter, so chains with the
+      least quiz budget left are served first across all processes.
+    - Wait times are kept for /healthz.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_DB, name: str = "llm", rate_per_minute: float = RATE_PER_MINUTE,
+                 min_per_minute: float = MIN_RATE_PER_MINUTE, max_per_minute: float = MAX_RATE_PER_MINUTE,
+                 burst: float = BURST):
+        self.path = path
+        self.name = name
+        self.initial_rate = rate_per_minute / 60
+        self.min_rate = min_per_minute / 60
+        self.max_rate = max_per_minute / 60
+        self.burst = burst
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._stats = {"acquired": 0, "throttled": 0, "waiting": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    # -------------------------------------------------
+    # STORAGE
+    # -------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL, updated REAL, rate REAL, blocked_until REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS waiters ("
+                "id TEXT PRIMARY KEY, name TEXT, priority REAL, enqueued REAL, heartbeat REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _bucket(self, conn, now: float):
+        """Current (tokens, rate, blocked_until), refilled up to `now`. Caller holds a write transaction."""
+        row = conn.execute(
+            "SELECT tokens, updated, rate, blocked_until FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO buckets VALUES (?, ?, ?, ?, 0)", (self.name, self.burst, now, self.initial_rate)
+            )
+            return self.burst, self.initial_rate, 0.0
+        tokens, updated, rate, blocked_until = row
+        if now > blocked_until:
+            tokens = min(self.burst, tokens + (now - max(updated, blocked_until)) * rate)
+        return tokens, rate, blocked_until
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, time.time())
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # -------------------------------------------------
+    # ACQUIRING
+    # -------------------------------------------------
+    def _try_take(self, waiter_id: str, priority: float, enqueued: float) -> float:
+        """Take a token if this waiter is first in line. Returns 0 on success, else seconds to wait."""
+        def take(conn, now):
+            tokens, rate, blocked_until = self._bucket(conn, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO waiters VALUES (?, ?, ?, ?, ?)",
+                (waiter_id, self.name, priority, enqueued, now),
+            )
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - STALE_WAITER_SECONDS,))
+            first = conn.execute(
+                "SELECT id FROM waiters WHERE name = ? ORDER BY priority, enqueued LIMIT 1", (self.name,)
+            ).fetchone()
+            wait = 0.0
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif tokens < 1:
+                wait = (1 - tokens) / rate
+            elif first[0] != waiter_id:
+                wait = MAX_POLL_SECONDS / 5
+            else:
+                tokens -= 1
+                conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            conn.execute("UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?", (tokens, now, self.name))
+            return wait
+        return self._transaction(take)
+
+    def _leave(self, waiter_id: str):
+        self._transaction(lambda conn, now: conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,)))
+
+    async def acquire(self, priority: float = float("inf"), cancel_event: Optional[threading.Event] = None) -> float:
+        """
+        Wait for a token; a lower `priority` (e.g. seconds of quiz budget
+        left) is served first. Returns the seconds waited. Gives up without
+        a token once `cancel_event` is set.
+        """
+        waiter_id = uuid.uuid4().hex
+        start = time.time()
+        with self._lock:
+            self._stats["waiting"] += 1
+        try:
+            while True:
+                wait = await asyncio.to_thread(self._try_take, waiter_id, priority, start)
+                if wait <= 0:
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    await asyncio.to_thread(self._leave, waiter_id)
+                    return time.time() - start
+                await asyncio.sleep(min(wait, MAX_POLL_SECONDS))
+        finally:
+            with self._lock:
+                self._stats["waiting"] -= 1
+        waited = time.time() - start
+        with self._lock:
+            self._stats["acquired"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+            self._waits.append(waited)
+        return waited
+
+    # -------------------------------------------------
+    # FEEDBACK
+    # -------------------------------------------------
+    def _adjust(self, throttled: bool, hint: Optional[float]):
+        def adjust(conn, now):
+            tokens, rate, blocked_until = self._bucket(conn, now)
+            if throttled:
+                rate = max(self.min_rate, rate * DECREASE_FACTOR)
+                blocked_until = max(blocked_until, now + (hint if hint else 1 / rate))
+                tokens = 0.0
+            else:
+                rate = min(self.max_rate, rate + INCREASE_PER_MINUTE / 60)
+            conn.execute(
+                "UPDATE buckets SET tokens = ?, updated = ?, rate = ?, blocked_until = ? WHERE name = ?",
+                (tokens, now, rate, blocked_until, self.name),
+            )
+        self._transaction(adjust)
+
+    async def succeeded(self):
+        await asyncio.to_thread(self._adjust, False, None)
+
+    async def throttled(self, hint: Optional[float] = None):
+        with self._lock:
+            self._stats["throttled"] += 1
+        await asyncio.to_thread(self._adjust, True, hint)
+
+    # -------------------------------------------------
+    # REPORTING
+    # -------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            waits = sorted(self._waits)
+        try:
+            row = self._conn().execute(
+                "SELECT rate, blocked_until FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+        except sqlite3.Error:
+            row = None
+        rate, blocked_until = row or (self.initial_rate, 0.0)
+        acquired = stats["acquired"]
+        return {
+            "rate_per_minute": round(rate * 60, 2),
+            "blocked_seconds": round(max(0.0, blocked_until - time.time()), 1),
+            "acquired": acquired,
+            "throttled": stats["throttled"],
+            "waiting": stats["waiting"],
+            "avg_wait_seconds": round(stats["wait_seconds_total"] / acquired, 3) if acquired else 0.0,
+            "p95_wait_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+            "max_wait_seconds": round(stats["wait_seconds_max"], 3),
+        }
+
+
+RATE_LIMITER = AdaptiveRateLimiter()
@@ -0,0 +1,164 @@
+import json
+import re
+from typing import List
+
+from artifact_store import HANDLE_PATTERN
+
+# Caps keep the memory message small however long the chain gets
+MAX_FACTS = 40
+MAX_ANSWERS = 20
+FACT_CHARS = 300
+VALUE_CHARS = 200
+
+
+def _clip(text, limit: int = FACT_CHARS) -> str:
+    text = re.sub(r"\s+", " ", str(text)).strip()
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _parse(content):
+    """Tool results arrive as strings; dict results are JSON-encoded by ToolNode."""
+    if isinstance(content, list):
+        content = " ".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return content
+
+
+class RunMemory:
+    """
+    Structured digest of conversation turns that no longer fit in the
+    prompt.
+
+    When the token ledger drops old messages from the prompt, they are
+    folded in here exactly once. What is kept: pages loaded (with their
+    page_ref so query_page still works), files downloaded, endpoints seen,
+    answers submitted with the server's verdict, and short facts from code
+    output. The agent gets this as one message right after the system
+    prompt instead of a bare "context cleared" note, so it does not redo
+    work it has already done.
+    """
+
+    def __init__(self):
+        self.facts: List[str] = []
+        self.files = {}               # filename -> source URL
+        self.endpoints: List[str] = []
+        self.answers: List[dict] = []
+        self.compacted = 0            # messages folded in so far
+        self._upto = 0                # history index already absorbed
+        self._calls = {}              # tool_call_id -> (name, args)
+        self._rendered = None
+
+    def __bool__(self):
+        return bool(self.compacted)
+
+    # -------------------------------------------------
+    # ABSORBING MESSAGES
+    # -------------------------------------------------
+    def absorb(self, messages: List, start: int, end: int):
+        """Fold messages[start:end] into the memory, skipping any absorbed earlier."""
+        start = max(start, self._upto)
+        for message in messages[start:end]:
+            self._absorb_one(message)
+            self.compacted += 1
+        if end > self._upto:
+            self._upto = end
+            self._rendered = None
+
+    def _absorb_one(self, message):
+        kind = getattr(message, "type", None)
+        if kind == "ai":
+            for call in getattr(message, "tool_calls", None) or []:
+                self._calls[call.get("id")] = (call.get("name"), call.get("args") or {})
+        elif kind == "tool":
+            name, args = self._calls.pop(getattr(message, "tool_call_id", None), (None, {}))
+            self._absorb_tool(name or getattr(message, "name", "tool"), args, _parse(message.content))
+        elif kind == "human":
+            content = message.content if isinstance(message.content, str) else str(message.content)
+            if not content.startswith("SYSTEM ERROR"):
+                self._fact(f"User: {_clip(content)}")
+
+    def _absorb_tool(self, name: str, args: dict, result):
+        if isinstance(result, str) and result.startswith("Error"):
+            self._fact(f"{name}({_clip(json.dumps(args, default=str), 120)}) failed: {_clip(result, 160)}")
+            return
+        if isinstance(result, dict) and result.get("error"):
+            self._fact(f"{name} failed: {_clip(result['error'], 160)}")
+            return
+
+        if name == "get_rendered_html" and isinstance(result, dict):
+            endpoint = result.get("submit_endpoint")
+            if endpoint:
+                self._endpoint(endpoint)
+            self._fact(
+                f"Loaded {result.get('url', args.get('url'))} (page_ref {result.get('page_ref')}): "
+                f"{_clip(result.get('text', ''))}"
+                + (f" | submit to {endpoint}" if endpoint else "")
+            )
+        elif name == "download_file":
+            self.files[str(result)] = args.get("url", "")
+        elif name == "post_request":
+            self._endpoint(args.get("url", ""))
+            payload = args.get("payload") or {}
+            verdict = result if isinstance(result, dict) else {"response": _clip(result, VALUE_CHARS)}
+            self.answers.append({
+                "endpoint": args.get("url", ""),
+                "quiz": payload.get("url", ""),
+                "answer": _clip(payload.get("answer", ""), VALUE_CHARS),
+                "correct": verdict.get("correct"),
+                "reason": _clip(verdict.get("reason") or verdict.get("response") or "", VALUE_CHARS),
+                "next_url": verdict.get("url"),
+            })
+            del self.answers[:-MAX_ANSWERS]
+        elif name == "run_code" and isinstance(result, dict):
+            out = (result.get("stdout") or "").strip()
+            err = (result.get("stderr") or "").strip()
+            handle = result.get("stdout_artifact")
+            text = _clip(out[-FACT_CHARS:]) if out else f"no output, stderr: {_clip(err[-160:], 160)}"
+            self._fact(f"run_code → {text}" + (f" (full output {handle})" if handle else ""))
+        elif name == "query_page":
+            # Raw HTML is cheap to query again through the page_ref
+            self._fact(f"query_page({_clip(args.get('selector', ''), 80)}) on {args.get('page_ref')}")
+        else:
+            text = result if isinstance(result, str) else json.dumps(result, default=str)
+            handles = HANDLE_PATTERN.findall(text)
+            self._fact(f"{name} → {_clip(text, 200)}" + (f" (handles: {', '.join(handles)})" if handles else ""))
+
+    def _fact(self, text: str):
+        self.facts.append(text)
+        del self.facts[:-MAX_FACTS]
+
+    def _endpoint(self, url: str):
+        if url and url not in self.endpoints:
+            self.endpoints.append(url)
+
+    # -------------------------------------------------
+    # RENDERING
+    # -------------------------------------------------
+    def render(self, current_url: str) -> str:
+        if self._rendered is None:
+            lines = [f"RUN MEMORY — {self.compacted} earlier messages were compacted into this summary."]
+            if self.answers:
+                lines.append("Answers submitted:")
+                for a in self.answers:
+                    verdict = {True: "correct", False: "wrong"}.get(a["correct"], "unknown")
+                    line = f"- {a['quiz'] or a['endpoint']}: {a['answer']!r} → {verdict}"
+                    if a["reason"]:
+                        line += f" ({a['reason']})"
+                    if a["next_url"]:
+                        line += f"; next url {a['next_url']}"
+                    lines.append(line)
+            if self.files:
+                lines.append("Files already downloaded (in the working directory):")
+                lines.extend(f"- {name} ← {url}" for name, url in self.files.items())
+            if self.endpoints:
+                lines.append("Endpoints seen: " + ", ".join(self.endpoints))
+            if self.facts:
+                lines.append("Facts learned:")
+                lines.extend(f"- {fact}" for fact in self.facts)
+            self._rendered = "\n".join(lines)
+        return (
+            f"{self._rendered}\nCurrent quiz URL: {current_url}\n"
+            "Reuse the page_refs, files and handles above instead of fetching or recomputing them."
+        )
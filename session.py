@@ -0,0 +1,136 @@
+from artifact_store import ArtifactStore
+from deadline import QuizDeadline
+from shared_store import SESSIONS
+from token_ledger import TokenLedger
+from run_memory import RunMemory
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+from dotenv import load_dotenv
+import os
+import shutil
+import threading
+import time
+import uuid
+
+load_dotenv()
+
+ARTIFACT_MEMORY_BYTES = int(os.getenv("ARTIFACT_MEMORY_MB", "64")) * 1024 * 1024
+ARTIFACT_DISK_BYTES = int(os.getenv("ARTIFACT_DISK_MB", "512")) * 1024 * 1024
+KEEP_SESSION_FILES = os.getenv("KEEP_SESSION_FILES", "0") == "1"
+
+_lock = threading.Lock()
+
+# Set by the agent for the duration of one tool call, and set once the call
+# times out, so work the tool handed to threads stops too
+TOOL_CALL_CANCEL: ContextVar[Optional[threading.Event]] = ContextVar("tool_call_cancel", default=None)
+
+
+class RunCancelled(Exception):
+    """Raised inside a run once its job has been cancelled."""
+
+
+class CallCancelled(Exception):
+    """Raised in a tool's worker thread once its call timed out or its run was cancelled."""
+
+
+class CancelScope:
+    """
+    What thread-bound tool work polls: set as soon as any of its events
+    is (the run's cancel event, the tool call's timeout event).
+    """
+
+    def __init__(self, *events: Optional[threading.Event]):
+        self._events = [event for event in events if event is not None]
+
+    def is_set(self) -> bool:
+        return any(event.is_set() for event in self._events)
+
+    def check(self):
+        if self.is_set():
+            raise CallCancelled("Tool call was cancelled")
+
+
+@dataclass
+class Session:
+    """
+    Everything one quiz chain mutates while it runs. The session_id travels
+    in the LangGraph state; tools look the session up through it, so chains
+    running in parallel never see each other's URL, deadlines or files.
+    """
+    id: str
+    url: str                                  # quiz currently being solved
+    workdir: str                              # downloads, scripts, run logs
+    artifacts: ArtifactStore
+    deadline: Optional[QuizDeadline] = None   # budget of the current quiz
+    quizzes: List[QuizDeadline] = field(default_factory=list)   # every quiz so far, current last
+    fingerprints: Dict[str, str] = field(default_factory=dict)   # canonical page URL -> fingerprint
+    replay_checked: Set[str] = field(default_factory=set)         # quiz URLs looked up in the answer store
+    done: bool = False                        # the server reported no further quiz
+    created: float = field(default_factory=time.time)
+    steps: int = 0
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    tokens: TokenLedger = field(default_factory=TokenLedger)
+    memory: RunMemory = field(default_factory=RunMemory)   # compacted older turns
+
+    def start_quiz(self, url: str, started: Optional[float] = None):
+        self.url = url
+        self.deadline = QuizDeadline(url=url, started=started or time.time())
+        self.quizzes.append(self.deadline)
+
+    def advance(self, next_url: str, outcome: str):
+        """Close the current quiz (logging its timing) and start the next one."""
+        started = self.deadline.next_started(next_url)
+        self.deadline.close(outcome)
+        self.start_quiz(next_url, started)
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise RunCancelled(f"Session {self.id} was cancelled")
+
+    def tool_cancel(self) -> CancelScope:
+        """
+        Cancel signal for a tool's thread-bound work: the run's cancel event
+        plus the current tool call's timeout. Take it in the tool's
+        coroutine and pass it into the threads.
+        """
+        return CancelScope(self.cancel_event, TOOL_CALL_CANCEL.get())
+
+
+def create_session(url: str) -> Session:
+    session_id = uuid.uuid4().hex[:12]
+    workdir = os.path.join("LLMFiles", session_id)
+    os.makedirs(workdir, exist_ok=True)
+    session = Session(
+        id=session_id,
+        url=url,
+        workdir=workdir,
+        artifacts=ArtifactStore(
+            spill_dir=os.path.join(workdir, ".artifacts"),
+            max_memory_bytes=ARTIFACT_MEMORY_BYTES,
+            max_disk_bytes=ARTIFACT_DISK_BYTES,
+        ),
+    )
+    session.start_quiz(url, session.created)
+    with _lock:
+        SESSIONS[session_id] = session
+    return session
+
+
+def get_session(session_id: str) -> Session:
+    with _lock:
+        session = SESSIONS.get(session_id)
+    if session is None:
+        raise KeyError(f"Unknown session {session_id}")
+    return session
+
+
+def close_session(session_id: str):
+    """Drop the session and free its artifacts and (unless kept) its files."""
+    with _lock:
+        session = SESSIONS.pop(session_id, None)
+    if session is None:
+        return
+    session.artifacts.clear()
+    if not KEEP_SESSION_FILES:
+        shutil.rmtree(session.workdir, ignore_errors=True)
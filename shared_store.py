@@ -1,2 +1,3 @@
-BASE64_STORE = {}
-url_time = {}
\ No newline at end of file
+# Live quiz-chain sessions keyed by session_id (see session.py). Per-run state
+# such as the current URL, timers and the artifact store lives on the session.
+SESSIONS = {}
@@ -0,0 +1,96 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set WARMUP=0 to start every heavy component lazily on first use
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+
+class StartupReport:
+    """
+    Where boot time goes: the server's own import phase, the first import
+    of each heavy module tools load on demand, and the optional warm-up
+    that pre-launches the browser pool and the run_code fork server in
+    the background while the server already accepts requests.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases = {}
+        self.imports = {}
+        self.warmup = {"state": "pending" if WARMUP else "disabled", "components": {}}
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] = round(seconds, 3)
+
+    def timed_import(self, name: str):
+        """Import a heavy module on first use and remember how long that took."""
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        with self._lock:
+            self.imports.setdefault(name, round(time.perf_counter() - start, 3))
+        return module
+
+    # -------------------------------------------------
+    # WARM-UP
+    # -------------------------------------------------
+    def warm_up(self, components: dict):
+        """Run each named warm-up callable in order, timing it. Failures are logged, not raised."""
+        self.warmup["state"] = "running"
+        start = time.perf_counter()
+        failed = False
+        for name, warm in components.items():
+            t0 = time.perf_counter()
+            try:
+                warm()
+                outcome = {"seconds": round(time.perf_counter() - t0, 3)}
+            except Exception as e:
+                failed = True
+                outcome = {"seconds": round(time.perf_counter() - t0, 3), "error": f"{type(e).__name__}: {e}"}
+                print(f"Warm-up of {name} failed, it will start on first use: {e}")
+            with self._lock:
+                self.warmup["components"][name] = outcome
+        self.warmup["seconds"] = round(time.perf_counter() - start, 3)
+        self.warmup["state"] = "partial" if failed else "done"
+        print(self.describe())
+
+    def start_warm_up(self, components: dict) -> Optional[threading.Thread]:
+        if not WARMUP:
+            return None
+        thread = threading.Thread(target=self.warm_up, args=(components,), name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    # -------------------------------------------------
+    # REPORTING
+    # -------------------------------------------------
+    def describe(self) -> str:
+        stats = self.stats()
+        lines = ["Startup report:"]
+        lines += [f"  {phase}: {seconds}s" for phase, seconds in stats["phases"].items()]
+        for name, outcome in stats["warmup"]["components"].items():
+            lines.append(f"  warm-up {name}: {outcome['seconds']}s" + (" (failed)" if "error" in outcome else ""))
+        lines += [f"  import {name}: {seconds}s" for name, seconds in stats["imports"].items()]
+        return "\n".join(lines)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "phases": dict(self.phases),
+                "imports": dict(self.imports),
+                "warmup": {**self.warmup, "components": dict(self.warmup["components"])},
+            }
+
+
+STARTUP = StartupReport()
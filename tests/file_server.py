@@ -0,0 +1,84 @@
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FileServer:
+    """
+    Local HTTP server for download tests. `files` maps a path to its body;
+    responses carry an ETag and honour single byte ranges. `lengths`
+    overrides the Content-Length a HEAD announces (None omits it),
+    `delays` sleeps between chunks and `gets`/`heads` count GET/HEAD requests
+    per path.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.lengths = {}
+        self.delays = {}
+        self.gets = {}
+        self.heads = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                server.heads[self.path] = server.heads.get(self.path, 0) + 1
+                self.respond(body=False)
+
+            def do_GET(self):
+                server.gets[self.path] = server.gets.get(self.path, 0) + 1
+                self.respond(body=True)
+
+            def respond(self, body):
+                data = server.files.get(self.path)
+                if data is None:
+                    self.send_error(404)
+                    return
+                etag = '"%s"' % hashlib.sha1(data).hexdigest()
+                status, start, end = 200, 0, len(data) - 1
+                ranged = self.headers.get("Range", "")
+                if ranged.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+                    lo, hi = ranged[6:].split("-")
+                    status, start, end = 206, int(lo), min(int(hi) if hi else end, end)
+                self.send_response(status)
+                self.send_header("ETag", etag)
+                self.send_header("Accept-Ranges", "bytes")
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+                length = end - start + 1
+                if not body and self.path in server.lengths:
+                    length = server.lengths[self.path]
+                if length is not None:
+                    self.send_header("Content-Length", str(length))
+                self.end_headers()
+                if not body:
+                    return
+                delay = server.delays.get(self.path, 0)
+                try:
+                    for i in range(start, end + 1, 16 * 1024):
+                        self.wfile.write(data[i:min(i + 16 * 1024, end + 1)])
+                        if delay:
+                            self.wfile.flush()
+                            time.sleep(delay)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_port}{path}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
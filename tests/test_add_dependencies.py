@@ -0,0 +1,42 @@
+import importlib.metadata
+import os
+import tempfile
+import unittest
+
+from tools.add_dependencies import missing_requirements, shadowed_packages
+
+
+def fake_dist(overlay, name, version):
+    info = os.path.join(overlay, f"{name}-{version}.dist-info")
+    os.makedirs(info)
+    with open(os.path.join(info, "METADATA"), "w") as f:
+        f.write(f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n")
+
+
+class OverlayTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.overlay = tmp.name
+        self.packaging = importlib.metadata.version("packaging")
+
+    def test_requirements_are_split_by_what_run_code_can_import(self):
+        fake_dist(self.overlay, "overlay-only", "1.0")
+        present, missing, conflicts = missing_requirements(
+            ["packaging", "packaging<1", "overlay-only>=1", "not-installed-anywhere"], self.overlay
+        )
+        self.assertEqual(present, [f"packaging=={self.packaging}", "overlay-only==1.0"])
+        self.assertEqual(missing, ["not-installed-anywhere"])
+        self.assertEqual(conflicts, [f"packaging<1 (run_code always imports packaging=={self.packaging})"])
+
+    def test_overlay_copy_of_a_server_package_is_shadowed(self):
+        fake_dist(self.overlay, "packaging", "0.1")
+        fake_dist(self.overlay, "overlay-only", "1.0")
+        self.assertEqual(
+            shadowed_packages(self.overlay),
+            [f"packaging==0.1 (run_code imports packaging=={self.packaging})"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from answer_store import BLOB_PATTERN, REDACTED, AnswerStore, canonical_url, fingerprint
+from artifact_store import ArtifactStore
+
+
+class KeyNormalizationTest(unittest.TestCase):
+    def test_canonical_url_ignores_case_fragment_and_query_order(self):
+        self.assertEqual(
+            canonical_url(" HTTPS://Example.com/quiz?b=2&a=1#top "),
+            canonical_url("https://example.com/quiz?a=1&b=2"),
+        )
+
+    def test_canonical_url_keeps_path_case_and_blank_params(self):
+        self.assertNotEqual(canonical_url("https://x.com/Quiz"), canonical_url("https://x.com/quiz"))
+        self.assertEqual(canonical_url("https://x.com?a="), "https://x.com/?a=")
+
+    def test_fingerprint_normalizes_whitespace_and_case(self):
+        self.assertEqual(
+            fingerprint("https://x.com/q?b=1&a=2", "  What is\n the  SUM? "),
+            fingerprint("https://x.com/q?a=2&b=1", "what is the sum?"),
+        )
+
+    def test_fingerprint_depends_on_url_and_text(self):
+        base = fingerprint("https://x.com/q1", "text")
+        self.assertNotEqual(base, fingerprint("https://x.com/q2", "text"))
+        self.assertNotEqual(base, fingerprint("https://x.com/q1", "other text"))
+
+
+    def test_fingerprint_data_is_case_sensitive(self):
+        self.assertNotEqual(
+            fingerprint("https://x.com/q", "text", "atob('QUJD')"),
+            fingerprint("https://x.com/q", "text", "atob('qujd')"),
+        )
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.store = AnswerStore(path=os.path.join(self.tmp, "answers.sqlite3"))
+
+    def artifacts(self, name):
+        return ArtifactStore(os.path.join(self.tmp, name), 1024 * 1024, 16 * 1024 * 1024)
+
+    def test_secret_is_redacted_and_restored(self):
+        payload = {"email": "a@b.c", "secret": "hunter2", "answer": 42}
+        self.store.record("fp", "https://x.com/q", "https://x.com/submit", payload)
+        stored = self.store.lookup("fp")
+        self.assertEqual(stored["payload"]["secret"], REDACTED)
+        self.assertEqual(stored["endpoint"], "https://x.com/submit")
+        replay = self.store.attach(stored["payload"], self.artifacts("replay"), "current")
+        self.assertEqual(replay, {"email": "a@b.c", "secret": "current", "answer": 42})
+
+    def test_attach_refuses_an_empty_secret(self):
+        self.store.record("fp", "https://x.com/q", "https://x.com/submit", {"secret": "hunter2"})
+        with self.assertRaises(ValueError):
+            self.store.attach(self.store.lookup("fp")["payload"], self.artifacts("replay"), "")
+
+    def test_handles_round_trip_through_blobs(self):
+        recorded = self.artifacts("recorded")
+        value = "x" * 100_000
+        handle = recorded.put(value, prefix="BASE64_KEY")
+        self.store.record("fp", "https://x.com/q", "https://x.com/submit", {"answer": handle}, recorded)
+        stored = self.store.lookup("fp")["payload"]
+        self.assertRegex(stored["answer"], BLOB_PATTERN)
+
+        replaying = self.artifacts("replay")
+        payload = self.store.attach(stored, replaying, "secret")
+        self.assertNotEqual(payload["answer"], handle)
+        self.assertEqual(b"".join(replaying.json_body(payload)), b"".join(recorded.json_body({"answer": handle})))
+
+    def test_missing_blob_is_a_miss(self):
+        recorded = self.artifacts("recorded")
+        handle = recorded.put("value")
+        self.store.record("fp", "https://x.com/q", "https://x.com/submit", {"answer": handle}, recorded)
+        for name in os.listdir(self.store.blob_dir):
+            os.remove(os.path.join(self.store.blob_dir, name))
+        self.assertIsNone(self.store.lookup("fp"))
+
+    def test_invalidated_answer_is_forgotten(self):
+        self.store.record("fp", "https://x.com/q", "https://x.com/submit", {"answer": 1})
+        self.store.invalidate("fp")
+        self.assertIsNone(self.store.lookup("fp"))
+        stats = self.store.stats()
+        self.assertEqual((stats["invalidated"], stats["stored"]), (1, 0))
+
+    def test_stats_count_lookups_hits_and_replays(self):
+        self.store.record("fp", "https://x.com/q", "https://x.com/submit", {"answer": 1})
+        self.assertIsNone(self.store.lookup("other"))
+        self.assertEqual(self.store.lookup("fp")["replays"], 0)
+        # A lookup alone is not a replay
+        self.assertEqual(self.store.lookup("fp")["replays"], 0)
+        self.store.mark_replayed("fp")
+        # The accepted replay is recorded again without losing its count
+        self.store.record("fp", "https://x.com/q", "https://x.com/submit", {"answer": 1})
+        self.assertEqual(self.store.lookup("fp")["replays"], 1)
+        stats = self.store.stats()
+        self.assertEqual(
+            (stats["lookups"], stats["hits"], stats["replays"], stats["recorded"], stats["stored"]),
+            (4, 3, 1, 2, 1),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import base64
+import json
+import os
+import tempfile
+import unittest
+
+from artifact_store import STREAM_CHARS, ArtifactStore, StreamedJSON
+
+
+class StreamedJSONTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # Nothing stays in memory: every put is spilled to disk
+        self.store = ArtifactStore(os.path.join(self.tmp.name, "spill"), max_memory_bytes=0, max_disk_bytes=1 << 30)
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def body(self, obj) -> StreamedJSON:
+        return StreamedJSON(obj, self.store, chunk_bytes=4096)
+
+    def test_base64_file_handle_round_trips(self):
+        data = os.urandom(3 * STREAM_CHARS + 1)
+        handle = self.store.put_file(self.write("blob.bin", data), prefix="BASE64_KEY", binary=True,
+                                     meta={"encoding": "base64"})
+        body = self.body({"answer": handle})
+        decoded = json.loads(b"".join(body))
+        self.assertEqual(base64.b64decode(decoded["answer"]), data)
+
+    def test_spilled_multibyte_text_round_trips(self):
+        # 3-byte characters, so the disk reads split them at block boundaries
+        text = "€ \"quoted\" \\ línea\n" * (STREAM_CHARS // 8)
+        handle = self.store.put(text)
+        self.assertIsNone(self.store._entries[handle].value)
+        decoded = json.loads(b"".join(self.body({"answer": [handle, 1]})))
+        self.assertEqual(decoded["answer"], [text, 1])
+
+    def test_handle_inside_a_string_is_substituted(self):
+        handle = self.store.put("ünïcode")
+        decoded = json.loads(b"".join(self.body({"answer": f"before {handle} after", "n": 2})))
+        self.assertEqual(decoded, {"answer": "before ünïcode after", "n": 2})
+
+    def test_len_is_the_streamed_byte_count(self):
+        blob = self.store.put_file(self.write("blob.bin", os.urandom(100_000)), prefix="BASE64_KEY",
+                                   binary=True, meta={"encoding": "base64"})
+        text = self.store.put("€" * 50_000)
+        body = self.body({"file": blob, "text": text, "mixed": f"x {text} y", "email": "ü@example.com"})
+        streamed = sum(len(chunk) for chunk in body)
+        self.assertEqual(len(body), streamed)
+        self.assertEqual(len(body), len(b"".join(body)))
+
+
+if __name__ == "__main__":
+    unittest.main()
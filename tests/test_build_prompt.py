@@ -0,0 +1,34 @@
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+# agent builds its (never called) Gemini client at import time
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+import agent  # noqa: E402
+from run_memory import RunMemory  # noqa: E402
+from token_ledger import TokenLedger, estimate_tokens  # noqa: E402
+
+
+class BuildPromptTest(unittest.TestCase):
+    def session(self):
+        return SimpleNamespace(url="https://x.com/q", memory=RunMemory(), tokens=TokenLedger())
+
+    @mock.patch.object(agent, "MAX_TOKENS", 6000)
+    def test_prompt_with_grown_memory_stays_within_budget(self):
+        session = self.session()
+        messages = [SystemMessage(content="system", id="s")]
+        for i in range(100):
+            # Each turn becomes a ~300-char fact once compacted
+            messages.append(HumanMessage(content=f"turn {i} " + "y" * 400, id=f"m{i}"))
+            prompt = agent.build_prompt(session, messages)
+            total = sum(estimate_tokens(m) for m in prompt)
+            self.assertLessEqual(total, agent.MAX_TOKENS, f"after {i + 1} turns")
+        self.assertTrue(session.memory)
+        self.assertEqual(prompt[-1].content, messages[-1].content)
+
+
+if __name__ == "__main__":
+    unittest.main()
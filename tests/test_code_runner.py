@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Plays the app's main.py: slow to import, then runs snippets on the pool
+HEAVY_MAIN = textwrap.dedent("""
+    import json, os, sys, time
+    sys.path.insert(0, {root!r})
+    time.sleep(1.5)  # stand-in for langchain/langgraph/FastAPI imports
+    from tools.code_runner import CodeRunner
+
+    runner = CodeRunner(max_workers=1)
+    runner.warm_up()
+    workdir = sys.argv[1]
+    script = os.path.join(workdir, "snippet.py")
+    with open(script, "w") as f:
+        f.write("print(6 * 7)\\n")
+    results = [runner.run(script, workdir, timeout=10) for _ in range(2)]
+    print(json.dumps(results))
+""")
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+class CodeRunnerTest(unittest.TestCase):
+    def test_warm_start_does_not_reimport_main(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            main_path = os.path.join(tmp, "main.py")
+            with open(main_path, "w") as f:
+                f.write(HEAVY_MAIN.format(root=ROOT))
+            done = subprocess.run(
+                [sys.executable, main_path, tmp], capture_output=True, text=True, timeout=120,
+            )
+        self.assertEqual(done.returncode, 0, done.stderr)
+        results = json.loads(done.stdout.strip().splitlines()[-1])
+        for result in results:
+            self.assertEqual(result["stdout"].strip(), "42")
+            self.assertEqual(result["return_code"], 0)
+            self.assertEqual(result["timing"]["mode"], "warm")
+            # Re-importing main.py alone would cost 1500 ms
+            self.assertLess(result["timing"]["startup_ms"], 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
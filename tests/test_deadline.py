@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+
+import deadline
+from deadline import MIN_RETRY_SECONDS, QUIZ_BUDGET_SECONDS, RETRY_LIMIT, RETRY_WINDOW_SECONDS, QuizDeadline
+
+NEXT = "https://quiz.example.com/q2"
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class DecideTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(deadline.time, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.quiz = QuizDeadline("https://quiz.example.com/q1")
+
+    def at(self, elapsed: float):
+        self.clock.now = self.quiz.started + elapsed
+
+    def test_correct_or_last_quiz_advances(self):
+        self.assertEqual(self.quiz.decide(True, NEXT), "advance")
+        self.assertEqual(QuizDeadline("u").decide(False, None), "advance")
+
+    def test_retry_limit_boundary(self):
+        self.quiz.attempts = RETRY_LIMIT - 1
+        self.assertEqual(self.quiz.decide(False, NEXT), "retry")
+        self.quiz.attempts = RETRY_LIMIT
+        self.assertEqual(self.quiz.decide(False, NEXT), "advance")
+
+    def test_retry_cutoff_on_remaining_seconds(self):
+        self.at(QUIZ_BUDGET_SECONDS - MIN_RETRY_SECONDS)
+        self.assertEqual(self.quiz.decide(False, NEXT), "retry")
+        self.at(QUIZ_BUDGET_SECONDS - MIN_RETRY_SECONDS + 0.5)
+        self.assertEqual(self.quiz.decide(False, NEXT), "advance")
+
+    def test_quiz_budget_bounds_the_retry_window(self):
+        offered = QUIZ_BUDGET_SECONDS - RETRY_WINDOW_SECONDS + 30
+        self.at(offered)
+        self.quiz.decide(False, NEXT)
+        self.at(offered + 10)
+        # The quiz budget runs out before the retry window does
+        self.assertAlmostEqual(self.quiz.remaining(), QUIZ_BUDGET_SECONDS - offered - 10)
+
+    def test_retry_window_bounds_the_quiz_budget(self):
+        self.at(5)
+        self.quiz.decide(False, NEXT)
+        self.at(5 + RETRY_WINDOW_SECONDS - MIN_RETRY_SECONDS + 1)
+        self.assertAlmostEqual(self.quiz.remaining(), MIN_RETRY_SECONDS - 1)
+        self.assertLess(self.quiz.remaining(), QUIZ_BUDGET_SECONDS - self.quiz.elapsed())
+        self.assertEqual(self.quiz.decide(False, NEXT), "advance")
+
+    def test_window_opens_at_the_first_offer(self):
+        self.at(5)
+        self.quiz.decide(False, NEXT)
+        self.at(50)
+        self.quiz.decide(False, NEXT)
+        self.assertEqual(self.quiz.next_offered, self.quiz.started + 5)
+        self.assertEqual(self.quiz.next_started(NEXT), self.quiz.started + 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
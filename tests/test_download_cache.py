@@ -0,0 +1,132 @@
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tests.file_server import FileServer
+from tools import download_cache
+from session import CancelScope
+from tools.download_cache import DownloadCache, TransferLimit, TransferLimitExceeded
+
+
+class DownloadCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.cache = DownloadCache(root=os.path.join(self.tmp, "cache"))
+        self.server = FileServer()
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    def serve(self, path, data):
+        self.server.files[path] = data
+        return self.server.url(path)
+
+    def test_blob_is_named_by_sha256(self):
+        data = os.urandom(100_000)
+        result = self.cache.fetch(self.serve("/data.bin", data))
+        self.assertEqual(result["cache"], "miss")
+        self.assertEqual(result["sha256"], hashlib.sha256(data).hexdigest())
+        self.assertEqual(os.path.basename(result["path"]), result["sha256"])
+        with open(result["path"], "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_fresh_url_is_served_without_a_request(self):
+        url = self.serve("/data.bin", b"payload")
+        self.cache.fetch(url)
+        self.assertEqual(self.cache.fetch(url)["cache"], "hit")
+        self.assertEqual(self.server.gets["/data.bin"], 1)
+
+    def test_stale_url_is_revalidated_by_etag(self):
+        url = self.serve("/data.bin", b"payload")
+        self.cache.fetch(url)
+        with mock.patch.object(download_cache, "FRESH_SECONDS", 0):
+            self.assertEqual(self.cache.fetch(url)["cache"], "revalidated")
+            self.server.files["/data.bin"] = b"new payload"
+            result = self.cache.fetch(url)
+        self.assertEqual(result["cache"], "miss")
+        self.assertEqual(result["sha256"], hashlib.sha256(b"new payload").hexdigest())
+        self.assertEqual(self.server.gets["/data.bin"], 2)
+
+    def test_same_content_is_stored_once(self):
+        first = self.cache.fetch(self.serve("/a.csv", b"x,y\n1,2\n"))
+        second = self.cache.fetch(self.serve("/b.csv", b"x,y\n1,2\n"))
+        self.assertEqual(first["path"], second["path"])
+        stats = self.cache.stats()
+        self.assertEqual((stats["blobs"], stats["urls"], stats["deduped"]), (1, 2, 1))
+
+    def test_read_only_fetch_to_hardlinks_the_blob(self):
+        url = self.serve("/data.bin", b"payload")
+        dests = [os.path.join(self.tmp, name) for name in ("one.bin", "two.bin")]
+        results = [self.cache.fetch_to(url, dest, read_only=True) for dest in dests]
+        blob = os.stat(results[0]["path"])
+        for dest in dests:
+            self.assertTrue(os.path.samefile(dest, results[0]["path"]))
+        self.assertEqual(blob.st_nlink, 3)
+        self.assertEqual(stat.S_IMODE(blob.st_mode), 0o444)
+        self.assertEqual(self.server.gets["/data.bin"], 1)
+
+    def test_default_copy_is_private_and_writable(self):
+        url = self.serve("/data.bin", b"payload")
+        dest = os.path.join(self.tmp, "data.bin")
+        result = self.cache.fetch_to(url, dest)
+        self.assertFalse(os.path.samefile(dest, result["path"]))
+        with open(dest, "ab") as f:
+            f.write(b" edited")
+        again = self.cache.fetch(url)
+        self.assertEqual(again["cache"], "hit")
+        with open(again["path"], "rb") as f:
+            self.assertEqual(f.read(), b"payload")
+
+    def test_blob_changed_through_a_link_is_fetched_again(self):
+        url = self.serve("/data.bin", b"payload")
+        dest = os.path.join(self.tmp, "data.bin")
+        self.cache.fetch_to(url, dest, read_only=True)
+        # Only root can get past the read-only bit
+        os.chmod(dest, 0o644)
+        with open(dest, "ab") as f:
+            f.write(b" edited")
+        result = self.cache.fetch(url)
+        self.assertEqual(result["cache"], "miss")
+        with open(result["path"], "rb") as f:
+            self.assertEqual(f.read(), b"payload")
+
+    def test_least_recently_used_blob_is_evicted(self):
+        cache = DownloadCache(root=os.path.join(self.tmp, "small"), max_bytes=250)
+        old = cache.fetch(self.serve("/old", b"o" * 100))
+        cache.fetch(self.serve("/kept", b"k" * 100))
+        cache.fetch(self.serve("/old", b"o" * 100))
+        cache.fetch(self.serve("/new", b"n" * 100))
+        self.assertTrue(os.path.exists(old["path"]))
+        stats = cache.stats()
+        self.assertEqual((stats["evictions"], stats["blobs"]), (1, 2))
+
+    def test_large_file_is_fetched_in_ranges(self):
+        data = os.urandom(300_000)
+        cache = DownloadCache(root=os.path.join(self.tmp, "ranged"), segments=4)
+        with mock.patch.object(download_cache, "PARALLEL_MIN_BYTES", 1024):
+            result = cache.fetch(self.serve("/big.bin", data))
+        self.assertEqual(result["sha256"], hashlib.sha256(data).hexdigest())
+        self.assertEqual(cache.stats()["ranged_downloads"], 1)
+        self.assertEqual(self.server.gets["/big.bin"], 4)
+
+    def test_cancelled_transfer_stops_between_chunks(self):
+        # 2 MB at 16 KB per 50 ms: about 6 s in full
+        url = self.serve("/slow.bin", os.urandom(2 * 1024 * 1024))
+        self.server.delays["/slow.bin"] = 0.05
+        call = threading.Event()
+        threading.Timer(0.3, call.set).start()
+        start = time.time()
+        with self.assertRaises(TransferLimitExceeded):
+            self.cache.fetch_to(url, os.path.join(self.tmp, "slow.bin"), limit=TransferLimit(cancel=CancelScope(call)))
+        self.assertLess(time.time() - start, 3)
+        self.assertEqual(self.cache.stats()["blobs"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from answer_store import fingerprint
+from tools import html_distiller
+from tools.html_distiller import distill_html
+
+URL = "https://quiz.example.com/q1"
+
+
+def page(body: str) -> str:
+    return f"<html><head><title>Quiz</title></head><body><p>Sum the values below.</p>{body}</body></html>"
+
+
+def page_fingerprint(html: str) -> str:
+    identity = distill_html(html, URL)["identity"]
+    return fingerprint(URL, identity["text"], identity["data"])
+
+
+class IdentityTest(unittest.TestCase):
+    def test_same_page_same_fingerprint(self):
+        html = page("<table><tr><td>1</td></tr></table>")
+        self.assertEqual(page_fingerprint(html), page_fingerprint(html))
+
+    def test_pages_differing_outside_the_prose_differ(self):
+        base = page_fingerprint(page(""))
+        for body in (
+            "<table><tr><td>1</td><td>2</td></tr></table>",
+            "<script>const data = atob('MTIz');</script>",
+            '<a href="/files/data.csv">data</a>',
+        ):
+            with self.subTest(body=body):
+                self.assertNotEqual(page_fingerprint(page(body)), base)
+
+    def test_text_past_the_truncation_point_counts(self):
+        filler = "word " * (html_distiller.MAX_TEXT_CHARS // 5)
+        one, two = page(f"<p>{filler} answer is 1</p>"), page(f"<p>{filler} answer is 2</p>")
+        self.assertEqual(distill_html(one, URL)["text"], distill_html(two, URL)["text"])
+        self.assertNotEqual(page_fingerprint(one), page_fingerprint(two))
+
+    def test_rows_past_the_table_cap_count(self):
+        rows = "".join(f"<tr><td>{i}</td></tr>" for i in range(html_distiller.MAX_TABLE_ROWS))
+        one = page(f"<table>{rows}<tr><td>x</td></tr></table>")
+        two = page(f"<table>{rows}<tr><td>y</td></tr></table>")
+        self.assertNotEqual(page_fingerprint(one), page_fingerprint(two))
+
+
+class TablesBudgetTest(unittest.TestCase):
+    def test_tables_past_the_budget_are_left_to_query_page(self):
+        rows = "".join(f"<tr><td>{i}</td><td>{'x' * 40}</td></tr>" for i in range(html_distiller.MAX_TABLE_ROWS))
+        tables = distill_html(page(f"<table>{rows}</table>" * 20), URL)["tables"]
+        self.assertLessEqual(sum(len(t) for t in tables[:-1]), html_distiller.MAX_TABLES_TOTAL)
+        self.assertLess(len(tables), 20)
+        self.assertIn(f"{21 - len(tables)} more table(s)", tables[-1])
+        self.assertIn("query_page", tables[-1])
+
+    def test_small_tables_are_all_kept(self):
+        tables = distill_html(page("<table><tr><td>1</td></tr></table>" * 3), URL)["tables"]
+        self.assertEqual(tables, ["1", "1", "1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
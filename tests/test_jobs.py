@@ -0,0 +1,126 @@
+import threading
+import time
+import unittest
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+import jobs
+from jobs import JobManager, QueueFull
+from session import RunCancelled
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+class JobManagerTest(unittest.TestCase):
+    def setUp(self):
+        # In-memory sessions instead of LLMFiles/<session_id> workdirs
+        self.sessions = {}
+
+        def create_session(url):
+            session = SimpleNamespace(id=uuid.uuid4().hex, url=url, cancel_event=threading.Event())
+            self.sessions[session.id] = session
+            return session
+
+        for name, fake in {"create_session": create_session, "get_session": self.sessions.__getitem__}.items():
+            patcher = mock.patch.object(jobs, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.started = []
+        self.release = threading.Event()
+
+    def runner(self, url, session):
+        self.started.append(url)
+        while not self.release.wait(0.01):
+            if session.cancel_event.is_set():
+                raise RunCancelled()
+        if url.endswith("/fail"):
+            raise ValueError("boom")
+
+    def manager(self, workers=1, queue_size=1):
+        manager = JobManager(self.runner, workers=workers, queue_size=queue_size)
+        manager.start()
+        self.addCleanup(manager.stop)
+        return manager
+
+    def test_full_queue_rejects_submissions(self):
+        manager = self.manager()
+        running = manager.submit("https://x.com/1")
+        wait_for(lambda: running.status == "running")
+        queued = manager.submit("https://x.com/2")
+        with self.assertRaises(QueueFull):
+            manager.submit("https://x.com/3")
+        self.assertEqual(manager.stats()["queued"], 1)
+        # The rejected job is not left behind in the job list
+        self.assertEqual(sum(manager.stats()["jobs"].values()), 2)
+        self.release.set()
+        wait_for(lambda: queued.status == "done")
+        self.assertEqual(self.started, ["https://x.com/1", "https://x.com/2"])
+
+    def test_stop_with_a_full_queue_does_not_block(self):
+        manager = self.manager()
+        running = manager.submit("https://x.com/1")
+        wait_for(lambda: running.status == "running")
+        queued = manager.submit("https://x.com/2")
+        start = time.time()
+        manager.stop()
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual((running.status, queued.status), ("cancelled", "cancelled"))
+        self.assertIsNotNone(queued.finished)
+        self.assertEqual(self.started, ["https://x.com/1"])
+        with self.assertRaises(QueueFull):
+            manager.submit("https://x.com/3")
+
+    def test_job_is_registered_before_a_worker_runs_it(self):
+        manager = self.manager()
+        known = []
+        manager._runner = lambda url, session: known.append(url in {job.url for job in manager._jobs.values()})
+        put_nowait = manager._queue.put_nowait
+
+        def slow_put(job):
+            # Give the worker time to pick the job up before submit returns
+            put_nowait(job)
+            time.sleep(0.2)
+
+        with mock.patch.object(manager._queue, "put_nowait", slow_put):
+            job = manager.submit("https://x.com/1")
+        wait_for(lambda: job.finished is not None)
+        self.assertEqual(known, [True])
+
+    def test_restart_after_stop(self):
+        manager = self.manager()
+        manager.stop()
+        manager.start()
+        self.release.set()
+        job = manager.submit("https://x.com/1")
+        wait_for(lambda: job.status == "done")
+
+    def test_cancelled_queued_job_never_runs(self):
+        manager = self.manager()
+        running = manager.submit("https://x.com/1")
+        wait_for(lambda: running.status == "running")
+        queued = manager.submit("https://x.com/2")
+        self.assertTrue(manager.cancel(queued.id))
+        self.release.set()
+        wait_for(lambda: queued.finished is not None)
+        self.assertEqual(queued.status, "cancelled")
+        self.assertEqual(self.started, ["https://x.com/1"])
+        self.assertFalse(manager.cancel(queued.id))
+
+    def test_failure_is_recorded(self):
+        manager = self.manager()
+        self.release.set()
+        job = manager.submit("https://x.com/fail")
+        wait_for(lambda: job.finished is not None)
+        self.assertEqual((job.status, job.error), ("failed", "ValueError: boom"))
+        self.assertEqual(manager.stats()["jobs"], {"failed": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from tests.file_server import FileServer
+from tools import prefetcher
+from tools.download_cache import DownloadCache, TransferLimit, TransferLimitExceeded
+from tools.prefetcher import Prefetcher
+
+KB = 1024
+
+
+class TransferLimitTest(unittest.TestCase):
+    def test_open_reserves_announced_size(self):
+        page = TransferLimit(100)
+        first = page.open(60)
+        self.assertIsNotNone(first)
+        self.assertIsNone(page.open(60))
+        first.close()
+        self.assertEqual(page.reserved, 0)
+        self.assertIsNotNone(page.open(60))
+
+    def test_received_bytes_move_from_reserved_to_used(self):
+        page = TransferLimit(100)
+        child = page.open(60)
+        child.consume(40)
+        self.assertEqual((page.used, page.reserved), (40, 20))
+        child.close()
+        self.assertEqual((page.used, page.reserved), (40, 0))
+        # Bytes already received still count against the page
+        self.assertIsNone(page.open(61))
+
+    def test_body_longer_than_announced_is_stopped(self):
+        page = TransferLimit(100)
+        child = page.open(10, max_bytes=50)
+        child.consume(50)
+        with self.assertRaises(TransferLimitExceeded):
+            child.consume(1)
+        self.assertEqual(page.used, 51)
+
+    def test_page_cap_stops_an_uncapped_child(self):
+        page = TransferLimit(100)
+        child = page.open(10)
+        with self.assertRaises(TransferLimitExceeded):
+            child.consume(101)
+
+    def test_deadline(self):
+        page = TransferLimit(until=time.time() - 1)
+        self.assertIsNone(page.open(1))
+        child = TransferLimit(until=time.time() - 1)
+        child.consume(0)
+        with self.assertRaises(TransferLimitExceeded):
+            child.consume(1)
+
+
+class PrefetcherTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = DownloadCache(root=os.path.join(tmp.name, "cache"))
+        self.server = FileServer()
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.prefetcher = Prefetcher(workers=4)
+        self.addCleanup(self.prefetcher._pool.shutdown)
+        self.session = SimpleNamespace(id="s1", deadline=SimpleNamespace(tool_budget=lambda tool: 60))
+        for name, value in {
+            "DOWNLOAD_CACHE": self.cache, "PREFETCH_ENABLED": True, "PREFETCH_SECONDS": 5,
+            "PREFETCH_MAX_MB_PER_PAGE": 150 / 1024, "PREFETCH_MAX_FILE_MB": 120 / 1024,
+        }.items():
+            patcher = mock.patch.object(prefetcher, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def serve(self, path, size):
+        self.server.files[path] = os.urandom(size)
+        return self.server.url(path)
+
+    def run_prefetch(self, urls):
+        self.assertEqual(self.prefetcher.schedule(self.session, urls), len(urls))
+        for url in urls:
+            self.prefetcher._entries[(self.session.id, url)]["future"].result(timeout=10)
+        return self.prefetcher.stats()
+
+    def test_used_and_wasted_bytes(self):
+        used, unused = self.serve("/used", 40 * KB), self.serve("/unused", 30 * KB)
+        stats = self.run_prefetch([used, unused])
+        self.assertEqual((stats["fetched"], stats["bytes_prefetched"]), (2, 70 * KB))
+        self.assertTrue(self.prefetcher.claim("s1", used))
+        self.assertFalse(self.prefetcher.claim("s1", self.server.url("/never-scheduled")))
+        self.prefetcher.release("s1")
+        stats = self.prefetcher.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+        self.assertEqual((stats["bytes_used"], stats["bytes_wasted"]), (40 * KB, 30 * KB))
+
+    def test_each_asset_costs_one_head(self):
+        url = self.serve("/data", 20 * KB)
+        self.assertEqual(self.run_prefetch([url])["fetched"], 1)
+        self.assertEqual((self.server.heads["/data"], self.server.gets["/data"]), (1, 1))
+
+    def test_repeated_claims_count_bytes_once(self):
+        url = self.serve("/data", 20 * KB)
+        self.run_prefetch([url])
+        self.assertTrue(self.prefetcher.claim("s1", url))
+        self.assertTrue(self.prefetcher.claim("s1", url))
+        stats = self.prefetcher.stats()
+        self.assertEqual((stats["hits"], stats["bytes_used"]), (2, 20 * KB))
+
+    def test_page_budget_is_shared(self):
+        urls = [self.serve(f"/f{i}", 100 * KB) for i in range(3)]
+        stats = self.run_prefetch(urls)
+        self.assertEqual((stats["fetched"], stats["skipped"]), (1, 2))
+        self.assertEqual(stats["bytes_prefetched"], 100 * KB)
+
+    def test_oversized_and_unknown_sizes_are_skipped(self):
+        big, unknown = self.serve("/big", 130 * KB), self.serve("/unknown", 10 * KB)
+        self.server.lengths["/unknown"] = None
+        stats = self.run_prefetch([big, unknown])
+        self.assertEqual((stats["skipped"], stats["fetched"]), (2, 0))
+        self.assertNotIn("/big", self.server.gets)
+        self.assertNotIn("/unknown", self.server.gets)
+
+    def test_body_larger_than_announced_is_cut_off(self):
+        url = self.serve("/liar", 600 * KB)
+        self.server.lengths["/liar"] = 10 * KB
+        stats = self.run_prefetch([url])
+        self.assertEqual((stats["skipped"], stats["bytes_prefetched"]), (1, 0))
+        self.assertEqual(self.cache.stats()["blobs"], 0)
+        self.assertFalse(self.prefetcher.claim("s1", url))
+
+    def test_slow_transfer_is_stopped_at_the_deadline(self):
+        url = self.serve("/slow", 100 * KB)
+        self.server.delays["/slow"] = 0.1
+        with mock.patch.object(prefetcher, "PREFETCH_SECONDS", 0.3):
+            stats = self.run_prefetch([url])
+        self.assertEqual(stats["fetched"], 0)
+        self.assertEqual(self.cache.stats()["blobs"], 0)
+
+    def test_claim_waits_for_a_transfer_under_way(self):
+        url = self.serve("/slow", 32 * KB)
+        self.server.delays["/slow"] = 0.2
+        self.prefetcher.schedule(self.session, [url])
+        self.assertTrue(self.prefetcher.claim("s1", url))
+        self.assertEqual(self.prefetcher.stats()["bytes_used"], 32 * KB)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from rate_limiter import MAX_POLL_SECONDS, AdaptiveRateLimiter, is_throttled, retry_after
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.limiter = self.make()
+
+    def make(self, **kwargs):
+        options = {"rate_per_minute": 60, "min_per_minute": 2, "max_per_minute": 120, "burst": 3}
+        options.update(kwargs)
+        return AdaptiveRateLimiter(path=os.path.join(self._tmp.name, "limits.sqlite3"), **options)
+
+    def set_tokens(self, tokens):
+        def update(conn, now):
+            self.limiter._bucket(conn, now)
+            conn.execute("UPDATE buckets SET tokens = ?, updated = ?", (tokens, now))
+        self.limiter._transaction(update)
+
+    def test_burst_is_granted_then_refill_rate_applies(self):
+        for i in range(3):
+            self.assertEqual(self.limiter._try_take(f"w{i}", 0, 0), 0)
+        wait = self.limiter._try_take("w3", 0, 0)
+        # One token per second at 60/minute
+        self.assertGreater(wait, 0.9)
+        self.assertLessEqual(wait, 1.0)
+
+    def test_bucket_is_shared_through_the_database(self):
+        other = self.make()
+        for i in range(3):
+            self.assertEqual(self.limiter._try_take(f"w{i}", 0, 0), 0)
+        self.assertGreater(other._try_take("elsewhere", 0, 0), 0)
+
+    def test_throttle_halves_rate_and_blocks_for_hint(self):
+        self.limiter._adjust(True, 5.0)
+        stats = self.limiter.stats()
+        self.assertEqual(stats["rate_per_minute"], 30)
+        self.assertGreater(stats["blocked_seconds"], 4)
+        self.assertGreater(self.limiter._try_take("w", 0, 0), 4)
+
+    def test_rate_stays_within_bounds(self):
+        for _ in range(10):
+            self.limiter._adjust(True, 0.01)
+        self.assertEqual(self.limiter.stats()["rate_per_minute"], 2)
+        limiter = self.make(name="fast", rate_per_minute=119.9)
+        limiter._adjust(False, None)
+        self.assertEqual(limiter.stats()["rate_per_minute"], 120)
+
+    def test_success_raises_rate_additively(self):
+        self.limiter._adjust(False, None)
+        self.assertEqual(self.limiter.stats()["rate_per_minute"], 60.25)
+
+    def test_most_urgent_waiter_gets_the_token(self):
+        self.set_tokens(0)
+        self.assertGreater(self.limiter._try_take("relaxed", 100, 1), 0)
+        self.assertGreater(self.limiter._try_take("urgent", 1, 2), 0)
+        self.set_tokens(1)
+        self.assertEqual(self.limiter._try_take("relaxed", 100, 1), MAX_POLL_SECONDS / 5)
+        self.assertEqual(self.limiter._try_take("urgent", 1, 2), 0)
+
+    def test_acquire_records_wait_stats(self):
+        waits = [asyncio.run(self.limiter.acquire()) for _ in range(3)]
+        self.assertTrue(all(w < 0.5 for w in waits))
+        stats = self.limiter.stats()
+        self.assertEqual(stats["acquired"], 3)
+        self.assertEqual(stats["waiting"], 0)
+
+
+class ThrottleDetectionTest(unittest.TestCase):
+    def test_is_throttled(self):
+        self.assertTrue(is_throttled(RuntimeError("429 RESOURCE_EXHAUSTED: quota")))
+        self.assertFalse(is_throttled(RuntimeError("500 internal")))
+
+    def test_retry_after_from_message(self):
+        self.assertEqual(retry_after(RuntimeError("Please retry in 12.5s.")), 12.5)
+        self.assertEqual(retry_after(RuntimeError("{'retryDelay': '7s'}")), 7.0)
+        self.assertIsNone(retry_after(RuntimeError("no hint")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from tools import speech_engine
+from tools.speech_engine import MAX_SEGMENT_MS, PAD_MS, split_on_silence
+
+
+class FakeAudio:
+    dBFS = -20.0
+
+    def __init__(self, length_ms: int):
+        self.length_ms = length_ms
+
+    def __len__(self):
+        return self.length_ms
+
+
+def split(spans, length_ms):
+    silence = SimpleNamespace(detect_nonsilent=lambda *args, **kwargs: spans)
+    with mock.patch.object(speech_engine.STARTUP, "timed_import", return_value=silence):
+        return split_on_silence(FakeAudio(length_ms))
+
+
+class SplitOnSilenceTest(unittest.TestCase):
+    def test_padding_stops_at_the_previous_segment(self):
+        # The pause is shorter than the padding on both sides of it
+        first_end = MAX_SEGMENT_MS - 2 * PAD_MS
+        gap = PAD_MS
+        segments = split([(0, first_end), (first_end + gap, first_end + gap + 1000)], 30_000)
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(segments[1][0], segments[0][1])
+
+    def test_segments_never_overlap(self):
+        spans = [(i * 4000, i * 4000 + 3900) for i in range(20)]
+        segments = split(spans, 80_000)
+        for before, after in zip(segments, segments[1:]):
+            self.assertLessEqual(before[1], after[0])
+        self.assertTrue(all(end - start <= MAX_SEGMENT_MS for start, end in segments))
+
+    def test_close_spans_merge_up_to_the_limit(self):
+        segments = split([(1000, 2000), (3000, 4000)], 10_000)
+        self.assertEqual(segments, [(1000 - PAD_MS, 4000 + PAD_MS)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from types import SimpleNamespace
+
+from token_ledger import MESSAGE_OVERHEAD, TokenLedger, estimate_tokens
+
+
+def message(chars, id=None, type="human"):
+    return SimpleNamespace(content="x" * chars, id=id, type=type)
+
+
+def reported(tokens):
+    return SimpleNamespace(usage_metadata={"input_tokens": tokens})
+
+
+class CalibrationTest(unittest.TestCase):
+    def feed(self, ledger, pairs):
+        for i, (estimated, actual) in enumerate(pairs):
+            # One message estimated at exactly `estimated` tokens
+            msg = message((estimated - MESSAGE_OVERHEAD) * 4, id=f"m{i}")
+            self.assertEqual(ledger.record_prompt([msg], reported(actual)), estimated)
+
+    def test_uncalibrated(self):
+        self.assertEqual(TokenLedger().calibration(), (0.0, 1.0))
+
+    def test_fits_offset_and_ratio(self):
+        ledger = TokenLedger()
+        self.feed(ledger, [(e, round(2000 + 1.1 * e)) for e in (500, 1500, 4000, 9000)])
+        offset, ratio = ledger.calibration()
+        self.assertAlmostEqual(ratio, 1.1, places=3)
+        self.assertAlmostEqual(offset, 2000, delta=1)
+        self.assertEqual(ledger.stats()["estimate_offset"], 2000)
+
+    def test_fixed_overhead_does_not_inflate_ratio(self):
+        # Short prompts dominated by tool schemas: ratio alone would read ~5x
+        ledger = TokenLedger()
+        self.feed(ledger, [(e, 3000 + e) for e in (400, 800, 1200)])
+        offset, ratio = ledger.calibration()
+        self.assertAlmostEqual(ratio, 1.0, places=3)
+        self.assertAlmostEqual(offset, 3000, delta=1)
+
+    def test_narrow_spread_only_learns_offset(self):
+        ledger = TokenLedger()
+        self.feed(ledger, [(1000, 1500), (1050, 1400)])
+        offset, ratio = ledger.calibration()
+        self.assertEqual(ratio, 1.0)
+        self.assertAlmostEqual(offset, 425)
+
+    def test_ratio_is_clamped(self):
+        ledger = TokenLedger()
+        self.feed(ledger, [(100, 100), (1100, 10000)])
+        self.assertEqual(ledger.ratio, 2.0)
+
+
+class TrimmingTest(unittest.TestCase):
+    def history(self, n, chars=384):
+        # 100 estimated tokens per message
+        return [message(chars, id="sys", type="system")] + [message(chars, id=f"m{i}") for i in range(n)]
+
+    def test_estimate(self):
+        self.assertEqual(estimate_tokens(message(384)), 100)
+
+    def test_total_uses_calibration(self):
+        ledger = TokenLedger()
+        messages = self.history(4)
+        self.assertEqual(ledger.total(messages), 500)
+        ledger.record_prompt(messages[:1], reported(100))
+        ledger.record_prompt(messages, reported(1300))
+        # Slope 1200 / 400 = 3 is clamped to 2; the offset absorbs the rest
+        offset, ratio = ledger.calibration()
+        self.assertEqual((offset, ratio), (100.0, 2.0))
+        self.assertEqual(ledger.total(messages), round(offset + 500 * ratio))
+
+    def test_tail_fits_budget(self):
+        ledger = TokenLedger()
+        messages = self.history(10)
+        self.assertEqual(ledger.tail_start(messages, 2000), (1, 1))
+        # System prompt (100) + 3 messages (300)
+        self.assertEqual(ledger.tail_start(messages, 400), (1, 8))
+        self.assertEqual(ledger.tail_start(messages, 400, reserved=100), (1, 9))
+
+    def test_tail_never_opens_with_tool_result(self):
+        ledger = TokenLedger()
+        messages = self.history(6)
+        messages[4].type = messages[5].type = "tool"
+        self.assertEqual(ledger.tail_start(messages, 400), (1, 6))
+
+    def test_rewritten_history_is_recounted(self):
+        ledger = TokenLedger()
+        messages = self.history(4)
+        ledger.total(messages)
+        rewritten = messages[:1] + [message(3984, id="summary")]
+        self.assertEqual(ledger.total(rewritten), 1100)
+
+
+if __name__ == "__main__":
+    unittest.main()
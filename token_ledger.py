@@ -0,0 +1,166 @@
+import json
+from typing import List, Tuple
+
+CHARS_PER_TOKEN = 4
+# Role markers and framing the provider adds around every message
+MESSAGE_OVERHEAD = 4
+# What Gemini bills for one inline image
+IMAGE_TOKENS = 258
+# Prompts must differ in size by this many estimated tokens before the
+# per-token ratio is fitted; until then only the fixed offset is learned
+MIN_CALIBRATION_SPREAD = 200
+
+
+def estimate_tokens(message) -> int:
+    """Cheap local token estimate: characters / 4 plus a per-message overhead."""
+    content = getattr(message, "content", "")
+    chars, images = 0, 0
+    if isinstance(content, str):
+        chars += len(content)
+    else:
+        for part in content:
+            if isinstance(part, str):
+                chars += len(part)
+            elif part.get("type") in ("image_url", "image", "media"):
+                images += 1
+            else:
+                chars += len(part.get("text", "")) or len(json.dumps(part, default=str))
+    for call in getattr(message, "tool_calls", None) or []:
+        chars += len(call.get("name", "")) + len(json.dumps(call.get("args", {}), default=str))
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS + MESSAGE_OVERHEAD
+
+
+class TokenLedger:
+    """
+    Per-run token bookkeeping for the conversation.
+
+    Every message is estimated once and the count is cached under its id
+    (add_messages gives each message a stable one). The history only grows
+    by appending, so a running prefix sum lets each turn price just the new
+    messages and find the trim point by bisection instead of re-counting the
+    whole conversation. The split itself is left to the caller, which
+    compacts the dropped messages (see run_memory).
+
+    The provider's reported input tokens are compared with our estimate for
+    the same prompts and fitted as `offset + ratio * estimate`. The offset
+    absorbs what every prompt carries but the messages do not show (tool
+    schemas, system framing), so short prompts do not inflate the ratio.
+    The fit corrects the estimate before it is checked against the budget.
+    """
+
+    def __init__(self):
+        self._counts = {}        # message id -> estimated tokens
+        self._ids = []           # ids of the history the prefix sums describe
+        self._prefix = [0]       # _prefix[i] = tokens of the first i messages
+        self.prompts = 0
+        self.prompt_tokens_estimated = 0
+        self.prompt_tokens_reported = 0
+        # Least-squares sums over (estimated, reported) pairs
+        self._n = 0
+        self._sum_e = self._sum_r = self._sum_ee = self._sum_er = 0.0
+        self._min_e = self._max_e = None
+
+    def count(self, message) -> int:
+        message_id = getattr(message, "id", None)
+        if message_id is None:
+            return estimate_tokens(message)
+        tokens = self._counts.get(message_id)
+        if tokens is None:
+            tokens = self._counts[message_id] = estimate_tokens(message)
+        return tokens
+
+    def _sync(self, messages: List):
+        """Extend the prefix sums to cover `messages`, rebuilding only if history was rewritten."""
+        n = len(self._ids)
+        if n > len(messages) or (n and getattr(messages[n - 1], "id", None) != self._ids[-1]):
+            self._ids, self._prefix, n = [], [0], 0
+        for message in messages[n:]:
+            self._ids.append(getattr(message, "id", None))
+            self._prefix.append(self._prefix[-1] + self.count(message))
+
+    def calibration(self) -> Tuple[float, float]:
+        """
+        (offset, ratio) such that reported ≈ offset + ratio * estimated.
+        The ratio is clamped to a sane range and the offset is never negative.
+        """
+        if not self._n:
+            return 0.0, 1.0
+        mean_e, mean_r = self._sum_e / self._n, self._sum_r / self._n
+        ratio = 1.0
+        if self._n >= 2 and self._max_e - self._min_e >= MIN_CALIBRATION_SPREAD:
+            variance = self._sum_ee / self._n - mean_e * mean_e
+            covariance = self._sum_er / self._n - mean_e * mean_r
+            if variance > 0:
+                ratio = min(2.0, max(0.5, covariance / variance))
+        return max(0.0, mean_r - ratio * mean_e), ratio
+
+    @property
+    def ratio(self) -> float:
+        return self.calibration()[1]
+
+    def total(self, messages: List) -> int:
+        self._sync(messages)
+        offset, ratio = self.calibration()
+        return round(offset + self._prefix[-1] * ratio)
+
+    def tail_start(self, messages: List, max_tokens: int, reserved: int = 0) -> Tuple[int, int]:
+        """
+        Split the history for the prompt. Returns (head, start): messages
+        before `head` are the system prompt, messages from `start` on are the
+        longest tail that fits in `max_tokens` minus `reserved`, and
+        messages[head:start] are the ones that no longer fit.
+
+        The tail is moved forward past tool results so it never opens with a
+        ToolMessage (a function response without its call is rejected), but
+        always keeps the latest turn.
+        """
+        self._sync(messages)
+        has_system = bool(messages) and getattr(messages[0], "type", None) == "system"
+        head = 1 if has_system else 0
+        offset, ratio = self.calibration()
+        budget = (max_tokens - offset) / ratio - reserved - self._prefix[head]
+        if self._prefix[-1] - self._prefix[head] <= budget:
+            return head, head
+
+        # Smallest start index whose suffix fits: prefix[-1] - prefix[start] <= budget
+        lo, hi = head, len(messages)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._prefix[-1] - self._prefix[mid] <= budget:
+                hi = mid
+            else:
+                lo = mid + 1
+        last_turn = len(messages) - 1
+        while last_turn > head and getattr(messages[last_turn], "type", None) == "tool":
+            last_turn -= 1
+        start = lo
+        while start < last_turn and getattr(messages[start], "type", None) == "tool":
+            start += 1
+        return head, min(start, last_turn)
+
+    def record_prompt(self, messages: List, response=None) -> int:
+        """Account for one model call; returns its estimated prompt tokens."""
+        estimated = sum(self.count(m) for m in messages)
+        self.prompts += 1
+        self.prompt_tokens_estimated += estimated
+        usage = getattr(response, "usage_metadata", None) or {}
+        reported = usage.get("input_tokens")
+        if reported:
+            self.prompt_tokens_reported += reported
+            self._n += 1
+            self._sum_e += estimated
+            self._sum_r += reported
+            self._sum_ee += estimated * estimated
+            self._sum_er += estimated * reported
+            self._min_e = estimated if self._min_e is None else min(self._min_e, estimated)
+            self._max_e = estimated if self._max_e is None else max(self._max_e, estimated)
+        return estimated
+
+    def stats(self) -> dict:
+        return {
+            "prompts": self.prompts,
+            "prompt_tokens_estimated": self.prompt_tokens_estimated,
+            "prompt_tokens_reported": self.prompt_tokens_reported,
+            "estimate_ratio": round(self.ratio, 3),
+            "estimate_offset": round(self.calibration()[0]),
+        }
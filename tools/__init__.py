@@ -1,7 +1,10 @@
 from .web_scraper import get_rendered_html
+from .query_page import query_page
 from .run_code import run_code 
 from .send_request import post_request
 from .download_file import download_file
+from .profile_dataset import profile_dataset
+from .extract_pdf import extract_pdf
 from .add_dependencies import add_dependencies
 from .image_content_extracter import ocr_image_tool
 from .audio_transcribing import transcribe_audio
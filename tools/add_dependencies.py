@@ -1,38 +1,172 @@
-from typing import List
+from typing import Annotated, List
 from langchain_core.tools import tool
-import subprocess
+from langgraph.prebuilt import InjectedState
+from session import Session, get_session
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+from dotenv import load_dotenv
+import asyncio
+import importlib.metadata
+import os
+import shutil
+import sys
+import time
+import code_worker
+
+load_dotenv()
+
+# Local wheels to install from (e.g. built with `pip wheel -w wheelhouse pkg`)
+WHEELHOUSE = os.getenv("WHEELHOUSE", "")
+# Set DEPENDENCIES_OFFLINE=1 to never reach a package index
+OFFLINE = os.getenv("DEPENDENCIES_OFFLINE", "0") == "1"
+UNSATISFIABLE = (
+    "run_code keeps importing the server's own version of the packages under \"unsatisfiable\"; "
+    "write code that works with that version instead"
+)
+
+
+def overlay_dir(session: Session) -> str:
+    """Per-run install target; run_code appends it to sys.path."""
+    return os.path.join(session.workdir, code_worker.PACKAGES_DIR)
+
+
+def server_version(name: str):
+    """Version of a distribution in the server environment, else None."""
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def installed_version(name: str, overlay: str):
+    """Version of a distribution in the server environment or the run's overlay, else None."""
+    version = server_version(name)
+    if version is not None:
+        return version
+    for dist in importlib.metadata.distributions(path=[overlay]):
+        if canonicalize_name(dist.metadata["Name"] or "") == canonicalize_name(name):
+            return dist.version
+    return None
+
+
+def missing_requirements(dependencies: List[str], overlay: str):
+    """
+    Split requirement strings into (already satisfied, to install,
+    unsatisfiable). The overlay comes last on run_code's sys.path, so a
+    package the server already has cannot be replaced by another version.
+    """
+    present, missing, conflicts = [], [], []
+    for spec in dependencies:
+        try:
+            req = Requirement(spec)
+        except InvalidRequirement:
+            missing.append(spec)   # let the installer report it
+            continue
+        version = installed_version(req.name, overlay)
+        if version is not None and req.specifier.contains(version, prereleases=True):
+            present.append(f"{req.name}=={version}")
+        elif server_version(req.name) is not None:
+            conflicts.append(f"{spec} (run_code always imports {req.name}=={version})")
+        else:
+            missing.append(spec)
+    return present, missing, conflicts
+
+
+def shadowed_packages(overlay: str) -> List[str]:
+    """Overlay packages (e.g. pulled in as dependencies) hidden by another version on the server."""
+    shadowed = []
+    for dist in importlib.metadata.distributions(path=[overlay]):
+        name = dist.metadata["Name"] or ""
+        version = server_version(name) if name else None
+        if version is not None and version != dist.version:
+            shadowed.append(f"{name}=={dist.version} (run_code imports {name}=={version})")
+    return shadowed
+
+
+def install_command(packages: List[str], overlay: str) -> List[str]:
+    """`uv pip install --target` into the overlay, or pip when uv is unavailable."""
+    if shutil.which("uv"):
+        # uv links files out of its global cache, so repeat installs are near-instant
+        cmd = ["uv", "pip", "install", "--python", sys.executable, "--target", overlay]
+        if OFFLINE:
+            cmd.append("--offline")
+    else:
+        cmd = [sys.executable, "-m", "pip", "install", "--disable-pip-version-check", "--target", overlay]
+        if OFFLINE:
+            cmd.append("--no-index")
+    if WHEELHOUSE:
+        cmd += ["--find-links", WHEELHOUSE]
+    return cmd + packages
 
 
 @tool
-def add_dependencies(dependencies: List[str]) -> str:
+async def add_dependencies(
+    dependencies: List[str],
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> dict:
     """
-    Install the given Python packages into the environment.
+    Make Python packages importable in run_code.
+
+    Packages that are already installed (most data-science libraries are)
+    are skipped; only missing ones are installed, all in one batch, into
+    this run's private package directory. The project itself is not
+    modified, so a different version of an installed package cannot be
+    used: such requirements are reported as "unsatisfiable".
 
     Parameters:
         dependencies (List[str]):
-            A list of Python package names to install. Each name must match the 
-            corresponding package name on PyPI.
+            PyPI distribution names, optionally with a version specifier,
+            e.g. ["pandas", "pyyaml>=6", "scikit-learn"].
 
     Returns:
-        str:
-            A message indicating success or failure.
+        {
+            "already_installed": ["pandas==2.3.3", ...],
+            "installed": ["pyyaml>=6", ...],
+            "seconds": <install time>,
+            "installer": "uv" | "pip",
+            "unsatisfiable": [<versions run_code cannot import>, ...] (only if any)
+        }
+        with an "error" if the installation failed or something is unsatisfiable.
     """
+    session = get_session(session_id)
+    overlay = overlay_dir(session)
+    start = time.perf_counter()
+    present, missing, conflicts = await asyncio.to_thread(missing_requirements, dependencies, overlay)
+    result = {"already_installed": present, "installed": [], "seconds": 0.0}
+    if conflicts:
+        result["unsatisfiable"] = conflicts
+        result["error"] = UNSATISFIABLE
+    if not missing:
+        if present:
+            print(f"Dependencies already installed: {', '.join(present)}")
+        return result
 
+    os.makedirs(overlay, exist_ok=True)
+    cmd = install_command(missing, overlay)
+    result["installer"] = "uv" if cmd[0] == "uv" else "pip"
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
     try:
-        subprocess.check_call(
-            ["uv", "add"] + dependencies,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+        _, stderr = await asyncio.wait_for(
+            proc.communicate(), timeout=session.deadline.tool_budget("add_dependencies")
         )
-        return "Successfully installed dependencies: " + ", ".join(dependencies)
-    
-    except subprocess.CalledProcessError as e:
-        return (
-            "Dependency installation failed.\n"
-            f"Exit code: {e.returncode}\n"
-            f"Error: {e.stderr or 'No error output.'}"
-        )
-    
-    except Exception as e:
-        return f"Unexpected error while installing dependencies: {e}" 
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return {**result, "error": "Dependency installation timed out; use packages that are already installed"}
+    except asyncio.CancelledError:
+        proc.kill()
+        raise
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    if proc.returncode != 0:
+        error = stderr.decode("utf-8", "replace").strip()[-2000:]
+        return {**result, "error": f"Dependency installation failed (exit {proc.returncode}):\n{error}"}
+
+    result["installed"] = missing
+    print(f"Installed {', '.join(missing)} with {result['installer']} in {result['seconds']}s")
+    shadowed = await asyncio.to_thread(shadowed_packages, overlay)
+    if shadowed:
+        result["unsatisfiable"] = result.get("unsatisfiable", []) + shadowed
+        result["error"] = UNSATISFIABLE
+    return result
@@ -1,75 +1,55 @@
 from langchain.tools import tool
-import speech_recognition as sr
-from pydub import AudioSegment
 import os
+from langgraph.prebuilt import InjectedState
+from session import get_session
+from typing import Annotated
+from .speech_engine import SPEECH_ENGINE
 
 @tool
-def transcribe_audio(file_path: str) -> str:
+async def transcribe_audio(
+    file_path: str,
+    language: str = "en-US",
+    backend: str = "",
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> dict:
     """
-    Transcribe an MP3 or WAV audio file into text using Google's Web Speech API.
+    Transcribe an audio file (MP3, WAV, OGG, M4A, ... anything ffmpeg reads) into text.
 
     Args:
-        file_path (str): Path to the input audio file (.mp3 or .wav).
+        file_path (str): Filename of the audio in the working directory.
+        language (str): BCP-47 language of the speech, e.g. "en-US" or "hi-IN".
+        backend (str): "google" (Web Speech API, needs internet) or "sphinx"
+            (offline, less accurate). Empty uses the server default.
 
     Returns:
-        str: The transcribed text from the audio.
+    {
+        "text": "<transcript>",
+        "cached": bool,
+        "backend": "google",
+        "segments": <speech segments transcribed in parallel>,
+        "failed_segments": ["<start-end: error>", ...]   # only if some failed
+    }
 
     Notes:
-        - MP3 files are automatically converted to WAV.
-        - Requires `pydub` and `speech_recognition` packages.
-        - Uses Google's free recognize_google() API (requires internet).
+        - The audio is split at pauses and the pieces are transcribed
+          concurrently, then joined in order.
+        - The same file is never transcribed twice.
     """
     try:
-        # Build full path
-        file_path = os.path.join("LLMFiles", file_path)
+        file_path = os.path.join(get_session(session_id).workdir, file_path)
         print(f"Processing audio file: {file_path}")
 
         if not os.path.exists(file_path):
             return f"Error: File not found at {file_path}"
 
-        final_path = file_path
-
-        # Convert MP3 → WAV if needed with proper audio settings
-        if file_path.lower().endswith(".mp3"):
-            print("Converting MP3 to WAV...")
-            sound = AudioSegment.from_mp3(file_path)
-
-            # Convert to mono and set proper sample rate for speech recognition
-            sound = sound.set_channels(1).set_frame_rate(16000)
-
-            final_path = file_path.replace(".mp3", ".wav")
-            sound.export(final_path, format="wav")
-            print(f"Converted to: {final_path}")
-
-        # Speech recognition with improved settings
-        recognizer = sr.Recognizer()
-
-        # Adjust recognizer settings for better accuracy
-        recognizer.energy_threshold = 300
-        recognizer.dynamic_energy_threshold = True
-        recognizer.pause_threshold = 0.8
-
-        print("Starting transcription...")
-        with sr.AudioFile(final_path) as source:
-            # Record the audio with adjustment for ambient noise
-            recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            audio_data = recognizer.record(source)
-
-            # Try transcription with show_all to get alternatives if needed
-            try:
-                text = recognizer.recognize_google(audio_data, show_all=False)
-                print(f"Transcription successful: {text}")
-            except sr.UnknownValueError:
-                return "Error: Could not understand audio - speech may be unclear or too noisy"
-            except sr.RequestError as e:
-                return f"Error: Could not request results from Google Speech Recognition service: {e}"
-
-        # Clean up temporary WAV file if we converted
-        if final_path != file_path and os.path.exists(final_path):
-            os.remove(final_path)
-            print("Cleaned up temporary WAV file")
-
-        return text
+        result = await SPEECH_ENGINE.transcribe(file_path, language, backend)
+        print(
+            f"Transcribed {result.get('segments', 0)} segment(s) with {result['backend']}"
+            f"{' (cached)' if result['cached'] else ''}: {result['text'][:80]}"
+        )
+        if not result["text"] and not result.get("failed_segments"):
+            return "Error: Could not understand audio - speech may be unclear or too noisy"
+        return result
 
     except FileNotFoundError as e:
         return f"Error: Audio file not found - {e}"
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from startup import STARTUP
+
+load_dotenv()
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))
+CONTEXT_MAX_USES = int(os.getenv("BROWSER_CONTEXT_MAX_USES", "20"))
+NAVIGATION_TIMEOUT_MS = 30000
+
+
+class BrowserPool:
+    """
+    Long-lived headless Chromium that hands out isolated browser contexts.
+
+    Playwright objects are bound to the event loop that created them, so the
+    pool owns a private asyncio loop running on a daemon thread. Callers from
+    any thread submit coroutines to that loop and block on the result.
+
+    - At most `size` contexts exist at once; extra renders wait for one.
+    - A context is recycled after `max_uses` renders or after any error.
+    - If the browser process dies it is relaunched (with a fresh Playwright
+      driver) on the next render; contexts of the old browser are dropped.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = CONTEXT_MAX_USES):
+        self.size = size
+        self.max_uses = max_uses
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._idle = None        # asyncio.Queue of (context, uses, browser it belongs to)
+        self._slots = None       # asyncio.Semaphore bounding live contexts
+        self._relaunching = None # asyncio.Lock so one render relaunches a dead browser
+        self._stats = {
+            "browser_launches": 0,
+            "contexts_created": 0,
+            "contexts_recycled": 0,
+            "contexts_in_use": 0,
+            "renders": 0,
+            "render_errors": 0,
+            "render_seconds_total": 0.0,
+        }
+
+    # -------------------------------------------------
+    # LIFECYCLE
+    # -------------------------------------------------
+    def start(self):
+        """Start the pool loop and launch the browser (idempotent)."""
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="browser-pool", daemon=True
+            )
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._init(), loop).result()
+            except BaseException:
+                loop.call_soon_threadsafe(loop.stop)
+                raise
+            self._loop, self._thread = loop, thread
+        print(f"Browser pool started (size={self.size}, max_uses={self.max_uses})")
+
+    def stop(self):
+        """Close every context, the browser and the pool loop."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=10)
+        except Exception as e:
+            print("Browser pool shutdown error:", e)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        print("Browser pool stopped")
+
+    def _submit(self, coro):
+        if self._loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _init(self):
+        self._idle = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.size)
+        self._relaunching = asyncio.Lock()
+        await self._launch()
+
+    async def _launch(self):
+        """(Re)start the Playwright driver and Chromium, closing any previous ones."""
+        await self._close_browser()
+        # Imported here so processes that never render do not pay for Playwright
+        async_playwright = STARTUP.timed_import("playwright.async_api").async_playwright
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._stats["browser_launches"] += 1
+
+    async def _close_browser(self):
+        browser, playwright = self._browser, self._playwright
+        self._browser = self._playwright = None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        if playwright is not None:
+            try:
+                await playwright.stop()
+            except Exception:
+                pass
+
+    async def _shutdown(self):
+        while not self._idle.empty():
+            context, _, _ = self._idle.get_nowait()
+            await self._close_context(context)
+        await self._close_browser()
+
+    # -------------------------------------------------
+    # CONTEXTS
+    # -------------------------------------------------
+    async def _close_context(self, context):
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+    async def _acquire(self):
+        await self._slots.acquire()
+        try:
+            if self._browser is None or not self._browser.is_connected():
+                async with self._relaunching:
+                    if self._browser is None or not self._browser.is_connected():
+                        print("Browser disconnected — relaunching")
+                        while not self._idle.empty():
+                            self._idle.get_nowait()
+                        await self._launch()
+            if not self._idle.empty():
+                context, uses, browser = self._idle.get_nowait()
+            else:
+                browser = self._browser
+                context, uses = await browser.new_context(), 0
+                self._stats["contexts_created"] += 1
+        except BaseException:
+            self._slots.release()
+            raise
+        self._stats["contexts_in_use"] += 1
+        return context, uses, browser
+
+    async def _release(self, context, uses: int, browser, healthy: bool):
+        self._stats["contexts_in_use"] -= 1
+        try:
+            # A context checked out before a relaunch belongs to the dead browser
+            current = browser is self._browser and browser.is_connected()
+            if healthy and uses < self.max_uses and current:
+                self._idle.put_nowait((context, uses, browser))
+            else:
+                self._stats["contexts_recycled"] += 1
+                await self._close_context(context)
+        finally:
+            self._slots.release()
+
+    # -------------------------------------------------
+    # RENDERING
+    # -------------------------------------------------
+    async def arender(self, url: str) -> str:
+        """Navigate to `url` in a pooled context and return the page HTML."""
+        context, uses, browser = await self._acquire()
+        healthy = False
+        start = time.perf_counter()
+        try:
+            page = await context.new_page()
+            try:
+                page.set_default_timeout(NAVIGATION_TIMEOUT_MS)
+                await page.goto(url, wait_until="networkidle")
+                content = await page.content()
+            finally:
+                await page.close()
+            healthy = True
+            return content
+        except BaseException:
+            self._stats["render_errors"] += 1
+            raise
+        finally:
+            self._stats["renders"] += 1
+            self._stats["render_seconds_total"] += time.perf_counter() - start
+            await self._release(context, uses + 1, browser, healthy)
+
+    async def render_async(self, url: str) -> str:
+        """Await a render from any event loop (the pool runs on its own loop)."""
+        if self._loop is None:
+            await asyncio.to_thread(self.start)
+        return await asyncio.wrap_future(self._submit(self.arender(url)))
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["running"] = self._loop is not None
+        stats["size"] = self.size
+        stats["contexts_idle"] = self._idle.qsize() if self._idle is not None else 0
+        stats["render_seconds_total"] = round(stats["render_seconds_total"], 3)
+        return stats
+
+
+BROWSER_POOL = BrowserPool()
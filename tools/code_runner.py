@@ -0,0 +1,365 @@
+import codecs
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+import code_worker
+
+load_dotenv()
+
+# Imported once in the fork server, then shared copy-on-write by every run.
+# Modules that are not installed are skipped silently.
+PRELOAD_MODULES = [
+    "code_worker",
+    "numpy", "pandas", "scipy", "sklearn", "duckdb", "matplotlib",
+    "matplotlib.pyplot", "PIL.Image", "requests", "bs4", "networkx", "pypdf",
+]
+MAX_WORKERS = int(os.getenv("RUN_CODE_WORKERS", "4"))
+MEMORY_LIMIT_BYTES = int(os.getenv("RUN_CODE_MEMORY_MB", "4096")) * 1024 * 1024
+# A snippet whose combined output exceeds this is killed
+MAX_LOG_BYTES = int(os.getenv("RUN_CODE_MAX_LOG_MB", "64")) * 1024 * 1024
+HEAD_CHARS = 2000
+TAIL_CHARS = 2000
+POLL_SECONDS = 0.05
+READ_CHUNK = 64 * 1024
+
+
+class HeadTailBuffer:
+    """Keeps the first `head` and last `tail` characters of a stream."""
+
+    def __init__(self, head: int = HEAD_CHARS, tail: int = TAIL_CHARS):
+        self.head_limit = head
+        self.tail_limit = tail
+        self.head = ""
+        self.tail = ""
+        self.total = 0
+
+    def write(self, text: str):
+        self.total += len(text)
+        if len(self.head) < self.head_limit:
+            room = self.head_limit - len(self.head)
+            self.head += text[:room]
+            text = text[room:]
+        if text:
+            self.tail = (self.tail + text)[-self.tail_limit:]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + len(self.tail)
+
+    def summary(self) -> str:
+        if not self.truncated:
+            return self.head + self.tail
+        omitted = self.total - len(self.head) - len(self.tail)
+        return f"{self.head}\n... [{omitted} chars omitted] ...\n{self.tail}"
+
+
+class _StreamReader:
+    """Incrementally feeds a growing log file into a HeadTailBuffer."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.buffer = HeadTailBuffer()
+        self._file = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.bytes_read = 0
+
+    def poll(self, final: bool = False):
+        if self._file is None:
+            if not os.path.exists(self.path):
+                return
+            self._file = open(self.path, "rb")
+        while True:
+            chunk = self._file.read(READ_CHUNK)
+            if not chunk:
+                break
+            self.bytes_read += len(chunk)
+            self.buffer.write(self._decoder.decode(chunk))
+        if final:
+            self.buffer.write(self._decoder.decode(b"", final=True))
+            self._file.close()
+
+
+class _ForkedChild:
+    """Handle on a snippet process forked by the fork server."""
+
+    def __init__(self):
+        self.pid = None
+        self.started = None
+        self.exitcode = None
+        self._forked = threading.Event()
+        self._done = threading.Event()
+
+    def is_alive(self) -> bool:
+        return not self._done.is_set()
+
+    def join(self):
+        self._done.wait()
+
+    def kill(self):
+        if self.pid is not None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class _ForkServer:
+    """
+    Client for `python -m code_worker`, a separate interpreter that preloads
+    the scientific stack and forks one child per snippet.
+
+    The server is its own program rather than a multiprocessing fork server
+    because multiprocessing children re-import the parent's __main__, which
+    here is the whole app.
+    """
+
+    def __init__(self, preload: list):
+        self.preload = preload
+        self._proc = None
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def start(self):
+        with self._lock:
+            if self._proc is not None and self._proc.poll() is None:
+                return
+            self._proc = subprocess.Popen(
+                [sys.executable, "-m", "code_worker", *self.preload],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=os.path.dirname(os.path.abspath(code_worker.__file__)),
+                # Never try to open a display from a forked child
+                env={**os.environ, "MPLBACKEND": os.environ.get("MPLBACKEND", "Agg")},
+            )
+            ready = self._proc.stdout.readline()
+            if not ready:
+                raise RuntimeError("run_code fork server exited during start-up")
+            threading.Thread(target=self._read_replies, args=(self._proc,), daemon=True).start()
+
+    def _read_replies(self, proc):
+        for line in proc.stdout:
+            reply = json.loads(line)
+            with self._lock:
+                child = self._children.get(reply["id"])
+            if child is None:
+                continue
+            if "pid" in reply:
+                child.pid = reply["pid"]
+                child._forked.set()
+            elif "started" in reply:
+                child.started = reply["started"]
+            elif "exitcode" in reply:
+                child.exitcode = reply["exitcode"]
+                with self._lock:
+                    self._children.pop(reply["id"], None)
+                child._done.set()
+        # Server died: nothing will report on the children it still had
+        with self._lock:
+            orphans = list(self._children.values())
+            self._children.clear()
+        for child in orphans:
+            child.kill()
+            child._forked.set()
+            child._done.set()
+
+    def fork(self, run_id: str, request: dict) -> _ForkedChild:
+        self.start()
+        child = _ForkedChild()
+        with self._lock:
+            self._children[run_id] = child
+            proc = self._proc
+        try:
+            proc.stdin.write((json.dumps({"id": run_id, **request}) + "\n").encode())
+            proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            with self._lock:
+                self._children.pop(run_id, None)
+            child._done.set()
+            return child
+        child._forked.wait()
+        return child
+
+
+class CodeRunner:
+    """
+    Runs snippets in children forked from a warm interpreter.
+
+    A fork server process imports the heavy scientific stack once; every
+    execution is a fresh fork of it, so runs are isolated from each other
+    but skip interpreter start-up and imports. At most `max_workers`
+    snippets run at once.
+
+    Every child gets its own process group, a CPU-time and address-space
+    rlimit and a wall-clock deadline; on timeout or cancel the whole group
+    is killed. Output goes to log files that are streamed into bounded
+    head/tail buffers while the child runs.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.available = hasattr(os, "fork")
+        self._server = _ForkServer(PRELOAD_MODULES) if self.available else None
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._running = {}
+        self._cancelled = set()
+        self._warm = False
+
+    def warm_up(self) -> float:
+        """Start the fork server (paying the imports now) and return the seconds it took."""
+        start = time.perf_counter()
+        if self.available and not self._warm:
+            self._server.start()
+            self._warm = True
+        return time.perf_counter() - start
+
+    # -------------------------------------------------
+    # PROCESS CONTROL
+    # -------------------------------------------------
+    def _start(self, run_id: str, script_path: str, cwd: str, stdout_path: str, stderr_path: str, limits: dict):
+        """Launch the child; returns (process, started-timestamp getter)."""
+        if self.available:
+            proc = self._server.fork(run_id, {
+                "script_path": script_path,
+                "cwd": cwd,
+                "stdout_path": stdout_path,
+                "stderr_path": stderr_path,
+                "limits": limits,
+            })
+            return proc, lambda: proc.started
+
+        # No fork server (spawn-only platforms): fresh `uv run` per snippet
+        with open(stdout_path, "wb") as out, open(stderr_path, "wb") as err:
+            proc = subprocess.Popen(
+                ["uv", "run", os.path.basename(script_path)],
+                stdout=out,
+                stderr=err,
+                cwd=cwd,
+                env={**os.environ, "PYTHONPATH": os.path.join(cwd, code_worker.PACKAGES_DIR)},
+                preexec_fn=lambda: code_worker.apply_limits(limits["cpu_seconds"], limits["memory_bytes"]),
+            )
+        return proc, lambda: None
+
+    @staticmethod
+    def _is_alive(proc) -> bool:
+        return proc.is_alive() if hasattr(proc, "is_alive") else proc.poll() is None
+
+    @staticmethod
+    def _exit_code(proc):
+        return proc.exitcode if hasattr(proc, "exitcode") else proc.returncode
+
+    @staticmethod
+    def _kill_group(proc):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            # Child may not have called setsid() yet
+            proc.kill()
+
+    # -------------------------------------------------
+    # EXECUTION
+    # -------------------------------------------------
+    def run(self, script_path: str, cwd: str, timeout: float, cancel_event=None) -> dict:
+        """
+        Execute `script_path` with `cwd` as working directory, killing it
+        after `timeout` seconds or once `cancel_event` (a threading.Event
+        or CancelScope) is set. Returns bounded stdout/stderr summaries, the
+        paths of the full logs and timing information.
+        """
+        run_id = uuid.uuid4().hex[:8]
+        log_dir = os.path.join(cwd, ".runs")
+        os.makedirs(log_dir, exist_ok=True)
+        stdout_path = os.path.abspath(os.path.join(log_dir, f"{run_id}.out"))
+        stderr_path = os.path.abspath(os.path.join(log_dir, f"{run_id}.err"))
+        limits = {"cpu_seconds": int(timeout) + 1, "memory_bytes": MEMORY_LIMIT_BYTES}
+        readers = [_StreamReader(stdout_path), _StreamReader(stderr_path)]
+        stop_reason = None
+
+        with self._slots:
+            cold = not self._warm
+            submitted = time.time()
+            deadline = time.monotonic() + timeout
+            proc, started = self._start(
+                run_id, os.path.abspath(script_path), os.path.abspath(cwd), stdout_path, stderr_path, limits
+            )
+            self._warm = self.available
+            with self._lock:
+                self._running[run_id] = proc
+            try:
+                while self._is_alive(proc):
+                    for reader in readers:
+                        reader.poll()
+                    if run_id in self._cancelled or (cancel_event is not None and cancel_event.is_set()):
+                        stop_reason = "cancelled"
+                    elif time.monotonic() > deadline:
+                        stop_reason = f"timed out after {timeout:.0f}s"
+                    elif sum(r.bytes_read for r in readers) > MAX_LOG_BYTES:
+                        stop_reason = "output limit exceeded"
+                    if stop_reason:
+                        self._kill_group(proc)
+                        break
+                    time.sleep(POLL_SECONDS)
+                if hasattr(proc, "join"):
+                    proc.join()
+                else:
+                    proc.wait()
+            finally:
+                with self._lock:
+                    self._running.pop(run_id, None)
+                    self._cancelled.discard(run_id)
+            finished = time.time()
+
+        for reader in readers:
+            reader.poll(final=True)
+
+        return_code = self._exit_code(proc)
+        stderr_note = ""
+        if stop_reason:
+            stderr_note = f"\nProcess killed: {stop_reason}"
+        elif return_code is not None and return_code < 0:
+            stderr_note = f"\nProcess killed by signal {-return_code}"
+
+        started_at = started()
+        return {
+            "stdout": readers[0].buffer.summary(),
+            "stderr": readers[1].buffer.summary() + stderr_note,
+            "stdout_truncated": readers[0].buffer.truncated,
+            "stderr_truncated": readers[1].buffer.truncated,
+            "stdout_path": stdout_path,
+            "stderr_path": stderr_path,
+            "return_code": return_code,
+            "timed_out": bool(stop_reason) and stop_reason.startswith("timed out"),
+            "run_id": run_id,
+            "timing": {
+                "mode": "cold" if cold else "warm",
+                "startup_ms": round((started_at - submitted) * 1000, 1) if started_at else None,
+                "total_ms": round((finished - submitted) * 1000, 1),
+                "timeout_s": round(timeout, 1),
+            },
+        }
+
+    def cancel(self, run_id: str) -> bool:
+        """Kill a running snippet. Returns False if it is not running."""
+        with self._lock:
+            if run_id not in self._running:
+                return False
+            self._cancelled.add(run_id)
+        return True
+
+    def cancel_all(self) -> int:
+        with self._lock:
+            run_ids = list(self._running)
+        return sum(self.cancel(run_id) for run_id in run_ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = len(self._running)
+        return {"available": self.available, "warm": self._warm, "running": running}
+
+
+CODE_RUNNER = CodeRunner()
@@ -0,0 +1,476 @@
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import httpx
+from dotenv import load_dotenv
+from . import http_client
+
+load_dotenv()
+
+# Same filesystem as the session workdirs, so blobs can be hardlinked or cloned
+CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", os.path.join("LLMFiles", ".cache"))
+MAX_CACHE_BYTES = int(os.getenv("DOWNLOAD_CACHE_MB", "2048")) * 1024 * 1024
+# A URL fetched this recently is served without asking the server again
+FRESH_SECONDS = float(os.getenv("DOWNLOAD_CACHE_FRESH_SECONDS", "300"))
+PARALLEL_MIN_BYTES = int(os.getenv("DOWNLOAD_PARALLEL_MIN_MB", "8")) * 1024 * 1024
+SEGMENTS = int(os.getenv("DOWNLOAD_SEGMENTS", "4"))
+CHUNK = 256 * 1024
+# Linux ioctl that clones a file's extents (copy-on-write)
+FICLONE = 0x40049409
+# Fetches of the same URL are serialized on one of this many locks
+URL_LOCK_STRIPES = 64
+
+
+class _RangeNotHonoured(Exception):
+    """The server answered a Range request with the full body."""
+
+
+class TransferLimitExceeded(Exception):
+    """A download went past its TransferLimit byte cap or deadline."""
+
+
+class TransferLimit:
+    """
+    Byte cap and wall-clock deadline checked on every downloaded chunk, so
+    a body without Content-Length or a slow trickle cannot outrun them.
+
+    A limit can be shared by several downloads: `open()` reserves the
+    announced size of one transfer and returns a child limit whose bytes
+    also count against this one. `cancel` (anything with `is_set()`, such
+    as a tool call's CancelScope) stops the transfer once it is set.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, until: Optional[float] = None,
+                 parent: Optional["TransferLimit"] = None, cancel=None):
+        self.max_bytes = max_bytes
+        self.until = until
+        self.parent = parent
+        self.cancel = cancel
+        self.used = 0
+        self.reserved = 0     # announced bytes of open child transfers not received yet
+        self._held = 0        # this transfer's reservation on the parent
+        self._lock = threading.Lock()
+
+    def open(self, size: int, max_bytes: Optional[int] = None) -> Optional["TransferLimit"]:
+        """Reserve `size` bytes for one transfer; None when they do not fit or time is up."""
+        with self._lock:
+            if self.until is not None and time.time() >= self.until:
+                return None
+            if self.max_bytes is not None and self.used + self.reserved + size > self.max_bytes:
+                return None
+            self.reserved += size
+        child = TransferLimit(max_bytes, self.until, parent=self)
+        child._held = size
+        return child
+
+    def close(self):
+        """Give back what is left of this transfer's reservation."""
+        with self._lock:
+            held, self._held = self._held, 0
+        if self.parent is not None and held:
+            self.parent._add(0, held)
+
+    def consume(self, size: int):
+        """Count `size` received bytes; raises TransferLimitExceeded past the cap or deadline."""
+        with self._lock:
+            from_reserved = min(size, self._held)
+            self._held -= from_reserved
+        try:
+            self._add(size, 0)
+        finally:
+            if self.parent is not None:
+                self.parent._add(size, from_reserved)
+
+    def _add(self, size: int, from_reserved: int):
+        with self._lock:
+            self.used += size
+            self.reserved = max(0, self.reserved - from_reserved)
+            if not size:
+                return
+            if self.max_bytes is not None and self.used > self.max_bytes:
+                raise TransferLimitExceeded(f"over {self.max_bytes} bytes")
+            if self.until is not None and time.time() > self.until:
+                raise TransferLimitExceeded("out of time")
+            if self.cancel is not None and self.cancel.is_set():
+                raise TransferLimitExceeded("cancelled")
+
+
+def _validators(headers) -> dict:
+    return {
+        "etag": headers.get("etag", ""),
+        "last_modified": headers.get("last-modified", ""),
+    }
+
+
+def _same_version(entry: dict, validators: dict) -> bool:
+    if validators["etag"]:
+        return validators["etag"] == entry.get("etag")
+    if validators["last_modified"]:
+        return validators["last_modified"] == entry.get("last_modified")
+    return False
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _clone(src: str, dest: str):
+    """Copy-on-write clone where the filesystem supports it, else a plain copy."""
+    try:
+        import fcntl
+        with open(src, "rb") as s, open(dest, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(src, dest)
+
+
+class DownloadCache:
+    """
+    Content-addressed on-disk cache for downloaded files.
+
+    Bodies are stored once under blobs/<sha256>; index.json maps each URL
+    to its blob and the ETag/Last-Modified it was fetched with. A URL
+    fetched within FRESH_SECONDS is served from disk directly, older ones
+    are revalidated with a HEAD request first. Session workdirs get a
+    private writable copy of a blob (a copy-on-write clone where the
+    filesystem supports it), or a hardlink to the read-only blob when the
+    caller asks for read-only access. Least recently used blobs are
+    evicted once the cache grows past `max_bytes`.
+
+    Large files from servers that accept byte ranges are fetched as
+    `segments` parallel Range requests. Partial segments left by an
+    interrupted download are resumed on the next attempt (If-Range makes
+    sure they still belong to the same version of the file).
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES, segments: int = SEGMENTS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.segments = max(1, segments)
+        self._blob_dir = os.path.join(root, "blobs")
+        self._part_dir = os.path.join(root, "partial")
+        self._index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._url_locks = [threading.Lock() for _ in range(URL_LOCK_STRIPES)]
+        self._index = None       # {"urls": {url: entry}, "blobs": {sha: info}}, loaded lazily
+        self._stats = {
+            "hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "deduped": 0,
+            "evictions": 0,
+            "ranged_downloads": 0,
+            "bytes_downloaded": 0,
+            "bytes_resumed": 0,
+            "bytes_served_from_cache": 0,
+        }
+
+    # -------------------------------------------------
+    # INDEX
+    # -------------------------------------------------
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self._blob_dir, sha)
+
+    def _load(self) -> dict:
+        """Load the index on first use (caller holds the lock)."""
+        if self._index is None:
+            os.makedirs(self._blob_dir, exist_ok=True)
+            os.makedirs(self._part_dir, exist_ok=True)
+            try:
+                with open(self._index_path) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {"urls": {}, "blobs": {}}
+        return self._index
+
+    def _save(self):
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_path)
+
+    def _intact(self, sha: str) -> bool:
+        """
+        Blobs are read-only, but size and mtime still catch one changed
+        behind the cache's back; a changed blob is dropped and fetched again.
+        """
+        info = self._index["blobs"].get(sha)
+        try:
+            st = os.stat(self._blob_path(sha))
+        except OSError:
+            return False
+        return info is not None and st.st_size == info["size"] and st.st_mtime_ns == info["mtime_ns"]
+
+    def _lookup(self, url: str) -> Optional[dict]:
+        index = self._load()
+        entry = index["urls"].get(url)
+        if entry is None:
+            return None
+        if not self._intact(entry["sha256"]):
+            self._drop_blob(entry["sha256"])
+            return None
+        return dict(entry)
+
+    def _drop_blob(self, sha: str):
+        self._index["blobs"].pop(sha, None)
+        self._index["urls"] = {
+            url: e for url, e in self._index["urls"].items() if e["sha256"] != sha
+        }
+        try:
+            os.remove(self._blob_path(sha))
+        except OSError:
+            pass
+
+    def _evict(self, keep: str):
+        blobs = self._index["blobs"]
+        total = sum(b["size"] for b in blobs.values())
+        for sha in sorted(blobs, key=lambda s: blobs[s]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if sha == keep:
+                continue
+            total -= blobs[sha]["size"]
+            self._drop_blob(sha)
+            self._stats["evictions"] += 1
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        # A fixed set of locks, so a long-running server does not keep one per URL
+        return self._url_locks[hash(url) % len(self._url_locks)]
+
+    # -------------------------------------------------
+    # NETWORK
+    # -------------------------------------------------
+    def _head(self, url: str, timeout) -> Optional[httpx.Response]:
+        try:
+            response = http_client.request(
+                "HEAD", url, headers={"Accept-Encoding": "identity"}, timeout=timeout
+            )
+        except httpx.HTTPError:
+            return None
+        return response if response.status_code < 400 else None
+
+    def _stream_to(self, url: str, path: str, timeout, start: int = 0, end: Optional[int] = None,
+                   if_range: str = "", limit: Optional[TransferLimit] = None) -> int:
+        """Append bytes `start`..`end` of `url` to `path`; returns bytes written."""
+        headers = {}
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+            headers["Accept-Encoding"] = "identity"
+            if if_range:
+                headers["If-Range"] = if_range
+        written = 0
+        with http_client.stream("GET", url, headers=headers, timeout=timeout) as response:
+            response.raise_for_status()
+            if "Range" in headers and response.status_code != 206:
+                raise _RangeNotHonoured(url)
+            with open(path, "ab") as f:
+                try:
+                    for chunk in response.iter_bytes(chunk_size=CHUNK):
+                        f.write(chunk)
+                        written += len(chunk)
+                        if limit is not None:
+                            limit.consume(len(chunk))
+                finally:
+                    with self._lock:
+                        self._stats["bytes_downloaded"] += written
+        return written
+
+    def _download_single(self, url: str, part: str, resumable: bool, if_range: str, timeout, limit=None):
+        have = os.path.getsize(part) if os.path.exists(part) else 0
+        if have and resumable:
+            try:
+                self._stream_to(url, part, timeout, start=have, if_range=if_range, limit=limit)
+                with self._lock:
+                    self._stats["bytes_resumed"] += have
+                return
+            except _RangeNotHonoured:
+                pass
+            except httpx.HTTPStatusError as e:
+                # 416: the leftover file is already as long as the body, or longer
+                if e.response.status_code != 416:
+                    raise
+        if os.path.exists(part):
+            os.remove(part)
+        self._stream_to(url, part, timeout, limit=limit)
+
+    def _download_ranged(self, url: str, part: str, size: int, if_range: str, timeout, limit=None):
+        step = -(-size // self.segments)
+        bounds = [(i, lo, min(lo + step, size) - 1) for i, lo in enumerate(range(0, size, step))]
+
+        def fetch_segment(i, lo, hi):
+            path = f"{part}.{i}"
+            have = os.path.getsize(path) if os.path.exists(path) else 0
+            if have > hi - lo + 1:
+                os.remove(path)
+                have = 0
+            if have:
+                with self._lock:
+                    self._stats["bytes_resumed"] += have
+            if lo + have <= hi:
+                self._stream_to(url, path, timeout, start=lo + have, end=hi, if_range=if_range, limit=limit)
+            if os.path.getsize(path) != hi - lo + 1:
+                # Kept on disk so the next attempt resumes it
+                raise IOError(f"Incomplete segment {i} of {url}")
+            return path
+
+        with ThreadPoolExecutor(max_workers=len(bounds), thread_name_prefix="download") as pool:
+            paths = list(pool.map(lambda b: fetch_segment(*b), bounds))
+
+        with open(part, "wb") as out:
+            for path in paths:
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, out, CHUNK)
+        for path in paths:
+            os.remove(path)
+
+    def _download(self, url: str, head: Optional[httpx.Response], validators: dict, timeout,
+                  limit: Optional[TransferLimit] = None) -> str:
+        """Download `url` into a partial file and return its path."""
+        version = validators["etag"] or validators["last_modified"]
+        key = hashlib.sha1(f"{url}\n{version}".encode()).hexdigest()
+        part = os.path.join(self._part_dir, key)
+        accepts_ranges = head is not None and head.headers.get("accept-ranges", "").lower() == "bytes"
+        size = int(head.headers.get("content-length") or 0) if head is not None else 0
+
+        if accepts_ranges and version and size >= PARALLEL_MIN_BYTES and self.segments > 1:
+            try:
+                self._download_ranged(url, part, size, version, timeout, limit)
+                with self._lock:
+                    self._stats["ranged_downloads"] += 1
+                return part
+            except _RangeNotHonoured:
+                for i in range(self.segments):
+                    if os.path.exists(f"{part}.{i}"):
+                        os.remove(f"{part}.{i}")
+        # Without a validator a leftover partial file could be a different version
+        resumable = bool(accepts_ranges and version)
+        try:
+            self._download_single(url, part, resumable, version, timeout, limit)
+        except TransferLimitExceeded:
+            if not resumable and os.path.exists(part):
+                os.remove(part)
+            raise
+        return part
+
+    # -------------------------------------------------
+    # PUBLIC API
+    # -------------------------------------------------
+    def fetch(self, url: str, timeout=None, limit: Optional[TransferLimit] = None,
+              head: Optional[httpx.Response] = None) -> dict:
+        """
+        Make sure `url` is in the cache. Returns the blob path, its sha256
+        and size, and whether it was a "hit", "revalidated" or "miss".
+        A download that exceeds `limit` raises TransferLimitExceeded.
+        `head` is a HEAD response for `url` the caller already has; it is
+        used instead of asking the server again.
+        """
+        start = time.perf_counter()
+        with self._url_lock(url):
+            with self._lock:
+                entry = self._lookup(url)
+            status = None
+            if entry is not None and time.time() - entry["fetched"] < FRESH_SECONDS:
+                status = "hit"
+            else:
+                if head is None:
+                    head = self._head(url, timeout)
+                validators = _validators(head.headers) if head is not None else _validators({})
+                if entry is not None and _same_version(entry, validators):
+                    status = "revalidated"
+                else:
+                    part = self._download(url, head, validators, timeout, limit)
+                    entry = self._store(url, part, validators)
+            with self._lock:
+                now = time.time()
+                blob = self._index["blobs"].get(entry["sha256"])
+                if blob is not None:
+                    blob["last_used"] = now
+                if status == "revalidated":
+                    self._index["urls"][url]["fetched"] = now
+                if status is not None:
+                    self._stats["hits" if status == "hit" else "revalidated"] += 1
+                    self._stats["bytes_served_from_cache"] += entry["size"]
+                self._save()
+        return {
+            "path": self._blob_path(entry["sha256"]),
+            "sha256": entry["sha256"],
+            "size": entry["size"],
+            "cache": status or "miss",
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _store(self, url: str, part: str, validators: dict) -> dict:
+        """Move a finished download into the blob store, deduplicating by content."""
+        sha = _sha256(part)
+        blob = self._blob_path(sha)
+        with self._lock:
+            self._stats["misses"] += 1
+            if sha in self._index["blobs"] and self._intact(sha):
+                os.remove(part)
+                self._stats["deduped"] += 1
+            else:
+                os.replace(part, blob)
+                os.chmod(blob, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                st = os.stat(blob)
+                self._index["blobs"][sha] = {
+                    "size": st.st_size, "mtime_ns": st.st_mtime_ns, "last_used": time.time(),
+                }
+            entry = {
+                "sha256": sha,
+                "size": self._index["blobs"][sha]["size"],
+                "fetched": time.time(),
+                **validators,
+            }
+            self._index["urls"][url] = entry
+            self._evict(keep=sha)
+        return dict(entry)
+
+    def fetch_to(self, url: str, dest: str, timeout=None, limit: Optional[TransferLimit] = None,
+                 read_only: bool = False) -> dict:
+        """
+        Fetch `url` through the cache into `dest`. By default `dest` is a
+        private writable clone of the blob; with `read_only` it is a
+        hardlink to the shared blob (no copy at all), which must then not
+        be modified in place.
+        """
+        result = self.fetch(url, timeout, limit)
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            if read_only:
+                os.link(result["path"], dest)
+            else:
+                _clone(result["path"], dest)
+        except FileNotFoundError:
+            # Evicted between fetch and link; fetch it again once
+            result = self.fetch(url, timeout, limit)
+            _clone(result["path"], dest)
+        except OSError:
+            # Different filesystem (or no hardlink support)
+            _clone(result["path"], dest)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            if self._index is not None:
+                stats["blobs"] = len(self._index["blobs"])
+                stats["urls"] = len(self._index["urls"])
+                stats["bytes_stored"] = sum(b["size"] for b in self._index["blobs"].values())
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+DOWNLOAD_CACHE = DownloadCache()
@@ -1,46 +1,68 @@
 from langchain_core.tools import tool
-import requests
+from . import http_client
+from .download_cache import DOWNLOAD_CACHE, TransferLimit, TransferLimitExceeded
+from .prefetcher import PREFETCHER
+import httpx
 import os
+from langgraph.prebuilt import InjectedState
+from session import get_session
+from typing import Annotated
+import asyncio
+
 
 @tool
-def download_file(url: str, filename: str) -> str:
+async def download_file(
+    url: str,
+    filename: str,
+    read_only: bool = False,
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> str:
     """
     Download a file from a URL and save it with the given filename
-    in the current working directory.
+    in the run's working directory. Repeat downloads of the same URL are
+    served from a local cache.
 
     Args:
         url (str): Direct URL to the file.
         filename (str): The filename to save the downloaded content as.
+        read_only (bool): Share the cached file instead of copying it
+            (saves time and disk for large files). The file must then not
+            be modified in place; write changes to a new file.
 
     Returns:
-        str: Full path to the saved file or error message.
+        str: The saved filename (marked read-only if requested) or error message.
     """
     try:
         print(f"Downloading file from: {url}")
 
-        # Make request with timeout
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-
         # Create directory
-        directory_name = "LLMFiles"
+        session = get_session(session_id)
+        directory_name = session.workdir
         os.makedirs(directory_name, exist_ok=True)
 
-        # Save file
         path = os.path.join(directory_name, filename)
-        with open(path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-
-        file_size = os.path.getsize(path)
-        print(f"Downloaded {filename} successfully ({file_size} bytes)")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Waits for a prefetch of this URL still in flight
+        await asyncio.to_thread(PREFETCHER.claim, session.id, url)
+        # Timeouts capped by the quiz deadline
+        timeout = http_client.timeout_for(session.deadline.tool_budget("download_file"))
+        # Stops between chunks once the call times out or the run is cancelled
+        limit = TransferLimit(cancel=session.tool_cancel())
+        result = await asyncio.to_thread(DOWNLOAD_CACHE.fetch_to, url, path, timeout, limit, read_only)
+        print(
+            f"Downloaded {filename} successfully ({result['size']} bytes, "
+            f"cache {result['cache']}, {result['seconds']}s)"
+        )
 
+        if read_only:
+            return f"{filename} (read-only: do not modify it in place, write changes to a new file)"
         return filename
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         return f"Error: Download timeout for {url}"
-    except requests.exceptions.RequestException as e:
+    except TransferLimitExceeded as e:
+        return f"Error: Download of {url} stopped ({e})"
+    except httpx.HTTPError as e:
         return f"Error downloading file: {type(e).__name__} - {str(e)}"
     except Exception as e:
         return f"Error saving file: {type(e).__name__} - {str(e)}"
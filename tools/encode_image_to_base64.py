@@ -1,24 +1,27 @@
-from shared_store import BASE64_STORE
+from langgraph.prebuilt import InjectedState
+from session import get_session
+from typing import Annotated
 import os
-import base64, uuid
 from langchain_core.tools import tool
 @tool
-def encode_image_to_base64(image_path: str) -> str:
+def encode_image_to_base64(
+    image_path: str,
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> str:
     """
     Encode an image file into a full Base64 string without exposing the binary
     output to the LLM.
 
-    This tool reads an image from the given file path, converts it into a
-    Base64-encoded string, and stores the *full* Base64 value in a shared
-    in-memory dictionary (BASE64_STORE). Instead of returning the large Base64
+    This tool snapshots the image file into the run's artifact store, which
+    produces its Base64 encoding only when the value is used. Instead of returning the large Base64
     blob—which can overwhelm conversation memory, break routing, or cause LLM
     tool-call loops—the tool returns a lightweight placeholder of the form:
 
         BASE64_KEY:<uuid>
 
     The LLM uses this placeholder as the 'answer' during reasoning. Later,
-    the post_request tool detects the placeholder and replaces it with the
-    original Base64 string from BASE64_STORE before submitting it to the server.
+    the post_request tool detects the placeholder and streams the Base64 string
+    into the request body as it submits it to the server.
 
     This design prevents:
     - Extremely large Base64 strings from entering the conversation history
@@ -35,19 +38,16 @@ def encode_image_to_base64(image_path: str) -> str:
     Returns
     -------
     str
-        A small placeholder token referencing the full Base64 string stored
-        in memory, e.g. "BASE64_KEY:4f9d93ea-7e94-4edc-962c-e6f7d358c2a3".
+        A small placeholder token referencing the Base64 string of the image,
+        e.g. "BASE64_KEY:4f9d93ea7e94".
     """
     try:
-        image_path = os.path.join("LLMFiles", image_path)
-        with open(image_path, "rb") as f:
-            raw = f.read()
-    
-        encoded = base64.b64encode(raw).decode("utf-8")
-
-        key = str(uuid.uuid4())
-        BASE64_STORE[key] = encoded
-
-        return f"BASE64_KEY:{key}"
+        session = get_session(session_id)
+        image_path = os.path.join(session.workdir, image_path)
+        # Only a file reference is kept; the Base64 text is produced on demand
+        return session.artifacts.put_copy(
+            image_path, prefix="BASE64_KEY", binary=True,
+            meta={"encoding": "base64", "source": os.path.basename(image_path)},
+        )
     except Exception as e:
         return f"Error occurred: {e}"
\ No newline at end of file
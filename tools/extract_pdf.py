@@ -0,0 +1,106 @@
+from langchain_core.tools import tool
+import csv
+import io
+import json
+import os
+from langgraph.prebuilt import InjectedState
+from session import get_session
+from typing import Annotated
+from .pdf_engine import PDF_ENGINE, parse_pages
+
+PREVIEW_CHARS = 300
+# Tables this small are returned inline instead of behind a handle
+INLINE_TABLE_CELLS = 60
+# Page summaries returned inline; the rest are stored behind one handle
+INLINE_PAGES = 10
+
+
+def table_csv(rows: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+@tool
+async def extract_pdf(
+    file_path: str,
+    pages: str = "",
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> dict:
+    """
+    Extract the text and tables of a downloaded PDF, page by page, in
+    parallel. Use this instead of writing PDF parsing code in run_code.
+
+    Each page comes back as a short preview plus a handle (ARTIFACT:...) to
+    its full text; tables detected on the page come back as CSV (inline
+    when small, otherwise as a handle). Only the first 10 page summaries
+    are inline; the others are in "more_pages" as a JSON handle. Pass
+    handles as quoted strings to run_code or post_request to use the full
+    values.
+
+    Args:
+        file_path (str): Filename of the PDF in the working directory.
+        pages (str): 1-based pages such as "1-3,5" (default: all). For big
+            documents, look at a few pages first.
+
+    Returns:
+    {
+        "page_count": <pages in the document>,
+        "text": "ARTIFACT:... (full text of the requested pages)",
+        "pages": [
+            {"page": 1, "chars": 1234, "preview": "...", "text": "ARTIFACT:...",
+             "tables": [{"rows": 12, "columns": 4, "csv": "..." or "ARTIFACT:..."}]}
+        ],
+        "more_pages": {"count": <summaries not shown>, "summaries": "ARTIFACT:... (JSON list)"}
+    }
+    """
+    session = get_session(session_id)
+    path = os.path.join(session.workdir, file_path)
+    if not os.path.exists(path):
+        return {"error": f"File not found: {file_path}. Download it first with download_file."}
+    try:
+        ranges = parse_pages(pages)
+    except ValueError as e:
+        return {"error": f"Invalid pages {pages!r}: {e}"}
+    try:
+        extracted = await PDF_ENGINE.extract(path, ranges, session.tool_cancel())
+    except Exception as e:
+        return {"error": f"Could not read PDF: {type(e).__name__}: {e}"}
+
+    artifacts = session.artifacts
+    summaries, full_text = [], []
+    for page in extracted["pages"]:
+        text = page["text"]
+        full_text.append(f"--- Page {page['page']} ---\n{text}")
+        summary = {"page": page["page"], "chars": len(text), "preview": text[:PREVIEW_CHARS]}
+        if len(text) > PREVIEW_CHARS:
+            summary["text"] = artifacts.put(text, meta={"source": file_path, "page": page["page"]})
+        tables = []
+        for rows in page["tables"]:
+            data = table_csv(rows)
+            cells = len(rows) * len(rows[0])
+            tables.append({
+                "rows": len(rows),
+                "columns": len(rows[0]),
+                "csv": data if cells <= INLINE_TABLE_CELLS else artifacts.put(data, meta={"source": file_path}),
+            })
+        if tables:
+            summary["tables"] = tables
+        summaries.append(summary)
+
+    print(
+        f"extract_pdf {file_path}: {len(summaries)}/{extracted['page_count']} page(s), "
+        f"{extracted['cached_pages']} from cache"
+    )
+    result = {
+        "page_count": extracted["page_count"],
+        "text": artifacts.put("\n\n".join(full_text), meta={"source": file_path, "pages": pages or "all"}),
+        "pages": summaries[:INLINE_PAGES],
+    }
+    if len(summaries) > INLINE_PAGES:
+        rest = summaries[INLINE_PAGES:]
+        result["more_pages"] = {
+            "count": len(rest),
+            "summaries": artifacts.put(json.dumps(rest), meta={"source": file_path, "kind": "page summaries"}),
+        }
+    return result
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import re
+import threading
+import time
+import httpx
+from bs4 import BeautifulSoup
+from typing import Optional
+from dotenv import load_dotenv
+from . import http_client
+from .browser_pool import BROWSER_POOL
+
+load_dotenv()
+
+# Script patterns that mean the DOM is built client-side
+CSR_PATTERNS = re.compile(
+    r"atob\s*\(|\.innerHTML\s*=|document\.write\s*\(|createElement\s*\(|"
+    r"appendChild\s*\(|insertAdjacentHTML\s*\(|ReactDOM|createRoot\s*\(|new Vue\s*\("
+)
+MIN_VISIBLE_TEXT = 40
+# Page fetches give up sooner than other requests (and never later than
+# HTTP_READ_TIMEOUT), so a slow page falls back to the browser quickly
+PAGE_READ_TIMEOUT = float(os.getenv("PAGE_READ_TIMEOUT", "15"))
+
+_stats_lock = threading.Lock()
+FETCH_STATS = {
+    tier: {"count": 0, "errors": 0, "seconds_total": 0.0}
+    for tier in ("http", "browser")
+}
+FETCH_STATS["escalations"] = {}
+FETCH_STATS["served"] = {"http": 0, "browser": 0}
+
+
+def _record(tier: str, seconds: float, ok: bool):
+    with _stats_lock:
+        entry = FETCH_STATS[tier]
+        entry["count"] += 1
+        entry["seconds_total"] += seconds
+        if not ok:
+            entry["errors"] += 1
+
+
+def _record_served(tier: str):
+    with _stats_lock:
+        FETCH_STATS["served"][tier] += 1
+
+
+def _record_escalation(reason: str):
+    with _stats_lock:
+        escalations = FETCH_STATS["escalations"]
+        escalations[reason] = escalations.get(reason, 0) + 1
+
+
+def needs_browser(html: str) -> str:
+    """
+    Return the reason a statically fetched page must be rendered in Chromium,
+    or an empty string if the plain HTML is good enough.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    body = soup.body
+    if body is None:
+        return "no_body"
+
+    for script in soup.find_all("script"):
+        if CSR_PATTERNS.search(script.string or ""):
+            return "script_dom"
+
+    for tag in body.find_all(["script", "style", "noscript", "template"]):
+        tag.extract()
+    if len(body.get_text(" ", strip=True)) < MIN_VISIBLE_TEXT:
+        # Empty shell such as <div id="root"></div> plus external bundles
+        return "empty_body"
+    return ""
+
+
+def _try_http(url: str, mode: str, remaining: Optional[float]):
+    """
+    HTTP tier. Returns (html, "") when the plain response is good enough,
+    otherwise (None, reason-to-escalate).
+    """
+    start = time.perf_counter()
+    try:
+        read = min(PAGE_READ_TIMEOUT, http_client.READ_TIMEOUT)
+        resp = http_client.request("GET", url, timeout=http_client.timeout_for(remaining, read=read))
+        resp.raise_for_status()
+        html = resp.text
+        _record("http", time.perf_counter() - start, True)
+    except httpx.HTTPError as e:
+        _record("http", time.perf_counter() - start, False)
+        if mode == "http":
+            raise
+        return None, f"http_error:{type(e).__name__}"
+
+    reason = needs_browser(html) if mode == "auto" else ""
+    if reason:
+        return None, reason
+    _record_served("http")
+    return html, ""
+
+
+async def afetch_html(url: str, mode: str = "auto", remaining: Optional[float] = None) -> dict:
+    """
+    Fetch a page, trying a pooled HTTP GET before falling back to Chromium.
+    The event loop is never blocked.
+
+    mode:
+        "auto"    - HTTP first, escalate to the browser when the page looks
+                    client-side rendered
+        "http"    - plain HTTP only
+        "browser" - always render in the browser pool
+
+    `remaining` (seconds left in the quiz budget) caps the HTTP timeouts.
+
+    Returns {"html": str, "tier": "http" | "browser", "escalation": str}.
+    """
+    reason = "forced"
+    if mode in ("auto", "http"):
+        html, reason = await asyncio.to_thread(_try_http, url, mode, remaining)
+        if html is not None:
+            return {"html": html, "tier": "http", "escalation": ""}
+
+    _record_escalation(reason)
+    start = time.perf_counter()
+    try:
+        html = await BROWSER_POOL.render_async(url)
+    except Exception:
+        _record("browser", time.perf_counter() - start, False)
+        raise
+    _record("browser", time.perf_counter() - start, True)
+    _record_served("browser")
+    return {"html": html, "tier": "browser", "escalation": reason}
+
+
+def fetch_stats() -> dict:
+    """Per-tier latency plus the share of fetches served by plain HTTP."""
+    with _stats_lock:
+        stats = {
+            tier: {
+                "count": FETCH_STATS[tier]["count"],
+                "errors": FETCH_STATS[tier]["errors"],
+                "avg_seconds": round(FETCH_STATS[tier]["seconds_total"] / FETCH_STATS[tier]["count"], 3)
+                if FETCH_STATS[tier]["count"] else 0.0,
+            }
+            for tier in ("http", "browser")
+        }
+        stats["escalations"] = dict(FETCH_STATS["escalations"])
+        served = dict(FETCH_STATS["served"])
+    total = served["http"] + served["browser"]
+    stats["served"] = served
+    stats["fast_path_hit_rate"] = round(served["http"] / total, 3) if total else 0.0
+    return stats
@@ -0,0 +1,195 @@
+import csv
+import io
+import re
+from typing import Optional
+from bs4 import BeautifulSoup
+from urllib.parse import urljoin
+
+MAX_TEXT_CHARS = 8000
+MAX_LINKS = 60
+MAX_TABLE_ROWS = 200
+MAX_SCRIPT_CHARS = 3000
+MAX_SCRIPTS_TOTAL = 10000
+MAX_TABLES_TOTAL = 12000
+
+# Inline scripts worth showing the LLM: embedded data or DOM-building logic
+DATA_SCRIPT_HINTS = re.compile(
+    r"atob\s*\(|JSON\.parse|innerHTML|document\.write|fetch\s*\(|"
+    r"(?:const|let|var)\s+\w+\s*=\s*[\[{\"'`]"
+)
+URL_IN_TEXT = re.compile(r"https?://[^\s\"'<>)]+")
+SUBMIT_HINT = re.compile(r"submit|answer", re.I)
+# Files a quiz page typically asks the agent to download
+ASSET_EXTENSIONS = (
+    r"csv|tsv|json|jsonl|parquet|xlsx?|pdf|txt|zip|gz|"
+    r"mp3|wav|ogg|opus|m4a|flac|png|jpe?g|gif|webp|svg"
+)
+ASSET_LINK = re.compile(rf"\.(?:{ASSET_EXTENSIONS})(?:[?#]|$)", re.I)
+ASSET_IN_SCRIPT = re.compile(rf"[\"'`]([^\"'`\s<>]+\.(?:{ASSET_EXTENSIONS})(?:\?[^\"'`\s<>]*)?)[\"'`]", re.I)
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _table_to_csv(table, max_rows: Optional[int] = MAX_TABLE_ROWS) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for i, row in enumerate(table.find_all("tr")):
+        if max_rows is not None and i >= max_rows:
+            buf.write(f"... [{len(table.find_all('tr')) - max_rows} more rows]\n")
+            break
+        cells = row.find_all(["th", "td"])
+        writer.writerow([_clean(c.get_text(" ")) for c in cells])
+    return buf.getvalue().strip()
+
+
+def _budget_tables(tables: list) -> list:
+    """Tables in page order up to MAX_TABLES_TOTAL characters, then a note for the rest."""
+    kept, total = [], 0
+    for i, csv_text in enumerate(tables):
+        if total + len(csv_text) > MAX_TABLES_TOTAL:
+            kept.append(
+                f"... [{len(tables) - i} more table(s) not shown, "
+                f"use query_page with selector \"table\" for the rest]"
+            )
+            break
+        kept.append(csv_text)
+        total += len(csv_text)
+    return kept
+
+
+def _forms(soup, base_url: str) -> list:
+    forms = []
+    for form in soup.find_all("form"):
+        fields = []
+        for field in form.find_all(["input", "select", "textarea", "button"]):
+            name = field.get("name") or field.get("id")
+            if not name:
+                continue
+            fields.append({
+                "name": name,
+                "type": field.get("type", field.name),
+                "value": field.get("value", ""),
+            })
+        forms.append({
+            "action": urljoin(base_url, form.get("action", "")),
+            "method": form.get("method", "get").upper(),
+            "fields": fields,
+        })
+    return forms
+
+
+def _data_script_bodies(soup) -> list:
+    """Full bodies of inline scripts that carry data or build the DOM."""
+    bodies = []
+    for script in soup.find_all("script"):
+        body = (script.string or "").strip()
+        if not body or script.get("src"):
+            continue
+        is_json = "json" in (script.get("type") or "")
+        if is_json or DATA_SCRIPT_HINTS.search(body):
+            bodies.append(body)
+    return bodies
+
+
+def _data_scripts(bodies: list) -> list:
+    scripts, total = [], 0
+    for body in bodies:
+        if len(body) > MAX_SCRIPT_CHARS:
+            body = body[:MAX_SCRIPT_CHARS] + "... [TRUNCATED, use query_page]"
+        if total + len(body) > MAX_SCRIPTS_TOTAL:
+            break
+        scripts.append(body)
+        total += len(body)
+    return scripts
+
+
+def _assets(soup, base_url: str) -> list:
+    """Downloadable files the page references: media sources, file links, file paths in scripts."""
+    found = []
+    for tag in soup.find_all(["img", "audio", "video", "source", "embed"], src=True):
+        found.append(tag["src"])
+    for tag in soup.find_all(["a", "link"], href=True):
+        if ASSET_LINK.search(tag["href"]):
+            found.append(tag["href"])
+    for script in soup.find_all("script"):
+        found.extend(ASSET_IN_SCRIPT.findall(script.string or ""))
+
+    assets, seen = [], set()
+    for ref in found:
+        url = urljoin(base_url, ref.strip()).split("#")[0]
+        if url.startswith(("http://", "https://")) and url not in seen:
+            seen.add(url)
+            assets.append(url)
+    return assets
+
+
+def _submit_endpoint(text: str, forms: list, links: list) -> str:
+    for form in forms:
+        if form["method"] == "POST" and form["action"]:
+            return form["action"]
+    for url in URL_IN_TEXT.findall(text):
+        if SUBMIT_HINT.search(url):
+            return url.rstrip(".,;")
+    for link in links:
+        if SUBMIT_HINT.search(link["href"]):
+            return link["href"]
+    return ""
+
+
+def distill_html(html: str, url: str) -> dict:
+    """
+    Reduce a page to what the agent actually reads: visible text, links,
+    forms, tables as CSV, data-bearing inline scripts, images and the most
+    likely answer-submission endpoint.
+
+    "identity" holds what tells two quiz pages apart, taken before any
+    truncation: the full visible text, and every table, data script and
+    asset URL. It is for fingerprinting, not for the LLM.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    title = _clean(soup.title.get_text()) if soup.title else ""
+    images = [urljoin(url, img["src"]) for img in soup.find_all("img", src=True)]
+    script_bodies = _data_script_bodies(soup)
+    scripts = _data_scripts(script_bodies)
+    forms = _forms(soup, url)
+    assets = _assets(soup, url)
+
+    links, seen = [], set()
+    for a in soup.find_all("a", href=True):
+        href = urljoin(url, a["href"])
+        if href in seen or href.startswith("javascript:"):
+            continue
+        seen.add(href)
+        links.append({"text": _clean(a.get_text(" "))[:100], "href": href})
+
+    table_tags = soup.find_all("table")
+    tables = _budget_tables([_table_to_csv(t) for t in table_tags])
+    full_tables = [_table_to_csv(t, max_rows=None) for t in table_tags]
+
+    for tag in soup(["script", "style", "noscript", "template", "table"]):
+        tag.extract()
+    text = _clean(soup.get_text(" "))
+    submit = _submit_endpoint(text, forms, links)
+    identity = {"text": text, "data": "\n\n".join(full_tables + script_bodies + assets)}
+
+    if len(text) > MAX_TEXT_CHARS:
+        text = text[:MAX_TEXT_CHARS] + "... [TRUNCATED, use query_page]"
+
+    distilled = {
+        "url": url,
+        "title": title,
+        "text": text,
+        "links": links[:MAX_LINKS],
+        "forms": forms,
+        "tables": tables,
+        "scripts": scripts,
+        "images": images,
+        "submit_endpoint": submit,
+        "assets": assets,
+        "identity": identity,
+    }
+    # Drop empty sections to keep the tool message small
+    return {k: v for k, v in distilled.items() if v or k in ("url", "text")}
@@ -0,0 +1,115 @@
+import httpx
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+MIN_TIMEOUT = 1.0
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "32"))
+
+
+def _http2_enabled() -> bool:
+    # HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+    if os.getenv("HTTP2", "0") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("HTTP2=1 but the h2 package is not installed; using HTTP/1.1")
+        return False
+
+
+# One client for every network tool. httpx.Client is thread-safe and keeps
+# alive connections per host, so repeat calls to the quiz server skip the
+# TCP + TLS handshake. Async tools use it from worker threads.
+CLIENT = httpx.Client(
+    http2=_http2_enabled(),
+    follow_redirects=True,
+    limits=httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=30,
+    ),
+    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+)
+
+_stats_lock = threading.Lock()
+HTTP_STATS = {}
+
+
+def timeout_for(remaining: Optional[float] = None, read: float = READ_TIMEOUT) -> httpx.Timeout:
+    """
+    Connect/read timeouts that never outlive the quiz deadline. `remaining`
+    is the number of seconds left in the current quiz's budget.
+    """
+    connect = CONNECT_TIMEOUT
+    if remaining is not None:
+        remaining = max(MIN_TIMEOUT, remaining)
+        connect, read = min(connect, remaining), min(read, remaining)
+    return httpx.Timeout(read, connect=connect)
+
+
+def _record(url: str, seconds: float, status: Optional[int]):
+    host = urlsplit(url).netloc or "unknown"
+    with _stats_lock:
+        entry = HTTP_STATS.setdefault(host, {
+            "requests": 0, "errors": 0, "seconds_total": 0.0, "seconds_max": 0.0, "status": {},
+        })
+        entry["requests"] += 1
+        entry["seconds_total"] += seconds
+        entry["seconds_max"] = max(entry["seconds_max"], seconds)
+        if status is None or status >= 400:
+            entry["errors"] += 1
+        key = str(status) if status is not None else "error"
+        entry["status"][key] = entry["status"].get(key, 0) + 1
+
+
+def request(method: str, url: str, **kwargs) -> httpx.Response:
+    """CLIENT.request with per-host latency metrics."""
+    start = time.perf_counter()
+    status = None
+    try:
+        response = CLIENT.request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        _record(url, time.perf_counter() - start, status)
+
+
+@contextmanager
+def stream(method: str, url: str, **kwargs):
+    """CLIENT.stream with metrics covering the whole body transfer."""
+    start = time.perf_counter()
+    status = None
+    try:
+        with CLIENT.stream(method, url, **kwargs) as response:
+            status = response.status_code
+            yield response
+    except BaseException:
+        status = None
+        raise
+    finally:
+        _record(url, time.perf_counter() - start, status)
+
+
+def http_stats() -> dict:
+    with _stats_lock:
+        return {
+            host: {
+                "requests": e["requests"],
+                "errors": e["errors"],
+                "avg_seconds": round(e["seconds_total"] / e["requests"], 3) if e["requests"] else 0.0,
+                "max_seconds": round(e["seconds_max"], 3),
+                "status": dict(e["status"]),
+            }
+            for host, e in HTTP_STATS.items()
+        }
@@ -1,52 +1,118 @@
-import pytesseract
-from PIL import Image
-from io import BytesIO
+from langchain_core.tools import tool
+import asyncio
 import base64
 import os
+from langgraph.prebuilt import InjectedState
+from session import CancelScope, Session, get_session
+from typing import Annotated, List, Optional, Tuple
+from startup import STARTUP
+from .download_cache import DOWNLOAD_CACHE, TransferLimit
+from .ocr_engine import OCR_ENGINE
+from .pdf_engine import parse_pages, select_pages
+from . import http_client
 
+MAX_TEXT_CHARS = 4000
 
-def load_image(image_input):
-    """Internal helper to load an image from bytes, file path, base64, or PIL.Image."""
-    if isinstance(image_input, bytes):
-        return Image.open(BytesIO(image_input)).convert("RGB")
-    if isinstance(image_input, Image.Image):
-        return image_input.convert("RGB")
-    if isinstance(image_input, str):
-        if image_input.startswith("data:"):   # base64 data URL
-            _, b64 = image_input.split(",", 1)
-            return Image.open(BytesIO(base64.b64decode(b64))).convert("RGB")
-        return Image.open(os.path.join("LLMFiles", image_input)).convert("RGB")
-    raise ValueError("Unsupported image input type")
 
+def pdf_page_images(path: str, pages: str = "", cancel: Optional[CancelScope] = None) -> List[Tuple[str, bytes]]:
+    """Images embedded in a PDF's pages (a scanned page is usually one image)."""
+    reader = STARTUP.timed_import("pypdf").PdfReader(path)
+    name = os.path.basename(path)
+    images = []
+    for index in select_pages(parse_pages(pages), len(reader.pages)):
+        if cancel is not None:
+            cancel.check()
+        for n, image in enumerate(reader.pages[index].images, 1):
+            images.append((f"{name}#page={index + 1}&image={n}", image.data))
+    return images
 
-def ocr_image_tool(payload: dict) -> dict:
+
+def load_images(source: str, session: Session, pages: str = "",
+                cancel: Optional[CancelScope] = None) -> List[Tuple[str, bytes]]:
+    """Resolve one OCR input to (label, image bytes) pairs; stops once `cancel` is set."""
+    if source.startswith("data:"):   # base64 data URL
+        _, b64 = source.split(",", 1)
+        return [("data-url", base64.b64decode(b64))]
+    if source.startswith("BASE64_KEY:") and source in session.artifacts:
+        if session.artifacts.meta(source).get("encoding") == "base64":
+            # A file reference from encode_image_to_base64: read the image itself
+            with open(session.artifacts.materialize(source), "rb") as f:
+                return [(source, f.read())]
+        return [(source, base64.b64decode(session.artifacts.get(source)))]
+    if source.startswith(("http://", "https://")):
+        timeout = http_client.timeout_for(session.deadline.tool_budget("ocr_image_tool"))
+        path = DOWNLOAD_CACHE.fetch(source, timeout, TransferLimit(cancel=cancel))["path"]
+        with open(path, "rb") as f:
+            data = f.read()
+        return [(source, data)]
+
+    path = os.path.join(session.workdir, source)
+    with open(path, "rb") as f:
+        head = f.read(5)
+    if head == b"%PDF-":
+        return pdf_page_images(path, pages, cancel)
+    with open(path, "rb") as f:
+        return [(source, f.read())]
+
+
+@tool
+async def ocr_image_tool(
+    images: List[str],
+    lang: str = "eng",
+    preprocess: bool = True,
+    pages: str = "",
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> dict:
     """
-    Extract text from an image using pytesseract OCR.
+    Extract text from images using OCR (tesseract). Pass every image you
+    need in one call; they are recognised in parallel.
 
-    Expected payload:
-    {
-        "image": bytes | base64 string | file path | PIL.Image,
-        "lang": "eng" (optional)
-    }
+    Args:
+        images (List[str]): Each item is a filename in the working directory
+            (PNG, JPG, ...; a PDF OCRs the images of its scanned pages), an
+            http(s) image URL, a base64 data URL or a BASE64_KEY:... handle.
+        lang (str): Tesseract language code(s), e.g. "eng" or "eng+deu".
+        preprocess (bool): Grayscale, deskew and binarize before OCR. Turn it
+            off if a clean screenshot reads worse with it.
+        pages (str): For PDFs, 1-based pages such as "1-3,5" (default: all).
 
     Returns:
     {
-        "text": "<extracted text>",
+        "results": [
+            {"source": ..., "text": "<extracted text>", "cached": bool,
+             "artifact": "<handle to the full text, only if it was too long>"}
+        ],
         "engine": "pytesseract"
     }
-
-    Use this tool when the user wants to read or extract text from an image.
     """
     try:
-        image_data = payload["image"]
-        lang = payload.get("lang", "eng")
-
-        img = load_image(image_data)
-        text = pytesseract.image_to_string(img, lang=lang)
+        session = get_session(session_id)
+        # Image downloads and PDF scans stop once the call times out
+        cancel = session.tool_cancel()
+        inputs, results = [], []
+        for source in images:
+            try:
+                inputs.extend(await asyncio.to_thread(load_images, source, session, pages, cancel))
+            except Exception as e:
+                results.append({"source": source, "error": f"{type(e).__name__}: {e}"})
+        if not inputs and not results:
+            return {"results": [], "engine": "pytesseract", "note": "No images found"}
 
-        return {
-            "text": text.strip(),
-            "engine": "pytesseract"
-        }
+        recognized = await OCR_ENGINE.recognize_many([data for _, data in inputs], lang, preprocess)
+        # Long texts go to the artifact store; the budget is shared by all images
+        per_image = max(500, MAX_TEXT_CHARS // max(1, len(inputs)))
+        for (label, _), outcome in zip(inputs, recognized):
+            if isinstance(outcome, BaseException):
+                results.append({"source": label, "error": f"{type(outcome).__name__}: {outcome}"})
+                continue
+            text, cached = outcome
+            entry = {"source": label, "text": text, "cached": cached}
+            if len(text) > per_image:
+                handle = session.artifacts.put(text)
+                entry["text"] = session.artifacts.preview(handle, per_image)
+                entry["artifact"] = handle
+            results.append(entry)
+        print(f"OCR: {len(inputs)} image(s), {sum(1 for r in results if r.get('cached'))} from cache")
+        return {"results": results, "engine": "pytesseract"}
     except Exception as e:
         return f"Error occurred: {e}"
@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+from dotenv import load_dotenv
+from startup import STARTUP
+
+load_dotenv()
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 2)))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join("LLMFiles", ".cache", "ocr"))
+
+
+class OCREngine:
+    """
+    Runs tesseract on a pool of worker processes, one image per task, so a
+    batch of images or scanned pages is recognised in parallel across
+    cores. Results are cached on disk by a hash of the image bytes and the
+    OCR options, so the same image is never recognised twice.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, cache_dir: str = OCR_CACHE_DIR):
+        self.workers = max(1, workers)
+        self.cache_dir = cache_dir
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "cache_hits": 0, "errors": 0}
+
+    @staticmethod
+    def _worker():
+        # NumPy, Pillow and pytesseract load only once OCR is first used
+        return STARTUP.timed_import("ocr_worker")
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Never fork the server process itself (it runs threads)
+                method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=mp.get_context(method),
+                    initializer=self._worker().init_worker,
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------------------------------
+    # CACHE
+    # -------------------------------------------------
+    def _cache_path(self, data: bytes, lang: str, clean: bool) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        key = hashlib.sha256(f"{digest}:{lang}:{int(clean)}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    @staticmethod
+    def _read(path: str):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write(path: str, text: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    # -------------------------------------------------
+    # OCR
+    # -------------------------------------------------
+    async def recognize(self, data: bytes, lang: str = "eng", clean: bool = True) -> Tuple[str, bool]:
+        """OCR one image; returns (text, served_from_cache)."""
+        path = self._cache_path(data, lang, clean)
+        cached = await asyncio.to_thread(self._read, path)
+        with self._lock:
+            self._stats["images"] += 1
+            if cached is not None:
+                self._stats["cache_hits"] += 1
+        if cached is not None:
+            return cached, True
+        try:
+            future = self._executor().submit(self._worker().ocr, data, lang, clean)
+            text = await asyncio.wrap_future(future)
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        await asyncio.to_thread(self._write, path, text)
+        return text, False
+
+    async def recognize_many(self, images: List[bytes], lang: str = "eng", clean: bool = True) -> list:
+        """OCR a batch concurrently; each entry is (text, cached) or the exception raised."""
+        return await asyncio.gather(
+            *(self.recognize(data, lang, clean) for data in images), return_exceptions=True
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self.workers
+        stats["running"] = self._pool is not None
+        return stats
+
+
+OCR_ENGINE = OCREngine()
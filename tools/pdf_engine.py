@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+from dotenv import load_dotenv
+from startup import STARTUP
+
+load_dotenv()
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join("LLMFiles", ".cache", "pdf"))
+# Pages per pool task: large enough to amortize opening the file in the
+# worker, small enough to spread a document over every core
+MAX_PAGES_PER_TASK = 16
+
+
+def parse_pages(pages: str) -> List[Tuple[int, int]]:
+    """
+    1-based inclusive ranges from a spec like "1-3,5"; empty means all
+    pages. Raises ValueError for a malformed spec.
+    """
+    if not pages.strip():
+        return []
+    ranges = []
+    for part in pages.split(","):
+        lo, _, hi = part.strip().partition("-")
+        start, end = int(lo), int(hi or lo)
+        if start < 1 or end < start:
+            raise ValueError(f"bad page range {part.strip()!r}")
+        ranges.append((start, end))
+    return ranges
+
+
+def select_pages(ranges: List[Tuple[int, int]], count: int) -> List[int]:
+    """0-based indexes of the pages in `ranges` that exist (no ranges = all)."""
+    if not ranges:
+        return list(range(count))
+    return [i - 1 for start, end in ranges for i in range(start, min(end, count) + 1)]
+
+
+def file_digest(path: str, cancel=None) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            if cancel is not None:
+                cancel.check()
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PDFEngine:
+    """
+    Extracts text and tables from PDF pages on a pool of worker processes,
+    a chunk of pages per task, so a long document is parsed on every core
+    at once. Each page's result is cached on disk under the file's hash, so
+    a page is parsed once however many times or in whatever ranges it is
+    asked for.
+    """
+
+    def __init__(self, workers: int = PDF_WORKERS, cache_dir: str = PDF_CACHE_DIR):
+        self.workers = max(1, workers)
+        self.cache_dir = cache_dir
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {"documents": 0, "pages": 0, "cache_hits": 0, "errors": 0}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Never fork the server process itself (it runs threads)
+                method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context(method))
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------------------------------
+    # CACHE
+    # -------------------------------------------------
+    def _page_path(self, digest: str, page: int) -> str:
+        return os.path.join(self.cache_dir, digest[:2], digest, f"{page}.json")
+
+    def _read(self, digest: str, page: int):
+        try:
+            with open(self._page_path(digest, page), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, digest: str, results: List[dict]):
+        for result in results:
+            path = self._page_path(digest, result["page"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp, path)
+
+    # -------------------------------------------------
+    # EXTRACTION
+    # -------------------------------------------------
+    def _scan(self, path: str, ranges: List[Tuple[int, int]], cancel=None):
+        """(digest, page count, wanted indexes, cached results) without parsing any page."""
+        digest = file_digest(path, cancel)
+        count = len(STARTUP.timed_import("pypdf").PdfReader(path).pages)
+        wanted = select_pages(ranges, count)
+        cached = {i: self._read(digest, i + 1) for i in wanted}
+        return digest, count, wanted, {i: r for i, r in cached.items() if r is not None}
+
+    async def extract(self, path: str, ranges: List[Tuple[int, int]] = (), cancel=None) -> dict:
+        """
+        Text and tables of the pages in `ranges` (see parse_pages), in page
+        order: {"page_count": N, "pages": [{"page", "text", "tables"}], "cached_pages": k}
+
+        Cancelling the coroutine drops page chunks still queued for the
+        pool; `cancel` (a CancelScope) also stops the file scan running in
+        a thread.
+        """
+        digest, count, wanted, cached = await asyncio.to_thread(self._scan, path, list(ranges), cancel)
+        missing = [i for i in wanted if i not in cached]
+        chunk = max(1, min(MAX_PAGES_PER_TASK, -(-len(missing) // self.workers)))
+        tasks = [missing[i:i + chunk] for i in range(0, len(missing), chunk)]
+        extract_pages = STARTUP.timed_import("pdf_worker").extract_pages
+        try:
+            parsed = await asyncio.gather(*(
+                asyncio.wrap_future(self._executor().submit(extract_pages, path, task))
+                for task in tasks
+            ))
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+
+        fresh = [r for batch in parsed for r in batch]
+        await asyncio.to_thread(self._write, digest, fresh)
+        results = dict(cached)
+        results.update((r["page"] - 1, r) for r in fresh)
+        with self._lock:
+            self._stats["documents"] += 1
+            self._stats["pages"] += len(wanted)
+            self._stats["cache_hits"] += len(cached)
+        return {
+            "page_count": count,
+            "pages": [results[i] for i in wanted],
+            "cached_pages": len(cached),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self.workers
+        stats["running"] = self._pool is not None
+        return stats
+
+
+PDF_ENGINE = PDFEngine()
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import httpx
+from dotenv import load_dotenv
+from session import Session
+from . import http_client
+from .download_cache import DOWNLOAD_CACHE, TransferLimit, TransferLimitExceeded
+
+load_dotenv()
+
+# Set PREFETCH=0 to only download what the agent asks for
+PREFETCH_ENABLED = os.getenv("PREFETCH", "1") == "1"
+PREFETCH_MAX_MB_PER_PAGE = float(os.getenv("PREFETCH_MAX_MB_PER_PAGE", "50"))
+PREFETCH_MAX_FILE_MB = float(os.getenv("PREFETCH_MAX_FILE_MB", "25"))
+PREFETCH_SECONDS = float(os.getenv("PREFETCH_SECONDS", "20"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+MAX_ASSETS_PER_PAGE = 20
+
+
+class Prefetcher:
+    """
+    Downloads the assets a rendered page links to (images, audio, data
+    files) into DOWNLOAD_CACHE in the background, while the LLM is still
+    reading the page. A later download_file for the same URL then finds
+    the file already cached, or waits on the transfer already under way.
+
+    Each page gets a byte and a time budget, enforced on every received
+    chunk; files that do not fit, or whose size the server does not
+    announce, are skipped. download_file reports every URL it needs
+    through `claim`, so hits (prefetched), misses (not prefetched) and
+    bytes fetched but never used are all measured.
+    """
+
+    def __init__(self, workers: int = PREFETCH_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._entries = {}  # (session_id, url) -> {"state", "bytes", "future"}
+        self._stats = {
+            "scheduled": 0, "fetched": 0, "already_cached": 0, "skipped": 0, "failed": 0,
+            "hits": 0, "misses": 0, "bytes_prefetched": 0, "bytes_used": 0, "bytes_wasted": 0,
+        }
+
+    # -------------------------------------------------
+    # PREFETCHING
+    # -------------------------------------------------
+    def schedule(self, session: Session, urls: List[str]) -> int:
+        """Queue a page's asset URLs for download; returns how many were queued."""
+        if not PREFETCH_ENABLED or not urls:
+            return 0
+        seconds = min(PREFETCH_SECONDS, session.deadline.tool_budget("download_file"))
+        budget = TransferLimit(int(PREFETCH_MAX_MB_PER_PAGE * 1024 * 1024), until=time.time() + seconds)
+        queued = 0
+        for url in urls[:MAX_ASSETS_PER_PAGE]:
+            key = (session.id, url)
+            with self._lock:
+                if key in self._entries:
+                    continue
+                entry = {"state": "queued", "bytes": 0}
+                # Published together with its future, so claim always has one to wait on
+                entry["future"] = self._pool.submit(self._prefetch, entry, url, budget)
+                self._entries[key] = entry
+                self._stats["scheduled"] += 1
+            queued += 1
+        return queued
+
+    def _prefetch(self, entry: dict, url: str, budget: TransferLimit):
+        remaining = budget.until - time.time()
+        if remaining <= 0:
+            return self._finish(entry, "skipped")
+        try:
+            head = http_client.request(
+                "HEAD", url, headers={"Accept-Encoding": "identity"}, timeout=http_client.timeout_for(remaining)
+            )
+            if head.status_code in (404, 410):
+                return self._finish(entry, "failed")
+            if head.status_code >= 400:
+                head = None
+            size = int(head.headers["content-length"]) if head is not None else None
+        except (httpx.HTTPError, KeyError, ValueError):
+            head, size = None, None
+        # Unknown sizes are left to download_file rather than risking the budget
+        limit = None
+        if size is not None and size <= PREFETCH_MAX_FILE_MB * 1024 * 1024:
+            # Reserves the announced size so parallel fetches share the page budget
+            limit = budget.open(size, max_bytes=int(PREFETCH_MAX_FILE_MB * 1024 * 1024))
+        if limit is None:
+            return self._finish(entry, "skipped")
+        try:
+            # The cache reuses this HEAD instead of sending its own
+            result = DOWNLOAD_CACHE.fetch(url, http_client.timeout_for(budget.until - time.time()), limit, head)
+        except TransferLimitExceeded as e:
+            print(f"Prefetch of {url} stopped: {e}")
+            return self._finish(entry, "skipped")
+        except Exception as e:
+            print(f"Prefetch failed for {url}: {type(e).__name__}: {e}")
+            return self._finish(entry, "failed")
+        finally:
+            limit.close()
+        if result["cache"] == "miss":
+            self._finish(entry, "fetched", result["size"])
+        else:
+            self._finish(entry, "already_cached")
+
+    def _finish(self, entry: dict, state: str, size: int = 0):
+        with self._lock:
+            entry["state"], entry["bytes"] = state, size
+            self._stats[state] += 1
+            self._stats["bytes_prefetched"] += size
+
+    # -------------------------------------------------
+    # ACCOUNTING
+    # -------------------------------------------------
+    def claim(self, session_id: str, url: str) -> bool:
+        """
+        Called for every URL the agent downloads. True when a prefetch got
+        it; a prefetch still under way is waited for first (the download
+        would wait on the same transfer anyway).
+        """
+        with self._lock:
+            entry = self._entries.get((session_id, url))
+        if entry is not None:
+            try:
+                entry["future"].result(timeout=PREFETCH_SECONDS)
+            except Exception:
+                pass
+        with self._lock:
+            hit = entry is not None and entry["state"] in ("fetched", "already_cached")
+            self._stats["hits" if hit else "misses"] += 1
+            if hit and not entry.get("claimed"):
+                # Downloading the same URL again uses no more prefetched bytes
+                entry["claimed"] = True
+                self._stats["bytes_used"] += entry["bytes"]
+        return hit
+
+    def release(self, session_id: str):
+        """Drop a finished session's prefetches; what it never used counts as wasted."""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == session_id]
+            entries = [self._entries.pop(key) for key in keys]
+            for entry in entries:
+                if not entry.get("claimed"):
+                    self._stats["bytes_wasted"] += entry["bytes"]
+        for entry in entries:
+            entry["future"].cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = sum(1 for e in self._entries.values() if e["state"] == "queued")
+        claims = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / claims, 3) if claims else None
+        stats["enabled"] = PREFETCH_ENABLED
+        return stats
+
+
+PREFETCHER = Prefetcher()
@@ -0,0 +1,185 @@
+from langchain_core.tools import tool
+import asyncio
+import datetime
+import decimal
+import os
+from langgraph.prebuilt import InjectedState
+from session import get_session
+from typing import TYPE_CHECKING, Annotated
+from startup import STARTUP
+
+if TYPE_CHECKING:
+    import duckdb
+
+# Rows returned inline by the SQL mode; bigger results should be
+# aggregated or written to a file with `output`
+MAX_SQL_ROWS = 200
+MAX_SAMPLE_ROWS = 20
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "2GB")
+
+READERS = {
+    ".csv": "read_csv_auto", ".tsv": "read_csv_auto", ".txt": "read_csv_auto",
+    ".json": "read_json_auto", ".jsonl": "read_json_auto", ".ndjson": "read_json_auto",
+    ".parquet": "read_parquet", ".pq": "read_parquet",
+}
+EXCEL = (".xlsx", ".xlsm", ".xls")
+# min()/max() are meaningless (or unsupported) on nested types
+NESTED_TYPES = ("[]", "STRUCT", "MAP", "UNION")
+
+
+def quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def jsonable(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): jsonable(v) for k, v in value.items()}
+    return str(value)
+
+
+def open_dataset(con: "duckdb.DuckDBPyConnection", path: str):
+    """Expose the file as the view `data`. DuckDB scans it lazily; nothing is loaded up front."""
+    name = path.lower()
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    ext = os.path.splitext(name)[1]
+    if ext in EXCEL:
+        # No extension download needed: pandas reads the sheet, DuckDB scans the frame
+        import pandas as pd
+        try:
+            frame = pd.read_excel(path)
+        except ImportError:
+            # openpyxl (.xlsx/.xlsm) and xlrd (.xls) are not project dependencies
+            engine = "xlrd" if ext == ".xls" else "openpyxl"
+            raise ValueError(
+                f"Reading {ext} files needs the {engine} package, which is not installed. Install it with "
+                f"add_dependencies, convert the sheet to CSV with pandas in run_code, then profile the CSV"
+            ) from None
+        con.register("data", frame)
+        return
+    reader = READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"Unsupported file type {ext or name!r}; expected CSV, JSON(L), Parquet or Excel")
+    con.execute(f"CREATE VIEW data AS SELECT * FROM {reader}({quote(path)})")
+
+
+def profile(con: "duckdb.DuckDBPyConnection", sample_rows: int) -> dict:
+    columns = con.execute("DESCRIBE data").fetchall()
+    parts = ["count(*)"]
+    for name, col_type, *_ in columns:
+        parts.append(f"count(*) - count({ident(name)})")
+        if any(t in col_type for t in NESTED_TYPES):
+            parts += ["NULL", "NULL"]
+        else:
+            parts += [f"min({ident(name)})::VARCHAR", f"max({ident(name)})::VARCHAR"]
+    # One pass over the file for every statistic
+    row = con.execute(f"SELECT {', '.join(parts)} FROM data").fetchone()
+    schema = []
+    for i, (name, col_type, *_) in enumerate(columns):
+        nulls, low, high = row[1 + 3 * i: 4 + 3 * i]
+        schema.append({"name": name, "type": col_type, "nulls": nulls, "min": low, "max": high})
+
+    sample = con.execute(f"SELECT * FROM data LIMIT {sample_rows}")
+    header = [d[0] for d in sample.description]
+    return {
+        "rows": row[0],
+        "columns": schema,
+        "sample": [dict(zip(header, jsonable(list(r)))) for r in sample.fetchall()],
+    }
+
+
+def run_sql(con: "duckdb.DuckDBPyConnection", sql: str, output: str) -> dict:
+    if output:
+        # Streamed straight to disk by DuckDB, never materialized here
+        fmt = "PARQUET" if output.lower().endswith((".parquet", ".pq")) else "CSV, HEADER"
+        count = con.execute(f"COPY ({sql}) TO {quote(output)} (FORMAT {fmt})").fetchone()[0]
+        return {"output": os.path.basename(output), "rows": count}
+
+    result = con.execute(sql)
+    header = [d[0] for d in result.description] if result.description else []
+    rows = result.fetchmany(MAX_SQL_ROWS + 1)
+    answer = {
+        "columns": header,
+        "rows": [jsonable(list(r)) for r in rows[:MAX_SQL_ROWS]],
+    }
+    if len(rows) > MAX_SQL_ROWS:
+        answer["truncated"] = (
+            f"Only the first {MAX_SQL_ROWS} rows are shown; aggregate in SQL or pass output='result.csv'"
+        )
+    return answer
+
+
+@tool
+async def profile_dataset(
+    file_path: str,
+    sql: str = "",
+    sample_rows: int = 5,
+    output: str = "",
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> dict:
+    """
+    Inspect a downloaded data file (CSV/TSV, JSON/JSONL, Parquet, Excel;
+    optionally .gz) with DuckDB, without writing any code.
+
+    Without `sql` it profiles the file in one pass: schema, row count,
+    null count and min/max per column, and a few sample rows. Do this
+    first instead of loading the file in run_code just to see its shape.
+
+    With `sql` it runs the query directly on the file, which is exposed as
+    the table `data`; other files in the working directory can be read by
+    name, e.g. read_csv_auto('other.csv'). Example:
+        SELECT city, sum(amount) FROM data WHERE amount > 100 GROUP BY city
+
+    Args:
+        file_path (str): Filename in the working directory.
+        sql (str): Optional DuckDB SQL query over `data`.
+        sample_rows (int): Sample rows in profile mode (max 20).
+        output (str): With `sql`, save the full result to this filename
+            (.csv or .parquet) instead of returning rows.
+
+    Returns:
+        Profile: {"rows": N, "columns": [{"name", "type", "nulls", "min", "max"}], "sample": [...]}
+        SQL: {"columns": [...], "rows": [[...], ...]} (at most 200 rows)
+        or {"output": "<filename>", "rows": N}
+    """
+    workdir = get_session(session_id).workdir
+    path = os.path.join(workdir, file_path)
+    if not os.path.exists(path):
+        return {"error": f"File not found: {file_path}. Download it first with download_file."}
+
+    duckdb = STARTUP.timed_import("duckdb")
+    con = duckdb.connect(config={"memory_limit": DUCKDB_MEMORY_LIMIT})
+
+    def work():
+        try:
+            con.execute(f"SET file_search_path = {quote(workdir)}")
+            open_dataset(con, path)
+            if sql.strip():
+                return run_sql(con, sql.strip().rstrip(";"), os.path.join(workdir, output) if output else "")
+            return profile(con, max(0, min(sample_rows, MAX_SAMPLE_ROWS)))
+        finally:
+            con.close()
+
+    try:
+        result = await asyncio.to_thread(work)
+        print(f"profile_dataset {file_path}: {'sql' if sql.strip() else 'profile'} ok")
+        return result
+    except asyncio.CancelledError:
+        # The tool deadline fired; stop the query instead of letting it run on
+        con.interrupt()
+        raise
+    except (duckdb.Error, ValueError, ImportError) as e:
+        return {"error": f"{type(e).__name__}: {e}"}
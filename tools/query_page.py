@@ -0,0 +1,52 @@
+from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedState
+from session import get_session
+from typing import Annotated
+from bs4 import BeautifulSoup
+
+@tool
+def query_page(
+    page_ref: str,
+    selector: str = "",
+    max_chars: int = 20000,
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> dict:
+    """
+    Inspect the full HTML of a page previously fetched by get_rendered_html.
+
+    Args:
+        page_ref (str): The "page_ref" value returned by get_rendered_html.
+        selector (str): Optional CSS selector (e.g. "#question", "script",
+            "div.data span"). If empty, the raw HTML is returned.
+        max_chars (int): Upper bound on the characters returned.
+
+    Returns:
+        dict: {"matches": [...outer HTML of matching elements...]} or
+        {"html": "..."} when no selector is given.
+    """
+    artifacts = get_session(session_id).artifacts
+    try:
+        html = artifacts.get(page_ref)
+        page_url = artifacts.meta(page_ref).get("url", "")
+    except KeyError:
+        return {"error": f"Unknown page_ref {page_ref}. Fetch the page again with get_rendered_html."}
+
+    if not selector:
+        if len(html) > max_chars:
+            html = html[:max_chars] + "... [TRUNCATED]"
+        return {"url": page_url, "html": html}
+
+    try:
+        elements = BeautifulSoup(html, "html.parser").select(selector)
+    except Exception as e:
+        return {"error": f"Invalid selector {selector!r}: {e}"}
+
+    matches, used = [], 0
+    for el in elements:
+        chunk = str(el)
+        if used + len(chunk) > max_chars:
+            matches.append(f"... [{len(elements) - len(matches)} more matches TRUNCATED]")
+            break
+        matches.append(chunk)
+        used += len(chunk)
+    return {"url": page_url, "selector": selector, "count": len(elements), "matches": matches}
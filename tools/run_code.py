@@ -1,11 +1,18 @@
-from google import genai
-import subprocess
 from langchain_core.tools import tool
 from dotenv import load_dotenv
 import os
-from google.genai import types
+from langgraph.prebuilt import InjectedState
+from session import Session, get_session
+from typing import Annotated
+from .code_runner import CODE_RUNNER
+import asyncio
+import re
+import uuid
 load_dotenv()
-client = genai.Client()
+
+MIN_TIMEOUT_SECONDS = 5
+MAX_TIMEOUT_SECONDS = float(os.getenv("RUN_CODE_TIMEOUT", "120"))
+QUOTED_HANDLE = re.compile(r"([rRbB]?)([\"'])((?:ARTIFACT|BASE64_KEY|PAGE):[0-9a-f-]{8,36})\2")
 
 def strip_code_fences(code: str) -> str:
     code = code.strip()
@@ -17,16 +24,67 @@ def strip_code_fences(code: str) -> str:
         code = code.rsplit("\n", 1)[0]
     return code.strip()
 
+
+def resolve_artifact_handles(code: str, artifacts) -> str:
+    """
+    Replace quoted artifact handles in the code, e.g. "ARTIFACT:3f2a9c1d0b7e",
+    with an expression that reads the full value from disk, so snippets can
+    use handles as if they were the literal strings.
+    """
+    def substitute(match):
+        handle = match.group(3)
+        if handle not in artifacts:
+            return match.group(0)
+        path = artifacts.materialize(handle)
+        if artifacts.meta(handle).get("encoding") == "base64":
+            # File reference: the value is the base64 text of the file
+            encoded = f"__import__('base64').b64encode(open({path!r}, 'rb').read())"
+            return encoded if match.group(1) in ("b", "B") else f"{encoded}.decode('ascii')"
+        if match.group(1) in ("b", "B"):
+            return f"open({path!r}, 'rb').read()"
+        return f"open({path!r}, encoding='utf-8').read()"
+    return QUOTED_HANDLE.sub(substitute, code)
+
+
+def code_timeout(session: Session) -> float:
+    """Wall-clock limit for a snippet: its share of the current quiz's deadline."""
+    return max(MIN_TIMEOUT_SECONDS, min(MAX_TIMEOUT_SECONDS, session.deadline.tool_budget("run_code")))
+
+
+def summarize_output(run: dict, name: str, artifacts) -> dict:
+    """
+    The LLM only sees the bounded head/tail summary. When that summary had to
+    drop text, the full log is kept on disk behind an artifact handle;
+    otherwise the log is deleted.
+    """
+    path = run[f"{name}_path"]
+    if not run[f"{name}_truncated"]:
+        if os.path.exists(path):
+            os.remove(path)
+        return {"text": run[name]}
+    return {"text": run[name], "artifact": artifacts.put_file(path)}
+
 @tool
-def run_code(code: str) -> dict:
+async def run_code(
+    code: str,
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> dict:
     """
     Executes a Python code 
     This tool:
       1. Takes in python code as input
       3. Writes code into a temporary .py file
-      4. Executes the file
+      4. Executes the file in a fresh process forked from a warm interpreter
+         (numpy, pandas, scipy, sklearn, duckdb, matplotlib already imported)
       5. Returns its output
 
+    Quoted artifact handles in the code (e.g. "ARTIFACT:3f2a9c1d0b7e") are
+    replaced by their full stored values. Output longer than 4000 characters
+    is returned as a head/tail preview plus a handle to the full text.
+
+    The snippet is killed when the current quiz's time budget runs out (at
+    most RUN_CODE_TIMEOUT seconds) or when it exceeds its CPU/memory limits.
+
     Parameters
     ----------
     code : str
@@ -38,33 +96,42 @@ def run_code(code: str) -> dict:
         {
             "stdout": <program output>,
             "stderr": <errors if any>,
-            "return_code": <exit code>
+            "return_code": <exit code>,
+            "timed_out": <True, only if the snippet was killed for time>,
+            "stdout_artifact": <handle, only if stdout was too long>,
+            "stderr_artifact": <handle, only if stderr was too long>,
+            "timing": {"mode": "warm" | "cold", "startup_ms": ..., "total_ms": ...}
         }
     """
     try: 
-        filename = "runner.py"
-        os.makedirs("LLMFiles", exist_ok=True)
-        with open(os.path.join("LLMFiles", filename), "w") as f:
-            f.write(code)
+        session = get_session(session_id)
+        os.makedirs(session.workdir, exist_ok=True)
+        # Unique name so concurrent snippets don't overwrite each other
+        filename = f"runner_{uuid.uuid4().hex[:8]}.py"
+        script_path = os.path.join(session.workdir, filename)
+        with open(script_path, "w") as f:
+            f.write(resolve_artifact_handles(code, session.artifacts))
+
+        try:
+            # Forked from the warm interpreter, killed when the quiz budget runs out
+            run = await asyncio.to_thread(
+                CODE_RUNNER.run, script_path, session.workdir,
+                timeout=code_timeout(session), cancel_event=session.tool_cancel(),
+            )
+        finally:
+            os.remove(script_path)
 
-        proc = subprocess.Popen(
-            ["uv", "run", filename],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd="LLMFiles"
-        )
-        stdout, stderr = proc.communicate()
-        if len(stdout) >= 10000:
-            return stdout[:10000] + "...truncated due to large size"
-        if len(stderr) >= 10000:
-            return stderr[:10000] + "...truncated due to large size"
         # --- Step 4: Return everything ---
-        return {
-            "stdout": stdout,
-            "stderr": stderr,
-            "return_code": proc.returncode
-        }
+        result = {"return_code": run["return_code"]}
+        if run["timed_out"]:
+            result["timed_out"] = True
+        for name in ("stdout", "stderr"):
+            summary = summarize_output(run, name, session.artifacts)
+            result[name] = summary["text"]
+            if "artifact" in summary:
+                result[f"{name}_artifact"] = summary["artifact"]
+        result["timing"] = run["timing"]
+        return result
     except Exception as e:
         return {
             "stdout": "",
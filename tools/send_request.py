@@ -1,23 +1,28 @@
 from langchain_core.tools import tool
-from shared_store import BASE64_STORE, url_time
-import time
-import os
-import requests
+from langgraph.prebuilt import InjectedState
+from session import Session, get_session
+from answer_store import ANSWER_STORE, canonical_url
+from . import http_client
+import asyncio
+import httpx
 import json
-from collections import defaultdict
-from typing import Any, Dict, Optional
+from typing import Annotated, Any, Dict, Optional
+
 
-cache = defaultdict(int)
-retry_limit = 4
 @tool
-def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
+async def post_request(
+    url: str,
+    payload: Dict[str, Any],
+    headers: Optional[Dict[str, str]] = None,
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> Any:
     """
     Send an HTTP POST request to the given URL with the provided payload.
 
     This function is designed for LangGraph applications, where it can be wrapped
     as a Tool or used inside a Runnable to call external APIs, webhooks, or backend
     services during graph execution.
-    REMEMBER: This a blocking function so it may take a while to return. Wait for the response.
+    REMEMBER: The server may take a while to respond. Wait for the response.
     Args:
         url (str): The endpoint to send the POST request to.
         payload (Dict[str, Any]): The JSON-serializable request body.
@@ -28,20 +33,28 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
         Any: The response body. If the server returns JSON, a parsed dict is
         returned. Otherwise, the raw text response is returned.
 
-    Raises:
-        requests.HTTPError: If the server responds with an unsuccessful status.
-        requests.RequestException: For network-related errors.
+    Errors (HTTP error statuses, network failures) are returned as the
+    server's error body or an error string rather than raised.
+    """
+    session = get_session(session_id)
+    # BASE64_KEY:/ARTIFACT: handles are replaced by their values while the body is sent
+    return await submit_answer(session, url, payload, headers)
+
+
+async def submit_answer(session: Session, url: str, payload: Dict[str, Any],
+                        headers: Optional[Dict[str, str]] = None) -> Any:
     """
-    # Handling if the answer is a BASE64
-    ans = payload.get("answer")
+    POST an answer for the session's current quiz and apply the deadline's
+    retry-or-advance decision. Answers judged correct are remembered by
+    the quiz page's fingerprint. Shared by post_request and answer replay.
 
-    if isinstance(ans, str) and ans.startswith("BASE64_KEY:"):
-        key = ans.split(":", 1)[1]
-        payload["answer"] = BASE64_STORE[key]
+    Artifact handles in the payload are resolved as the body is streamed,
+    so a large base64 answer is never copied into memory whole.
+    """
+    deadline = session.deadline
     headers = headers or {"Content-Type": "application/json"}
     try:
-        cur_url = os.getenv("url")
-        cache[cur_url] += 1
+        deadline.attempts += 1
         sending = payload
         if isinstance(payload.get("answer"), str):
             sending = {
@@ -50,7 +63,13 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
                 "url": payload.get("url", "")
             }
         print(f"\nSending Answer \n{json.dumps(sending, indent=4)}\n to url: {url}")
-        response = requests.post(url, json=payload, headers=headers)
+        body = session.artifacts.json_body(payload)
+        headers = {k: v for k, v in headers.items() if k.lower() != "content-length"}
+        headers["Content-Length"] = str(len(body))
+        response = await asyncio.to_thread(
+            http_client.request, "POST", url, content=body, headers=headers,
+            timeout=http_client.timeout_for(deadline.tool_budget("post_request")),
+        )
 
         # Raise on 4xx/5xx
         response.raise_for_status()
@@ -58,35 +77,34 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
         # Try to return JSON, fallback to raw text
         data = response.json()
         print("Got the response: \n", json.dumps(data, indent=4), '\n')
-        
-        delay = time.time() - url_time.get(cur_url, time.time())
-        print(delay)
-        next_url = data.get("url") 
+
+        correct = bool(data.get("correct"))
+        next_url = data.get("url")
+        page_fingerprint = session.fingerprints.get(canonical_url(deadline.url))
+        if correct and page_fingerprint:
+            # Handle values are streamed to blob files; the secret is not stored
+            await asyncio.to_thread(
+                ANSWER_STORE.record, page_fingerprint, deadline.url, url, payload, session.artifacts
+            )
         if not next_url:
+            deadline.close("correct" if correct else "wrong")
+            session.done = True
             return "Tasks completed"
-        if next_url not in url_time:
-            url_time[next_url] = time.time()
-
-        correct = data.get("correct")
-        if not correct:
-            cur_time = time.time()
-            prev = url_time.get(next_url, time.time())
-            if cache[cur_url] >= retry_limit or delay >= 180 or (prev != "0" and (cur_time - float(prev)) > 90): # Shouldn't retry
+
+        # Retry vs. move on is the deadline's call
+        if deadline.decide(correct, next_url) == "retry":
+            print("Retrying..")
+            data["url"] = deadline.url
+            data["message"] = "Retry Again!"
+        else:
+            if not correct:
                 print("Not retrying, moving on to the next question")
-                data = {"url": data.get("url", "")} 
-            else: # Retry
-                os.environ["offset"] = str(url_time.get(next_url, time.time()))
-                print("Retrying..")
-                data["url"] = cur_url
-                data["message"] = "Retry Again!" 
+                data = {"url": next_url}
+            session.advance(next_url, "correct" if correct else "skipped")
         print("Formatted: \n", json.dumps(data, indent=4), '\n')
-        forward_url = data.get("url", "")
-        os.environ["url"] = forward_url 
-        if forward_url == next_url:
-            os.environ["offset"] = "0"
 
         return data
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         # Extract server’s error response
         err_resp = e.response
 
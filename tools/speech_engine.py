@@ -0,0 +1,266 @@
+import asyncio
+from abc import ABC, abstractmethod
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Tuple
+from dotenv import load_dotenv
+from startup import STARTUP
+
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+load_dotenv()
+
+SPEECH_BACKEND = os.getenv("SPEECH_BACKEND", "google")
+SPEECH_CONCURRENCY = int(os.getenv("SPEECH_CONCURRENCY", "6"))
+SPEECH_CACHE_DIR = os.getenv("SPEECH_CACHE_DIR", os.path.join("LLMFiles", ".cache", "speech"))
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+# Segments are cut at pauses; a pause must be this long to count
+MIN_SILENCE_MS = 400
+# Silence is this many dB below the clip's average loudness
+SILENCE_BELOW_AVERAGE_DB = 16
+# Keep a little silence on each side so words are not clipped
+PAD_MS = 200
+# Short speech runs are merged up to this length (the web API rejects
+# long requests, and fewer requests means less per-call overhead)
+MAX_SEGMENT_MS = 15_000
+
+
+# -------------------------------------------------
+# BACKENDS
+# -------------------------------------------------
+def sr():
+    # speech_recognition and pydub are only imported once audio is transcribed
+    return STARTUP.timed_import("speech_recognition")
+
+
+class SpeechBackend(ABC):
+    """One speech-to-text engine. `transcribe` gets 16 kHz mono 16-bit PCM."""
+
+    name = ""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def recognizer(self):
+        # A Recognizer keeps per-call state (energy threshold, ...), so
+        # every transcription thread gets its own
+        recognizer = getattr(self._local, "recognizer", None)
+        if recognizer is None:
+            recognizer = self._local.recognizer = sr().Recognizer()
+        return recognizer
+
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def transcribe(self, pcm: bytes, language: str) -> str:
+        ...
+
+
+class GoogleBackend(SpeechBackend):
+    """Google's free Web Speech API (needs internet)."""
+
+    name = "google"
+
+    def transcribe(self, pcm: bytes, language: str) -> str:
+        audio = sr().AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+        return self.recognizer.recognize_google(audio, language=language)
+
+
+class SphinxBackend(SpeechBackend):
+    """CMU PocketSphinx, fully offline; needs the optional `pocketsphinx` package."""
+
+    name = "sphinx"
+
+    def available(self) -> bool:
+        try:
+            import pocketsphinx  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def transcribe(self, pcm: bytes, language: str) -> str:
+        audio = sr().AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+        return self.recognizer.recognize_sphinx(audio, language=language)
+
+
+BACKENDS = {backend.name: backend for backend in (GoogleBackend(), SphinxBackend())}
+
+
+# -------------------------------------------------
+# AUDIO
+# -------------------------------------------------
+def decode(path: str) -> "AudioSegment":
+    """Any ffmpeg-readable file → 16 kHz mono 16-bit PCM, without temp files."""
+    audio = STARTUP.timed_import("pydub").AudioSegment.from_file(path)
+    return audio.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(SAMPLE_WIDTH)
+
+
+def split_on_silence(audio: "AudioSegment") -> List[Tuple[int, int]]:
+    """(start_ms, end_ms) spans of speech, merged up to MAX_SEGMENT_MS and hard-cut beyond it."""
+    if audio.dBFS == float("-inf"):  # digital silence
+        return []
+    spans = STARTUP.timed_import("pydub.silence").detect_nonsilent(
+        audio, min_silence_len=MIN_SILENCE_MS, silence_thresh=audio.dBFS - SILENCE_BELOW_AVERAGE_DB, seek_step=10
+    )
+    segments = []
+    for start, end in spans:
+        start, end = max(0, start - PAD_MS), min(len(audio), end + PAD_MS)
+        if segments:
+            # Padding must not reach back into audio the previous segment already covers
+            start = max(start, segments[-1][1])
+        if segments and end - segments[-1][0] <= MAX_SEGMENT_MS:
+            segments[-1] = (segments[-1][0], end)
+            continue
+        # A pause-free run longer than the limit is cut into equal pieces
+        for piece in range(start, end, MAX_SEGMENT_MS):
+            segments.append((piece, min(end, piece + MAX_SEGMENT_MS)))
+    return segments
+
+
+def prepare(path: str) -> Tuple[bytes, List[Tuple[int, int]], float]:
+    """
+    Decode and segment a clip (CPU-bound; run off the event loop). Returns
+    the PCM bytes, each segment's (start_ms, end_ms) and the clip length
+    in seconds.
+    """
+    audio = decode(path)
+    return audio.raw_data, split_on_silence(audio), len(audio) / 1000
+
+
+def pcm_slice(pcm: bytes, start_ms: int, end_ms: int) -> bytes:
+    bytes_per_ms = SAMPLE_RATE * SAMPLE_WIDTH // 1000
+    return pcm[start_ms * bytes_per_ms:end_ms * bytes_per_ms]
+
+
+class SpeechEngine:
+    """
+    Transcribes a clip as independent speech segments in parallel and
+    joins them in order, so latency follows the longest segment rather
+    than the clip length. Transcripts are cached on disk by a hash of the
+    file bytes, the backend and the language.
+    """
+
+    def __init__(self, backend: str = SPEECH_BACKEND, concurrency: int = SPEECH_CONCURRENCY,
+                 cache_dir: str = SPEECH_CACHE_DIR):
+        self.default_backend = backend
+        self.cache_dir = cache_dir
+        self.concurrency = max(1, concurrency)
+        # Shared by all sessions so a long clip cannot flood the API
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="speech")
+        self._lock = threading.Lock()
+        self._stats = {"clips": 0, "cache_hits": 0, "segments": 0, "segment_errors": 0, "audio_seconds": 0.0}
+
+    def backend(self, name: str = "") -> SpeechBackend:
+        name = name or self.default_backend
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown speech backend {name!r}; choose one of {sorted(BACKENDS)}")
+        backend = BACKENDS[name]
+        if not backend.available():
+            raise RuntimeError(f"Speech backend {name!r} is not installed")
+        return backend
+
+    # -------------------------------------------------
+    # CACHE
+    # -------------------------------------------------
+    def _cache_path(self, path: str, backend: str, language: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        key = hashlib.sha256(f"{digest.hexdigest()}:{backend}:{language}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    @staticmethod
+    def _read(path: str):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write(path: str, text: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    # -------------------------------------------------
+    # TRANSCRIPTION
+    # -------------------------------------------------
+    def _segment(self, backend: SpeechBackend, pcm: bytes, span: Tuple[int, int], language: str) -> str:
+        try:
+            return backend.transcribe(pcm_slice(pcm, *span), language)
+        except sr().UnknownValueError:
+            return ""  # no intelligible speech in this segment
+
+    async def transcribe(self, path: str, language: str = "en-US", backend: str = "") -> dict:
+        """Transcribe one audio file; see transcribe_audio for the result shape."""
+        engine = self.backend(backend)
+        started = time.time()
+        cache_path = await asyncio.to_thread(self._cache_path, path, engine.name, language)
+        cached = await asyncio.to_thread(self._read, cache_path)
+        with self._lock:
+            self._stats["clips"] += 1
+            if cached is not None:
+                self._stats["cache_hits"] += 1
+        if cached is not None:
+            return {"text": cached, "cached": True, "backend": engine.name}
+
+        # Decoding and silence detection are CPU-bound; segments are cut from
+        # the PCM by offset in the worker threads
+        pcm, spans, audio_seconds = await asyncio.to_thread(prepare, path)
+        loop = asyncio.get_running_loop()
+        outcomes = await asyncio.gather(
+            *(loop.run_in_executor(self._pool, self._segment, engine, pcm, span, language) for span in spans),
+            return_exceptions=True,
+        )
+        texts, errors = [], []
+        for (start, end), outcome in zip(spans, outcomes):
+            if isinstance(outcome, BaseException):
+                errors.append(f"{start / 1000:.1f}-{end / 1000:.1f}s: {type(outcome).__name__}: {outcome}")
+            elif outcome:
+                texts.append(outcome.strip())
+        text = " ".join(texts)
+        with self._lock:
+            self._stats["segments"] += len(spans)
+            self._stats["segment_errors"] += len(errors)
+            self._stats["audio_seconds"] += audio_seconds
+        if errors and not texts:
+            raise RuntimeError("; ".join(errors))
+        if not errors:
+            # A partial transcript is returned but never cached
+            await asyncio.to_thread(self._write, cache_path, text)
+
+        result = {
+            "text": text,
+            "cached": False,
+            "backend": engine.name,
+            "segments": len(spans),
+            "audio_seconds": round(audio_seconds, 1),
+            "seconds": round(time.time() - started, 2),
+        }
+        if errors:
+            result["failed_segments"] = errors
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["audio_seconds"] = round(stats["audio_seconds"], 1)
+        stats["backend"] = self.default_backend
+        stats["backends"] = {name: backend.available() for name, backend in BACKENDS.items()}
+        stats["concurrency"] = self.concurrency
+        return stats
+
+
+SPEECH_ENGINE = SpeechEngine()
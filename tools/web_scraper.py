@@ -1,39 +1,60 @@
 from langchain_core.tools import tool
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from langgraph.prebuilt import InjectedState
+from session import Session, get_session
+from answer_store import canonical_url, fingerprint
+from typing import Annotated
+import asyncio
+from .fetcher import afetch_html
+from .html_distiller import distill_html
+from .prefetcher import PREFETCHER
 
 @tool
-def get_rendered_html(url: str) -> dict:
+async def get_rendered_html(
+    url: str,
+    mode: str = "auto",
+    session_id: Annotated[str, InjectedState("session_id")] = "",
+) -> dict:
     """
-    Fetch and return the fully rendered HTML of a webpage.
+    Fetch a webpage and return a distilled view of it.
+
+    mode: "auto" (default) tries a plain HTTP GET first and only renders in a
+    headless browser when the page builds its DOM with JavaScript; use
+    "browser" to force a full render or "http" to skip it.
+
+    Returns visible text, links, forms, tables (as CSV), inline scripts that
+    carry data, image URLs and the likely submit endpoint. The full HTML is
+    NOT returned; it is kept under "page_ref" and can be inspected with the
+    query_page tool (optionally filtered by a CSS selector).
     """
     print("\nFetching and rendering:", url)
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-
-            # Set timeout and wait for network idle
-            page.set_default_timeout(30000)
-            page.goto(url, wait_until="networkidle")
-
-            content = page.content()
-            browser.close()
+        return await load_page(get_session(session_id), url, mode)
+    except Exception as e:
+        return {"error": f"Error fetching/rendering page: {str(e)}"}
 
-        # Parse images
-        soup = BeautifulSoup(content, "html.parser")
-        imgs = [urljoin(url, img["src"]) for img in soup.find_all("img", src=True)]
 
-        if len(content) > 300000:
-            print("Warning: HTML too large, truncating...")
-            content = content[:300000] + "... [TRUNCATED DUE TO SIZE]"
+async def load_page(session: Session, url: str, mode: str = "auto") -> dict:
+    """
+    Fetch, store and distill one page for the session. Also records the
+    page's fingerprint so a correct answer to it can be replayed later.
+    """
+    fetched = await afetch_html(url, mode=mode, remaining=session.deadline.tool_budget("get_rendered_html"))
+    content = fetched["html"]
+    print(f"Fetched via {fetched['tier']}" + (f" ({fetched['escalation']})" if fetched["escalation"] else ""))
 
-        return {
-            "html": content,
-            "images": imgs,
-            "url": url
-        }
+    # Keep the full DOM out of the conversation
+    page_ref = session.artifacts.put(content, prefix="PAGE", meta={"url": url})
 
-    except Exception as e:
-        return {"error": f"Error fetching/rendering page: {str(e)}"}
+    # Parsing large pages is CPU-bound; keep it off the event loop
+    distilled = await asyncio.to_thread(distill_html, content, url)
+    distilled["page_ref"] = page_ref
+    # Start downloading the page's files while the LLM reads it
+    queued = PREFETCHER.schedule(session, distilled.pop("assets", []))
+    # From the untruncated page, so pages differing only in a table, script or file still differ
+    identity = distilled.pop("identity")
+    session.fingerprints[canonical_url(url)] = fingerprint(url, identity["text"], identity["data"])
+    print(
+        f"Distilled {len(content)} chars of HTML to {len(distilled.get('text', ''))} chars of text"
+        + (f", prefetching {queued} asset(s)" if queued else "")
+    )
+    return distilled
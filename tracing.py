@@ -0,0 +1,283 @@
+import asyncio
+import functools
+import glob
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join("LLMFiles", ".traces"))
+# Newest per-run trace files kept on disk (0 disables writing them)
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "200"))
+# Latency histogram buckets in seconds, from a fast tool call to a whole quiz
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_run: ContextVar[Optional["RunTrace"]] = ContextVar("trace_run", default=None)
+_parent: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+def histogram(values, buckets=BUCKETS) -> dict:
+    """Non-cumulative count of durations per upper bucket bound, empty buckets omitted."""
+    counts = defaultdict(int)
+    for value in values:
+        counts[next((f"<={b}" for b in buckets if value <= b), f">{buckets[-1]}")] += 1
+    return dict(counts)
+
+
+class Span:
+    """One timed operation: a graph node, a tool call, an LLM call or a wait."""
+
+    __slots__ = ("id", "parent", "kind", "name", "start", "seconds", "outcome", "attrs")
+
+    def __init__(self, kind: str, name: str, parent: Optional["Span"], attrs: dict):
+        self.id = uuid.uuid4().hex[:8]
+        self.parent = parent.id if parent is not None else None
+        self.kind = kind
+        self.name = name
+        self.start = time.time()
+        self.seconds = 0.0
+        self.outcome = "ok"
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Attach attributes, e.g. tokens_in/tokens_out/bytes_in/bytes_out, or override the outcome."""
+        self.outcome = attrs.pop("outcome", self.outcome)
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "parent": self.parent, "kind": self.kind, "name": self.name,
+            "start": round(self.start, 3), "seconds": round(self.seconds, 4),
+            "outcome": self.outcome, **self.attrs,
+        }
+
+
+class RunTrace:
+    """Every span of one quiz chain, written to TRACE_DIR/<run_id>.json when the run ends."""
+
+    def __init__(self, run_id: str, url: str):
+        self.run_id = run_id
+        self.url = url
+        self.started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self, extra: dict) -> dict:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        durations = defaultdict(list)
+        errors = defaultdict(int)
+        for span in spans:
+            key = f"{span['kind']}:{span['name']}"
+            durations[key].append(span["seconds"])
+            errors[key] += span["outcome"] != "ok"
+        totals = {}
+        for key, values in sorted(durations.items(), key=lambda kv: -sum(kv[1])):
+            values.sort()
+            totals[key] = {
+                "count": len(values),
+                "seconds": round(sum(values), 4),
+                "errors": errors[key],
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+                "histogram": histogram(values),
+            }
+        return {
+            "run_id": self.run_id,
+            "url": self.url,
+            "started": round(self.started, 3),
+            "seconds": round(time.time() - self.started, 3),
+            "totals": totals,
+            **extra,
+            "spans": spans,
+        }
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _flatten(prefix: str, value, out: dict):
+    if isinstance(value, bool):
+        out[prefix] = int(value)
+    elif isinstance(value, (int, float)):
+        out[prefix] = value
+    elif isinstance(value, dict):
+        for key, inner in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else str(key), inner, out)
+
+
+class Tracer:
+    """
+    In-process span recorder, no collector needed.
+
+    - `span()` times a block and nests under the enclosing span of the same
+      run (tracked with contextvars, so it follows asyncio tasks).
+    - Every finished span feeds Prometheus-style latency histograms and
+      outcome, token and payload-byte counters, rendered by `render()` for
+      /metrics.
+    - `run()` collects a chain's spans and writes them as one JSON file.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}                    # (kind, name) -> [bucket counts..., +Inf], sum
+        self._outcomes = defaultdict(int)        # (kind, name, outcome) -> count
+        self._tokens = defaultdict(int)          # (name, direction) -> tokens
+        self._bytes = defaultdict(int)           # (kind, name, direction) -> bytes
+
+    # -------------------------------------------------
+    # RECORDING
+    # -------------------------------------------------
+    @contextmanager
+    def run(self, run_id: str, url: str, extra=None):
+        """Trace a whole run; `extra()` is called at the end for summary fields of the JSON file."""
+        trace = RunTrace(run_id, url)
+        token = _run.set(trace)
+        try:
+            yield trace
+        finally:
+            _run.reset(token)
+            if TRACE_KEEP > 0:
+                try:
+                    self._write(trace, extra() if extra else {})
+                except Exception as e:
+                    print("Could not write run trace:", e)
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs):
+        span = Span(kind, name, _parent.get(), attrs)
+        token = _parent.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except asyncio.CancelledError:
+            span.outcome = "cancelled"
+            raise
+        except BaseException as e:
+            span.outcome = f"error:{type(e).__name__}"
+            raise
+        finally:
+            span.seconds = time.perf_counter() - start
+            _parent.reset(token)
+            self._observe(span)
+            trace = _run.get()
+            if trace is not None:
+                trace.add(span)
+
+    def traced(self, kind: str, name: str):
+        """Decorator form of span() for sync or async functions (e.g. graph nodes)."""
+        def decorate(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def wrapper(*args, **kwargs):
+                    with self.span(kind, name):
+                        return await fn(*args, **kwargs)
+            else:
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    with self.span(kind, name):
+                        return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _observe(self, span: Span):
+        key = (span.kind, span.name)
+        with self._lock:
+            counts = self._histograms.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            for i, bound in enumerate(self.buckets):
+                if span.seconds <= bound:
+                    counts[0][i] += 1
+                    break
+            else:
+                counts[0][-1] += 1
+            counts[1] += span.seconds
+            self._outcomes[(span.kind, span.name, span.outcome)] += 1
+            for direction in ("in", "out"):
+                if span.attrs.get(f"tokens_{direction}"):
+                    self._tokens[(span.name, direction)] += int(span.attrs[f"tokens_{direction}"])
+                if span.attrs.get(f"bytes_{direction}"):
+                    self._bytes[(span.kind, span.name, direction)] += int(span.attrs[f"bytes_{direction}"])
+
+    def _write(self, trace: RunTrace, extra: dict):
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{trace.run_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace.to_dict(extra), f, indent=1, default=str)
+        print(f"Run trace written to {path}")
+        # Timestamped names sort oldest first
+        for old in sorted(glob.glob(os.path.join(TRACE_DIR, "*.json")))[:-TRACE_KEEP]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    # -------------------------------------------------
+    # EXPOSITION
+    # -------------------------------------------------
+    def render(self, components: Optional[dict] = None) -> str:
+        """
+        Prometheus text format: span latency histograms, span outcomes,
+        LLM tokens, payload bytes, plus every numeric field of `components`
+        (the /healthz stats) as a gauge.
+        """
+        with self._lock:
+            histograms = {k: ([*v[0]], v[1]) for k, v in self._histograms.items()}
+            outcomes, tokens, sizes = dict(self._outcomes), dict(self._tokens), dict(self._bytes)
+
+        lines = [
+            "# HELP quiz_span_duration_seconds Duration of graph nodes, tool calls, LLM calls and waits.",
+            "# TYPE quiz_span_duration_seconds histogram",
+        ]
+        for (kind, name), (counts, total) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                lines.append(f"quiz_span_duration_seconds_bucket{_labels(kind=kind, name=name, le=bound)} {cumulative}")
+            lines.append(f"quiz_span_duration_seconds_sum{_labels(kind=kind, name=name)} {round(total, 6)}")
+            lines.append(f"quiz_span_duration_seconds_count{_labels(kind=kind, name=name)} {cumulative}")
+
+        lines += ["# HELP quiz_spans_total Finished spans by outcome.", "# TYPE quiz_spans_total counter"]
+        for (kind, name, outcome), count in sorted(outcomes.items()):
+            lines.append(f"quiz_spans_total{_labels(kind=kind, name=name, outcome=outcome)} {count}")
+
+        lines += ["# HELP quiz_llm_tokens_total Tokens sent to and received from the model.",
+                  "# TYPE quiz_llm_tokens_total counter"]
+        for (name, direction), count in sorted(tokens.items()):
+            lines.append(f"quiz_llm_tokens_total{_labels(name=name, direction=direction)} {count}")
+
+        lines += ["# HELP quiz_payload_bytes_total Bytes passed into and returned by spans.",
+                  "# TYPE quiz_payload_bytes_total counter"]
+        for (kind, name, direction), count in sorted(sizes.items()):
+            lines.append(f"quiz_payload_bytes_total{_labels(kind=kind, name=name, direction=direction)} {count}")
+
+        if components:
+            lines += ["# HELP quiz_component_stat Numeric fields of the /healthz component stats.",
+                      "# TYPE quiz_component_stat gauge"]
+            for component, stats in components.items():
+                flat = {}
+                _flatten("", stats, flat)
+                for stat, value in sorted(flat.items()):
+                    stat = stat or "value"
+                    lines.append(f"quiz_component_stat{_labels(component=component, stat=stat)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+TRACER = Tracer()